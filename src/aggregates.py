@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+汇总缓存：每份抓鱼单按 路线 × 品种规格 预先汇总的数量与门店数，只计算一次，
+存为 <目录>/.aggregates/<文件名>.json，以文件内容哈希判断是否仍然有效。
+  - 整理时由汇总页（summary_sheet.py）从清理后的总表算出并写入，同时登记原始内容与整理结果的哈希；
+    之后入库、再次整理同一内容都直接取用，不再重算
+  - 没经过整理的文件（补录、流式模式的原始文件）在入库时由明细算出，取数规则与汇总页相同
+  {"day": "2025-12-03", "shas": [...], "qty": 总数量, "customers": 门店数,
+   "routes":   {路线: {"qty": 数量, "customers": 门店数, "products": {"草鱼|1.5": [数量, 门店数]}}},
+   "products": {"草鱼|1.5": [数量, 门店数]}}
+python aggregates.py 抓鱼单20251203.xlsx   查看某份导出的汇总（缓存失效时重新计算）
+"""
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+AGG_DIRNAME = ".aggregates"
+MEMO_SIZE = 256  # 常驻的守护进程 / HTTP 服务里按哈希缓存的份数，超过时整体清空
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _remember(sha, agg):
+    with _memo_lock:
+        if len(_memo) >= MEMO_SIZE:
+            _memo.clear()
+        _memo[sha] = agg
+
+
+def product_key(variety, spec):
+    return f"{variety}|{spec}" if spec else variety
+
+
+def split_product_key(key):
+    variety, _, spec = key.partition("|")
+    return variety, spec
+
+
+def aggregate_path(path):
+    p = Path(path)
+    return p.parent / AGG_DIRNAME / f"{p.stem}.json"
+
+
+def aggregate_facts(day, facts):
+    """由 order_archive.parse_export 的明细一次性算出各级汇总。"""
+    routes = {}
+    products = {}
+    route_customers = {}
+    product_customers = {}
+    cell_customers = {}
+    customers = set()
+    total = 0.0
+    for route, customer, variety, spec, qty, _marked, _note in facts:
+        key = product_key(variety, spec)
+        r = routes.setdefault(route, {"qty": 0.0, "customers": 0, "products": {}})
+        r["qty"] += qty
+        cell = r["products"].setdefault(key, [0.0, 0])
+        cell[0] += qty
+        prod = products.setdefault(key, [0.0, 0])
+        prod[0] += qty
+        total += qty
+        customers.add(customer)
+        route_customers.setdefault(route, set()).add(customer)
+        product_customers.setdefault(key, set()).add(customer)
+        cell_customers.setdefault((route, key), set()).add(customer)
+    for (route, key), names in cell_customers.items():
+        routes[route]["products"][key][1] = len(names)
+    for route, names in route_customers.items():
+        routes[route]["customers"] = len(names)
+    for key, names in product_customers.items():
+        products[key][1] = len(names)
+    return {"day": day, "qty": total, "customers": len(customers), "routes": routes, "products": products}
+
+
+def save_aggregates(path, sha, day, facts):
+    """入库时调用：写入汇总缓存并返回。"""
+    agg = aggregate_facts(day, facts)
+    agg["shas"] = [sha]
+    _write(path, agg)
+    return agg
+
+
+def store_aggregates(path, agg, shas):
+    """写入已算好的汇总（如整理时由总表算出），登记到 shas 这些内容哈希下（与已登记的合并）。"""
+    merged = list(dict.fromkeys(list(shas) + list(agg.get("shas", ()))))
+    agg = dict(agg, shas=merged)
+    _write(path, agg)
+    return agg
+
+
+def _write(path, agg):
+    target = aggregate_path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f"{target.stem}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(agg, ensure_ascii=False), encoding="utf-8")
+    os.replace(str(tmp), str(target))
+    for sha in agg["shas"]:
+        _remember(sha, agg)
+
+
+def load_aggregates(path, sha=None):
+    """读取缓存；文件内容（哈希）与缓存不符时返回 None。"""
+    from pipeline import file_sha256
+    sha = sha or file_sha256(path)
+    with _memo_lock:
+        if sha in _memo:
+            return _memo[sha]
+    try:
+        agg = json.loads(aggregate_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if sha not in agg.get("shas", ()):
+        return None
+    _remember(sha, agg)
+    return agg
+
+
+def aggregates_for(path, day=None):
+    """取一份导出的汇总：缓存有效直接返回，否则解析一次并写入缓存（day 同 parse_export）。"""
+    from pipeline import file_sha256
+    from order_archive import parse_export
+    sha = file_sha256(path)
+    agg = load_aggregates(path, sha)
+    if agg is None:
+        day, facts = parse_export(path, day)
+        if day is None:
+            return None
+        agg = save_aggregates(path, sha, day, facts)
+    return agg
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    for f in argv:
+        agg = aggregates_for(f)
+        if agg is None:
+            print(f"⚠ {f}：不是可识别的抓鱼单")
+            continue
+        print(f"{Path(f).name}（{agg['day']}）：{len(agg['routes'])} 条路线，{agg['customers']} 家门店，"
+              f"合计 {agg['qty']:g}")
+        for route, r in sorted(agg["routes"].items(), key=lambda kv: -kv[1]["qty"]):
+            print(f"  {route or '未分配'}：{r['qty']:g}（{r['customers']} 家，{len(r['products'])} 个品种规格）")
+
+
+if __name__ == "__main__":
+    main()
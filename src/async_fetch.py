@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+基于 playwright.async_api 的抓取引擎：
+  - 打开看板的同时并发探测登录状态（跳转登录页 / 导出按钮出现，谁先到算谁）
+  - 点击导出前先挂好下载监听与响应拦截（响应正文必须是 xlsx 的 zip 头才接受）
+  - 三种下载方式并行：拦截 xlsx 响应 / 点击“立即下载”捕获下载 / 用 requests 直接拉取下载链接，
+    第一个成功的胜出，其余取消
+  - 多看板 / 多门店：按 targets.json 共用一个浏览器，每个看板一个页面，限制并发数，
+    下载好的工作簿全部送进同一条整理 / 打印流水线；看板配置了 "account" 时改用 context 池按账号隔离
+python dingding_export.py --async
+python dingding_export.py --multi     （targets.json，或环境变量 TARGETS_CONFIG 指定路径）
+
+targets.json：
+[
+  {"name": "总店", "url": "https://app82759.eapps.dingtalkcloud.com/...#/dashboard/7ad5..."},
+  {"name": "河西店", "url": "https://app82759.eapps.dingtalkcloud.com/...#/dashboard/....", "account": "河西店账号"}
+]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import urljoin
+
+from dingding_export import (
+    TARGET_URL, EXPORT_SELECTOR, DOWNLOAD_SELECTOR, USER_AGENT, PROFILE_DIR,
+    resolve_headless, profile_needs_login, resolve_downloads_dir,
+)
+
+XLSX_CONTENT_TYPES = ("spreadsheetml", "ms-excel", "octet-stream")
+
+
+class LoginRequired(Exception):
+    """会话失效且当前无法扫码登录（无头模式）。"""
+
+
+async def first_success(named_coros, timeout):
+    """并发运行多个协程，返回第一个成功的 (名称, 结果)；全部失败或超时抛出异常，其余任务会被取消。"""
+    tasks = {asyncio.ensure_future(c): name for name, c in named_coros}
+    errors = []
+    deadline = time.perf_counter() + timeout
+    try:
+        pending = set(tasks)
+        while pending:
+            left = deadline - time.perf_counter()
+            if left <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.cancelled():
+                    continue
+                if t.exception() is None:
+                    return tasks[t], t.result()
+                errors.append(f"{tasks[t]}: {t.exception()}")
+        raise RuntimeError("全部方式均失败或超时：" + "；".join(errors) if errors else f"{timeout}s 内没有任何方式成功")
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# ---------- 登录探测 ----------
+async def open_dashboard(page, target_url, timeout=30.0):
+    """打开看板并同时探测登录状态，返回 True（已登录，导出按钮可见）或 False（需要登录）。"""
+    nav = asyncio.ensure_future(page.goto(target_url, wait_until="domcontentloaded", timeout=timeout * 1000))
+
+    async def logged_in():
+        await page.locator(EXPORT_SELECTOR).first.wait_for(state="visible", timeout=timeout * 1000)
+        return True
+
+    async def login_page():
+        await page.wait_for_url(lambda u: "login" in u.lower(), timeout=timeout * 1000)
+        return False
+
+    try:
+        _, ok = await first_success([("导出按钮", logged_in()), ("登录页", login_page())], timeout)
+    except Exception:
+        # 两个探测都没有结果时按原逻辑：URL 与目标不一致视为需要登录
+        ok = "login" not in page.url.lower() and page.url == target_url
+    finally:
+        if not nav.done():
+            nav.cancel()
+        await asyncio.gather(nav, return_exceptions=True)
+    return ok
+
+
+# ---------- 三种下载方式 ----------
+async def _via_download_event(download_task, part):
+    download = await download_task
+    await download.save_as(str(part))
+    return part
+
+
+async def _click_download_when_ready(page):
+    try:
+        await page.wait_for_selector("text=导出文件准备中", state="hidden", timeout=10000)
+    except Exception:
+        pass
+    await page.click(DOWNLOAD_SELECTOR, timeout=30000)
+
+
+class XlsxResponseCatcher:
+    """
+    响应拦截：在点击导出之前挂到页面上，导出请求的响应不会漏掉。
+    附件 / 表格类型的响应只是候选，逐个读取正文，第一个以 zip 头（PK）开头的才算 xlsx；其它候选忽略，继续等。
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.fut = asyncio.get_event_loop().create_future()
+        self._checks = set()
+        page.on("response", self._on_response)
+
+    def _on_response(self, resp):
+        if self.fut.done():
+            return
+        ct = (resp.headers.get("content-type") or "").lower()
+        cd = (resp.headers.get("content-disposition") or "").lower()
+        if ".xlsx" in cd or "attachment" in cd or any(t in ct for t in XLSX_CONTENT_TYPES):
+            task = asyncio.ensure_future(self._check(resp))
+            self._checks.add(task)
+            task.add_done_callback(self._checks.discard)
+
+    async def _check(self, resp):
+        try:
+            body = await resp.body()
+        except Exception:
+            return
+        if body.startswith(b"PK") and not self.fut.done():
+            self.fut.set_result(body)
+
+    async def save(self, part, timeout):
+        body = await asyncio.wait_for(self.fut, timeout)
+        part.write_bytes(body)
+        return part
+
+    def close(self):
+        try:
+            self.page.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+        for task in list(self._checks):
+            task.cancel()
+
+
+async def _via_link_fetch(page, context, part, timeout):
+    link = page.locator("a:has-text('立即下载')").first
+    await link.wait_for(state="attached", timeout=timeout * 1000)
+    href = await link.get_attribute("href")
+    if not href or href.startswith("javascript") or href == "#":
+        raise RuntimeError("“立即下载”没有可直接拉取的链接")
+    url = urljoin(page.url, href)
+    cookies = {c["name"]: c["value"] for c in await context.cookies(url)}
+
+    def fetch():
+        import requests
+        r = requests.get(url, cookies=cookies, headers={"User-Agent": USER_AGENT}, timeout=timeout)
+        r.raise_for_status()
+        return r.content
+
+    data = await asyncio.get_event_loop().run_in_executor(None, fetch)
+    if not data.startswith(b"PK"):
+        raise RuntimeError("下载链接返回的不是 xlsx")
+    part.write_bytes(data)
+    return part
+
+
+async def export_and_download(page, context, downloads_dir, timeout=60.0, tag=None):
+    """点击导出并用三种方式并行下载，返回 (download_store.PutResult, 胜出方式)。"""
+    from download_store import store_for
+    store = store_for(downloads_dir)
+    incoming = store.incoming_path()
+    parts = {name: incoming.with_name(f"{incoming.stem}.{name}.part") for name in ("event", "response", "link")}
+    # 先挂好下载监听与响应拦截，再点击导出
+    download_task = asyncio.ensure_future(page.wait_for_event("download", timeout=timeout * 1000))
+    catcher = XlsxResponseCatcher(page)
+    click_task = None
+    try:
+        await page.locator(EXPORT_SELECTOR).first.click(timeout=5000)
+        print("✓ 已点击导出")
+        click_task = asyncio.ensure_future(_click_download_when_ready(page))
+        winner, part = await first_success([
+            ("立即下载", _via_download_event(download_task, parts["event"])),
+            ("响应拦截", catcher.save(parts["response"], timeout)),
+            ("链接拉取", _via_link_fetch(page, context, parts["link"], timeout)),
+        ], timeout)
+        # 按内容哈希归档并建立 抓鱼单YYYYMMDD[_看板].xlsx；与上一份相同则沿用原文件名
+        return store.put(part, tag), winner
+    finally:
+        catcher.close()
+        for t in (download_task, click_task):
+            if t is not None and not t.done():
+                t.cancel()
+        for part in parts.values():
+            try:
+                part.unlink()
+            except Exception:
+                pass
+
+
+async def fetch_once(context, target_url=TARGET_URL, downloads_dir=None, headless=True, page=None, tag=None):
+    """在给定 context 中打开看板、确认登录、导出并下载，返回保存的路径；内容与上一份相同时返回 None（不应再处理）。"""
+    downloads_dir = Path(downloads_dir) if downloads_dir else resolve_downloads_dir()
+    page = page or await context.new_page()
+    t0 = time.perf_counter()
+    if not await open_dashboard(page, target_url):
+        if headless:
+            raise LoginRequired("会话已失效，无头模式无法扫码登录")
+        print("⚠️  检测到需要登录，请在浏览器窗口扫码登录，完成后回到此终端按 Enter 继续...")
+        await asyncio.get_event_loop().run_in_executor(None, input)
+        if not await open_dashboard(page, target_url):
+            raise LoginRequired("登录后仍未进入看板")
+    t_ready = time.perf_counter()
+    stored, winner = await export_and_download(page, context, downloads_dir, tag=tag)
+    target = stored.path
+    if stored.unchanged:
+        # 沿用上一份的文件名，那里可能已经整理、打印过
+        print(f"  · 内容与上一份相同（{target.name}），不再处理，下载 {time.perf_counter() - t_ready:.2f}s")
+        return None
+    print(f"✓ 下载完成（{winner}）：{target.name}，看板就绪 {t_ready - t0:.2f}s，下载 {time.perf_counter() - t_ready:.2f}s")
+    return target
+
+
+# ---------- 多看板并发导出 ----------
+def load_targets(path=None):
+    """读取多看板配置，返回 [{"name", "url"}]；没有配置时返回空列表。"""
+    path = Path(path or os.environ.get("TARGETS_CONFIG") or Path(__file__).parent / "targets.json")
+    if not path.exists():
+        return []
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠ 读取看板配置失败（{path}）：{e}")
+        return []
+    targets = data.get("targets", []) if isinstance(data, dict) else data
+    return [t for t in targets if isinstance(t, dict) and t.get("url")]
+
+
+def shared_context_lease(context):
+    """不区分账号：在同一个 context 里为每个任务开一个新页面，用完关闭。"""
+    @asynccontextmanager
+    async def lease(account=None):
+        page = await context.new_page()
+        try:
+            yield context, page
+        finally:
+            try:
+                await page.close()
+            except Exception:
+                pass
+    return lease
+
+
+async def fetch_many(lease, targets, on_downloaded, headless=True, concurrency=3):
+    """
+    并发导出多个看板（最多 concurrency 个同时进行）。
+    lease(account) 是异步上下文管理器，产出 (context, page)：共用 context 或 context 池。
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+    results = {}
+
+    async def one(t):
+        name = t.get("name") or t["url"][-8:]
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                async with lease(t.get("account")) as (context, page):
+                    path = await fetch_once(context, t["url"], headless=headless, page=page, tag=name)
+                if path is None:
+                    results[name] = (True, time.perf_counter() - t0, "内容没有变化")
+                    return
+                # 流水线入口是有界队列，满时 put 会阻塞，放到线程里以免卡住其它看板
+                await asyncio.get_event_loop().run_in_executor(None, on_downloaded, path)
+                results[name] = (True, time.perf_counter() - t0, path.name)
+            except Exception as e:
+                print(f"⚠ 看板 {name} 导出失败：{e}")
+                results[name] = (False, time.perf_counter() - t0, str(e))
+
+    await asyncio.gather(*(one(t) for t in targets))
+    print("\n多看板导出结果：")
+    for name, (ok, secs, info) in results.items():
+        print(f"  {'✓' if ok else '✗'} {name}: {secs:.2f}s  {info}")
+    return results
+
+
+async def main_async():
+    """异步版主流程：抓取（--multi 时按配置并发抓取多个看板）后交给流水线整理 / 打印，同时异步关闭浏览器。"""
+    from playwright.async_api import async_playwright
+    from dingding_export import stream_mode_enabled
+    from pipeline import build_run_pipeline
+
+    if "--fresh" not in sys.argv:
+        from run_journal import resume_pending
+        if await asyncio.get_event_loop().run_in_executor(None, resume_pending, None, stream_mode_enabled()):
+            return
+
+    headless = resolve_headless()
+    if headless:
+        from session_monitor import preflight
+        if not preflight():
+            headless = False
+    if profile_needs_login(PROFILE_DIR) and headless:
+        print("⚠ 检测到首次运行需要登录，自动切换为有界面模式（headless=False）以便扫码登录。")
+        headless = False
+
+    targets = load_targets() if "--multi" in sys.argv else []
+    if "--multi" in sys.argv and not targets:
+        print("⚠ 未找到 targets.json（或 TARGETS_CONFIG），只导出默认看板")
+
+    pipe = build_run_pipeline(stream=stream_mode_enabled())
+    concurrency = int(os.environ.get("EXPORT_CONCURRENCY", "3"))
+    submitted = 0
+    t_close = time.perf_counter()
+    async with async_playwright() as p:
+        try:
+            if any(t.get("account") for t in targets):
+                submitted, t_close = await _fetch_with_pool(p, targets, pipe, headless, concurrency)
+            else:
+                submitted, t_close = await _fetch_with_profile(p, targets, pipe, headless, concurrency)
+        except LoginRequired as e:
+            print(f"🚫 {e}")
+        except Exception as e:
+            print(f"⚠ 抓取失败：{e}")
+    pipe.log("关闭浏览器", "", t_close, time.perf_counter())
+    errors = await asyncio.get_event_loop().run_in_executor(None, pipe.join)
+    if submitted:
+        pipe.print_timeline()
+    if errors:
+        print(f"⚠ 流水线中有 {errors} 个步骤出错，请检查上面的日志")
+
+
+async def _fetch_with_profile(p, targets, pipe, headless, concurrency):
+    """持久化 profile 的单个 context：默认看板，或不区分账号的多个看板。返回 (成功数, 开始关闭的时间)。"""
+    context = await p.chromium.launch_persistent_context(
+        user_data_dir=str(PROFILE_DIR),
+        headless=headless,
+        accept_downloads=True,
+        args=["--start-maximized"],
+        viewport={"width": 1920, "height": 1080},
+        user_agent=USER_AGENT,
+    )
+    try:
+        if not targets:
+            path = await fetch_once(context, headless=headless)
+            if path is not None:
+                pipe.submit(path)
+            ok = 1
+        else:
+            results = await fetch_many(shared_context_lease(context), targets, pipe.submit,
+                                       headless=headless, concurrency=concurrency)
+            ok = sum(1 for r, _, _ in results.values() if r)
+        if ok:
+            from session_monitor import save_session_state
+            try:
+                await save_session_state(context)
+            except Exception as e:
+                print(f"⚠ 保存登录状态失败：{e}")
+        return ok, time.perf_counter()
+    finally:
+        await context.close()
+
+
+async def _fetch_with_pool(p, targets, pipe, headless, concurrency):
+    """按账号隔离：一个 Chromium + context 池。返回 (成功数, 开始关闭的时间)。"""
+    from context_pool import open_pool, DEFAULT_ACCOUNT
+    browser, pool = await open_pool(p, [t.get("account") or DEFAULT_ACCOUNT for t in targets], headless)
+    try:
+        results = await fetch_many(pool.lease, targets, pipe.submit, headless=headless, concurrency=concurrency)
+        pool.report()
+        return sum(1 for ok, _, _ in results.values() if ok), time.perf_counter()
+    finally:
+        await pool.close()
+        await browser.close()
+
+
+def run():
+    asyncio.run(main_async())
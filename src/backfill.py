@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+批量补录：把一个或多个目录里的全部抓鱼单并行写入订单库（可选同时生成整理后的副本）。
+  - 工作进程并行解析原始文件（订单日期按文件名 / 原始标题），主进程单线程写 SQLite
+  - --transform 时另外把整理结果写到同目录的 整理后/ 下，原文件不改动
+  - 内容哈希已入库（或已整理过）的文件直接跳过，可以反复运行
+  - 损坏 / 无法识别的文件不会中断，结束时汇总错误
+  - 实时显示进度与吞吐（文件/秒、行/秒）
+python backfill.py [--transform] [--workers 4] [--recursive] 目录 [目录 ...]
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+_known = frozenset()
+TRANSFORMED_DIRNAME = "整理后"
+
+
+def _init_worker(known):
+    global _known
+    _known = known
+
+
+def _work(path, transform):
+    """工作进程：哈希去重 → 解析原始文件 →（整理副本），返回 (路径, 哈希, 日期, 明细, 错误)。"""
+    from pipeline import file_sha256
+    from order_archive import parse_export
+    try:
+        sha = file_sha256(path)
+        if sha in _known:
+            return path, sha, None, None, None
+        # 先解析原始文件：整理后的 A1 是处理当天的日期，不能用来确定订单日期
+        day, facts = parse_export(path)
+        if day is None:
+            raise ValueError("不是可识别的抓鱼单")
+        if transform:
+            from dingding_export import adjust_excel_fit
+            out = Path(path).parent / TRANSFORMED_DIRNAME / Path(path).name
+            out.parent.mkdir(exist_ok=True)
+            shutil.copyfile(str(path), str(out))
+            if adjust_excel_fit(out) is None:
+                raise ValueError("整理失败")
+        return path, sha, day, facts, None
+    except Exception as e:
+        return path, None, None, None, f"{type(e).__name__}: {e}"
+
+
+def collect_files(dirs, recursive=False):
+    from watch_folder import is_candidate
+    files = []
+    for d in map(Path, dirs):
+        if d.is_file():
+            files.append(d)
+            continue
+        it = d.rglob("*.xlsx") if recursive else d.glob("*.xlsx")
+        # 路线拆分目录（X_路线）与 整理后/ 里是我们自己生成的文件
+        files.extend(f for f in it if is_candidate(f) and not f.parent.name.endswith("_路线")
+                     and f.parent.name != TRANSFORMED_DIRNAME)
+    return sorted(set(files))
+
+
+def known_hashes(con, dirs):
+    """订单库中已入库的哈希，加上各目录运行日志里已整理过的哈希。"""
+    from watch_folder import known_hashes as journal_hashes
+    known = {row[0] for row in con.execute("SELECT sha256 FROM exports")}
+    for d in map(Path, dirs):
+        if d.is_dir():
+            known |= journal_hashes(d)
+    return known
+
+
+def backfill(dirs, transform=False, workers=None, recursive=False):
+    from aggregates import save_aggregates
+    from order_archive import open_db, store_export
+    files = collect_files(dirs, recursive)
+    if not files:
+        print("未找到 xlsx 文件")
+        return {}
+    con = open_db()
+    known = frozenset(known_hashes(con, dirs))
+    workers = workers or min(8, os.cpu_count() or 1)
+    print(f"共 {len(files)} 个文件，{workers} 个工作进程{'，同时生成整理后的副本' if transform else ''}")
+
+    t0 = time.perf_counter()
+    done = rows = 0
+    counts = {"ingested": 0, "superseded": 0, "skipped": 0, "failed": 0}
+    errors = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(known,)) as pool:
+            futures = [pool.submit(_work, f, transform) for f in files]
+            for fut in as_completed(futures):
+                path, sha, day, facts, err = fut.result()
+                done += 1
+                if err:
+                    counts["failed"] += 1
+                    errors.append((path, err))
+                elif day is None:
+                    counts["skipped"] += 1
+                else:
+                    # 同一批里内容重复的文件只入库一次
+                    if con.execute("SELECT 1 FROM exports WHERE sha256 = ?", (sha,)).fetchone():
+                        counts["skipped"] += 1
+                    else:
+                        counts[store_export(con, path, sha, day, facts)] += 1
+                        save_aggregates(path, sha, day, facts)
+                        rows += len(facts)
+                secs = time.perf_counter() - t0
+                sys.stdout.write(f"\r  [{done}/{len(files)}] {done / secs:6.1f} 文件/秒  {rows / secs:8.0f} 行/秒  "
+                                 f"跳过 {counts['skipped']}  失败 {counts['failed']}")
+                sys.stdout.flush()
+    finally:
+        con.close()
+    secs = time.perf_counter() - t0
+    print(f"\n✓ 补录完成：{len(files)} 个文件，{rows} 行明细，用时 {secs:.1f}s"
+          f"（入库 {counts['ingested']}，被更新版本取代 {counts['superseded']}，跳过 {counts['skipped']}，失败 {counts['failed']}）")
+    if errors:
+        print("⚠ 以下文件处理失败：")
+        for path, err in errors:
+            print(f"  · {path}：{err}")
+    return counts
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="backfill.py", description="批量补录抓鱼单到订单库")
+    ap.add_argument("dirs", nargs="*")
+    ap.add_argument("--transform", action="store_true",
+                    help=f"同时用 adjust_excel_fit 整理，结果写到各目录的 {TRANSFORMED_DIRNAME}/ 下（原文件不改动）")
+    ap.add_argument("--workers", type=int)
+    ap.add_argument("--recursive", action="store_true")
+    args = ap.parse_args(argv)
+    if not args.dirs:
+        from dingding_export import resolve_downloads_dir
+        args.dirs = [str(resolve_downloads_dir())]
+    counts = backfill(args.dirs, transform=args.transform, workers=args.workers, recursive=args.recursive)
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+基准：原来的逐条 `in` + `.replace` 与 normalize.Normalizer（单个正则 + 按值缓存）在合成语料上的对比。
+python bench_normalize.py [单元格数，默认 500000] [不同取值数，默认 3000]
+"""
+import random
+import sys
+import time
+
+from normalize import Normalizer
+
+# 删除 '--' 后拼出 ' 斤' 等单次替换容易与逐条 replace 不一致的写法，一并参与一致性检查
+EDGE_CASES = (" --斤", "3 --斤", "--- 斤", " -- -- 斤", "  斤斤", "2--3", "---", "-- 斤")
+
+def legacy_clean(s):
+    """整理脚本原来的写法：三次检查、三次 replace。"""
+    if '--' in s:
+        s = s.replace('--', '')
+    if '-' in s:
+        s = s.replace('-', '_')
+    if ' 斤' in s:
+        s = s.replace(' 斤', '')
+    return s
+
+
+def synthetic_corpus(cells, distinct, seed=20251203):
+    """仿照抓鱼单：规格（2-2.5）、门店名、备注、带单位的数量、'--' 占位，取值大量重复。"""
+    rnd = random.Random(seed)
+    varieties = ["草鱼", "雄鱼", "鮰鱼", "鲫鱼", "鳊鱼", "鲈鱼"]
+    pool = []
+    for i in range(distinct):
+        kind = i % 6
+        if kind == 0:
+            a = rnd.choice([0.5, 1, 1.5, 1.8, 2, 2.5, 3, 4, 4.5])
+            pool.append(f"{a}-{a + rnd.choice([0.5, 1, 2])}")
+        elif kind == 1:
+            pool.append(f"{rnd.randint(1000, 9999)}{rnd.choice(['早安', '农贸', '生鲜', '超市'])}{i}店")
+        elif kind == 2:
+            pool.append(f"要大{rnd.choice(varieties)}{rnd.randint(1, 9)}条（{rnd.randint(2, 4)}-{rnd.randint(5, 6)} 斤的）")
+        elif kind == 3:
+            pool.append(f"{rnd.randint(1, 60)} 斤")
+        elif kind == 4:
+            pool.append("--")
+        else:
+            pool.append(str(rnd.randint(1, 50)))
+    return [rnd.choice(pool) for _ in range(cells)]
+
+
+def bench(label, fn, corpus, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for s in corpus:
+            fn(s)
+        secs = time.perf_counter() - t
+        best = secs if best is None else min(best, secs)
+    print(f"  {label:<28}{best * 1000:9.1f} ms   {len(corpus) / best / 1e6:6.2f} M 单元格/秒")
+    return best
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    cells = int(argv[0]) if argv else 500000
+    distinct = int(argv[1]) if len(argv) > 1 else 3000
+    corpus = synthetic_corpus(cells, distinct)
+    print(f"合成语料：{cells} 个单元格，{len(set(corpus))} 个不同取值")
+
+    same = Normalizer(units=())
+    checked = set(corpus) | set(EDGE_CASES)
+    mismatch = [s for s in checked if legacy_clean(s) != same(s)]
+    print(f"与原写法结果一致（{len(checked)} 个取值，含 {len(EDGE_CASES)} 个边界写法）："
+          f"{'是' if not mismatch else f'否（{len(mismatch)} 个不同，如 {mismatch[:3]}）'}")
+
+    t_legacy = bench("原写法（3 次 replace）", legacy_clean, corpus)
+    t_regex = bench("单个正则（无缓存）", Normalizer(units=())._normalize, corpus)
+    # 带缓存的只跑一轮：新实例的缓存从空开始，计入每个取值第一次匹配的成本
+    t_cached = bench("单个正则 + 缓存", Normalizer(units=()).normalize, corpus, repeat=1)
+    t_units = bench("含单位 斤,公斤,kg + 缓存", Normalizer(units=("斤", "公斤", "kg")).normalize, corpus, repeat=1)
+    print(f"加速比：无缓存 {t_legacy / t_regex:.2f}×，带缓存 {t_legacy / t_cached:.2f}×，"
+          f"带单位 {t_legacy / t_units:.2f}×")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+数量列类型推断与转换：清理之后、拆分之前，把序号列和数量列里的数字文本一次性转成数字，
+后续分组 / 合计只做数值运算，不再对每个单元格 try float(str(v))。
+  - 每列先取样本推断类型：整数（条数 / 斤数）、小数、文本；数字占比低于 NUMERIC_SHARE 的列按文本原样保留
+  - 按推断出的类型整列转换，只写回确实变化的单元格
+  - 数字列中无法识别的单元格（如 "约3"、"3斤半"）保持原值并记录坐标，整理结束时提示
+"""
+import re
+
+from openpyxl.utils import get_column_letter
+
+from sheet_utils import find_qty_start_col
+
+INTEGER, DECIMAL, TEXT = "整数", "小数", "文本"
+SAMPLE_SIZE = 64
+NUMERIC_SHARE = 0.8
+_NUM_RE = re.compile(r"[+-]?(?:\d+\.?\d*|\.\d+)")
+_FAILED = object()
+
+
+def parse_number(v):
+    """数字原样返回；数字文本转为 int / float；空白返回 None；其它返回 _FAILED。"""
+    t = type(v)
+    if t is int or t is float:
+        return v
+    if v is None or t is bool:
+        return None if v is None else _FAILED
+    s = str(v).strip()
+    if not s:
+        return None
+    if not _NUM_RE.fullmatch(s):
+        return _FAILED
+    return float(s) if "." in s else int(s)
+
+
+def to_number(v, default=None):
+    """与 parse_number 同一规则，空白和无法识别的值返回 default（给不经过 coerce_sheet 的读取方用）。"""
+    n = parse_number(v)
+    return default if n is None or n is _FAILED else n
+
+
+def infer_type(values, sample=SAMPLE_SIZE):
+    """由前 sample 个非空值推断列类型。"""
+    seen = numeric = 0
+    integral = True
+    for v in values:
+        n = parse_number(v)
+        if n is None:
+            continue
+        seen += 1
+        if n is not _FAILED:
+            numeric += 1
+            if integral and isinstance(n, float) and not n.is_integer():
+                integral = False
+        if seen >= sample:
+            break
+    if not seen or numeric / seen < NUMERIC_SHARE:
+        return TEXT if seen else INTEGER
+    return INTEGER if integral else DECIMAL
+
+
+def coerce_values(values, kind):
+    """整列转换，返回 (新值列表, 失败的下标列表)；文本列原样返回。"""
+    if kind == TEXT:
+        return list(values), []
+    parsed = list(map(parse_number, values))
+    failed = [i for i, n in enumerate(parsed) if n is _FAILED]
+    for i in failed:
+        parsed[i] = values[i]
+    if kind == INTEGER:
+        parsed = [int(n) if type(n) is float and n.is_integer() else n for n in parsed]
+    return parsed, failed
+
+
+class CoercionReport:
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.columns = {}
+        self.converted = 0
+        self.failures = []
+
+    def summary(self, limit=5):
+        shown = "、".join(f"{ref}={raw!r}" for ref, raw in self.failures[:limit])
+        more = f" 等 {len(self.failures)} 个" if len(self.failures) > limit else ""
+        return f"{self.sheet}：{len(self.failures)} 个数量单元格无法识别为数字（{shown}{more}）"
+
+
+def coerce_sheet(ws, start_data_row=5, qty_start=None):
+    """
+    序号列（A）与数量列（第 2 行第一个非空表头起）按列推断并转换，返回 CoercionReport。
+    只有序号为数字的明细行参与数量列转换，总计 / 说明等行不动。
+    """
+    report = CoercionReport(ws.title)
+    max_row = ws.max_row or 0
+    max_col = ws.max_column or 0
+    if max_row < start_data_row:
+        return report
+    qty_start = qty_start or find_qty_start_col(ws)
+
+    serial_cells = [row[0] for row in ws.iter_rows(min_row=start_data_row, max_row=max_row, max_col=1)]
+    serials, _ = coerce_values([c.value for c in serial_cells], INTEGER)
+    for cell, v in zip(serial_cells, serials):
+        if v is not cell.value:
+            cell.value = v
+            report.converted += 1
+    data_idx = [i for i, v in enumerate(serials) if type(v) in (int, float)]
+    report.columns[1] = INTEGER
+    if not data_idx or qty_start > max_col:
+        return report
+
+    for col in ws.iter_cols(min_col=qty_start, max_col=max_col, min_row=start_data_row, max_row=max_row):
+        cells = [col[i] for i in data_idx]
+        values = [c.value for c in cells]
+        kind = infer_type(values)
+        report.columns[cells[0].column] = kind
+        coerced, failed = coerce_values(values, kind)
+        for cell, old, new in zip(cells, values, coerced):
+            if new is not old:
+                cell.value = new
+                report.converted += 1
+        for i in failed:
+            c = cells[i]
+            report.failures.append((f"{get_column_letter(c.column)}{c.row}", values[i]))
+    return report
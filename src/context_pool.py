@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+浏览器 context 池：一个 Chromium 进程里为每个钉钉账号保持若干相互隔离、已登录的 context，
+导出任务按账号租用 context，用完归还。
+  - 登录状态按账号保存在 playwright_states/<账号>.json（storage_state），
+    "default" 账号首次使用时从原来的 playwright_profile 导入，不用重新扫码
+  - 租出前做健康检查（页面还能执行脚本），失效的 context 直接重建
+  - 使用时间超过 CONTEXT_MAX_AGE 秒或 JS 堆超过 CONTEXT_MAX_MB 的 context 归还时回收重建
+  - 重建失败时把旧 context 作为占位放回池中（下次租用时健康检查不通过会再重建），池中的名额不会丢失；
+    等待空闲 context 最多 CONTEXT_LEASE_TIMEOUT 秒
+  - 结束时报告池利用率、租用等待时间、回收次数
+targets.json 中给看板加 "account": "河西店账号" 即可按账号隔离；每个账号的 context 数由 CONTEXTS_PER_ACCOUNT 控制。
+"""
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from dingding_export import USER_AGENT, PROFILE_DIR
+
+STATES_DIR = Path(__file__).parent / "playwright_states"
+DEFAULT_ACCOUNT = "default"
+
+
+def state_path(account):
+    return STATES_DIR / (re.sub(r'[\\/:*?"<>|\s]+', "_", account) + ".json")
+
+
+async def seed_state_from_profile(playwright, profile_dir, target, headless=True):
+    """把持久化 profile 中的登录状态导出为 storage_state 文件，成功返回 True。"""
+    if not profile_dir.exists() or not any(profile_dir.iterdir()):
+        return False
+    try:
+        ctx = await playwright.chromium.launch_persistent_context(
+            user_data_dir=str(profile_dir), headless=headless, user_agent=USER_AGENT)
+        try:
+            target.parent.mkdir(exist_ok=True)
+            await ctx.storage_state(path=str(target))
+        finally:
+            await ctx.close()
+        print(f"✓ 已从 {profile_dir.name} 导入登录状态 -> {target.name}")
+        return True
+    except Exception as e:
+        print(f"⚠ 从 profile 导入登录状态失败：{e}")
+        return False
+
+
+class PooledContext:
+    """池中的一个 context：固定一个常驻页面，记录创建时间与已服务的任务数。"""
+
+    def __init__(self, account, context, page):
+        self.account = account
+        self.context = context
+        self.page = page
+        self.created = time.perf_counter()
+        self.jobs = 0
+
+    @property
+    def age(self):
+        return time.perf_counter() - self.created
+
+    async def healthy(self):
+        try:
+            return not self.page.is_closed() and await self.page.evaluate("1 + 1") == 2
+        except Exception:
+            return False
+
+    async def heap_mb(self):
+        """页面 JS 堆占用（MB），拿不到时返回 0。"""
+        try:
+            used = await self.page.evaluate("performance.memory ? performance.memory.usedJSHeapSize : 0")
+            return used / (1 << 20)
+        except Exception:
+            return 0.0
+
+    async def close(self):
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+
+
+class ContextPool:
+    """按账号划分的 context 池，lease(account) 租用，退出 async with 时自动归还。"""
+
+    def __init__(self, browser, accounts, per_account=None, max_age=None, max_mb=None, viewport=None,
+                 lease_timeout=None):
+        self.browser = browser
+        self.accounts = list(dict.fromkeys(accounts)) or [DEFAULT_ACCOUNT]
+        self.per_account = per_account or int(os.environ.get("CONTEXTS_PER_ACCOUNT", "1"))
+        self.max_age = max_age or float(os.environ.get("CONTEXT_MAX_AGE", "1800"))
+        self.max_mb = max_mb or float(os.environ.get("CONTEXT_MAX_MB", "512"))
+        self.lease_timeout = lease_timeout or float(os.environ.get("CONTEXT_LEASE_TIMEOUT", "300"))
+        self.viewport = viewport or {"width": 1920, "height": 1080}
+        self._idle = {}
+        self._all = []
+        self.t0 = time.perf_counter()
+        self.busy_seconds = 0.0
+        self.waits = []
+        self.recycled = 0
+
+    async def _new_context(self, account):
+        path = state_path(account)
+        ctx = await self.browser.new_context(
+            storage_state=str(path) if path.exists() else None,
+            accept_downloads=True,
+            viewport=self.viewport,
+            user_agent=USER_AGENT,
+        )
+        page = await ctx.new_page()
+        return PooledContext(account, ctx, page)
+
+    async def start(self):
+        """为每个账号预先建好 context（并发创建）。"""
+        for account in self.accounts:
+            self._idle[account] = asyncio.Queue()
+        made = await asyncio.gather(*(self._new_context(a) for a in self.accounts for _ in range(self.per_account)))
+        for pc in made:
+            self._all.append(pc)
+            self._idle[pc.account].put_nowait(pc)
+        print(f"✓ context 池就绪：{len(self.accounts)} 个账号 × {self.per_account}，耗时 {time.perf_counter() - self.t0:.2f}s")
+        return self
+
+    async def _replace(self, pc, reason):
+        """关闭 pc 并新建一个；新建失败时抛出异常，pc 仍留在 _all 中作为占位。"""
+        self.recycled += 1
+        print(f"  · 回收 context（{pc.account}，{reason}）")
+        await pc.close()
+        fresh = await self._new_context(pc.account)
+        self._all[self._all.index(pc)] = fresh
+        return fresh
+
+    @asynccontextmanager
+    async def lease(self, account=None):
+        """租用一个 context，产出 (context, page)；任务成功后保存该账号的登录状态。"""
+        account = account or DEFAULT_ACCOUNT
+        if account not in self._idle:
+            raise KeyError(f"context 池中没有账号 {account}")
+        t_wait = time.perf_counter()
+        try:
+            pc = await asyncio.wait_for(self._idle[account].get(), self.lease_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{self.lease_timeout:.0f}s 内没有空闲的 context（账号 {account}）")
+        try:
+            if not await pc.healthy():
+                pc = await self._replace(pc, "健康检查失败")
+        except BaseException:
+            # 重建失败：旧 context 作为占位归还，下次租用时再重建
+            self._idle[account].put_nowait(pc)
+            raise
+        t_lease = time.perf_counter()
+        self.waits.append(t_lease - t_wait)
+        ok = False
+        try:
+            yield pc.context, pc.page
+            ok = True
+        finally:
+            self.busy_seconds += time.perf_counter() - t_lease
+            pc.jobs += 1
+            try:
+                if ok:
+                    STATES_DIR.mkdir(exist_ok=True)
+                    await pc.context.storage_state(path=str(state_path(account)))
+                if pc.age > self.max_age:
+                    pc = await self._replace(pc, f"已使用 {pc.age:.0f}s")
+                else:
+                    mb = await pc.heap_mb()
+                    if mb > self.max_mb:
+                        pc = await self._replace(pc, f"JS 堆 {mb:.0f}MB")
+            except Exception as e:
+                print(f"⚠ 归还 context 时出错：{e}")
+            finally:
+                self._idle[account].put_nowait(pc)
+
+    def report(self):
+        """利用率 = 各 context 被租用的总时长 / (池大小 × 池存活时长)。"""
+        wall = time.perf_counter() - self.t0
+        slots = len(self._all) or 1
+        util = self.busy_seconds / (slots * wall) if wall > 0 else 0.0
+        waits = sorted(self.waits)
+        stats = {
+            "contexts": len(self._all),
+            "leases": len(waits),
+            "utilisation": round(util, 3),
+            "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "wait_max": round(waits[-1], 3) if waits else 0.0,
+            "recycled": self.recycled,
+        }
+        print(f"✓ context 池：{stats['contexts']} 个 context，租用 {stats['leases']} 次，"
+              f"利用率 {util:.0%}，等待 平均 {stats['wait_avg']:.3f}s / 最长 {stats['wait_max']:.3f}s，"
+              f"回收 {stats['recycled']} 次")
+        return stats
+
+    async def close(self):
+        await asyncio.gather(*(pc.close() for pc in self._all))
+        self._all = []
+
+
+async def open_pool(playwright, accounts, headless=True):
+    """启动一个 Chromium 并建好 context 池；default 账号没有状态文件时先从 profile 导入。"""
+    if DEFAULT_ACCOUNT in accounts and not state_path(DEFAULT_ACCOUNT).exists():
+        await seed_state_from_profile(playwright, PROFILE_DIR, state_path(DEFAULT_ACCOUNT), headless=headless)
+    browser = await playwright.chromium.launch(headless=headless, args=["--start-maximized"])
+    pool = ContextPool(browser, accounts)
+    await pool.start()
+    return browser, pool
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+常驻模式：进程常驻内存（Python / openpyxl / 流水线模块只导入一次），在导出时间前几分钟预热
+（启动 Playwright 驱动与 Chromium、打开看板并确认登录），到点立即导出并交给流水线整理 / 打印；
+之后在轮询窗口内定时重新导出，内容有变化（重新出单）才再处理一次：按下载仓库算好的原始内容哈希判断，
+哈希不同但单元格内容相同（只是 zip 时间戳不同）的重复导出通过仓库撤销，不直接删除文件。其余时间关闭浏览器，
+并在空闲时段按 session_monitor 的规则续期登录会话。
+python dingding_export.py --daemon
+环境变量：
+  EXPORT_TIMES      导出时间，逗号分隔，默认 07:30
+  PREWARM_MINUTES   提前预热分钟数，默认 3
+  POLL_UNTIL        轮询重新导出的截止时间，默认 11:00（留空不轮询）
+  POLL_MINUTES      轮询间隔分钟数，默认 15
+"""
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+import openpyxl
+
+from dingding_export import TARGET_URL, EXPORT_SELECTOR, USER_AGENT, PROFILE_DIR, resolve_downloads_dir, stream_mode_enabled
+from async_fetch import open_dashboard, export_and_download
+from pipeline import build_run_pipeline
+from session_monitor import SessionMonitor, save_session_state
+
+
+def parse_times(spec):
+    """"07:30,13:00" -> [(7, 30), (13, 0)]，忽略写错的项。"""
+    times = []
+    for part in (spec or "").split(","):
+        try:
+            h, m = part.strip().split(":")
+            times.append((int(h) % 24, int(m) % 60))
+        except ValueError:
+            if part.strip():
+                print(f"⚠ 忽略无法识别的时间：{part}")
+    return sorted(set(times))
+
+
+def next_run(now, times):
+    """now 之后最近的一个导出时间。"""
+    for day in range(2):
+        base = (now + timedelta(days=day)).replace(second=0, microsecond=0)
+        for h, m in times:
+            t = base.replace(hour=h, minute=m)
+            if t > now:
+                return t
+    raise ValueError("没有配置导出时间")
+
+
+def workbook_fingerprint(path):
+    """按单元格内容计算指纹：重新导出的文件即使 zip 时间戳不同，内容相同也视为同一份。"""
+    h = hashlib.sha256()
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            h.update(ws.title.encode("utf-8"))
+            for row in ws.iter_rows(values_only=True):
+                h.update(repr(row).encode("utf-8"))
+    finally:
+        wb.close()
+    return h.hexdigest()
+
+
+class ExportDaemon:
+    def __init__(self, times, prewarm_minutes=3, poll_until=None, poll_minutes=15, check_interval=1800):
+        self.times = times
+        self.prewarm = timedelta(minutes=prewarm_minutes)
+        self.poll_until = poll_until
+        self.poll_interval = timedelta(minutes=poll_minutes)
+        self.check_interval = check_interval
+        self.monitor = SessionMonitor()
+        self.downloads_dir = resolve_downloads_dir()
+        self.playwright = None
+        self.context = None
+        self.page = None
+        self.shas = set()
+        self.fingerprints = set()
+
+    # ---------- 空闲等待 ----------
+    async def sleep_until(self, when, check_session=True):
+        """等到 when；浏览器关闭期间每隔 check_interval 检查一次会话。"""
+        loop = asyncio.get_event_loop()
+        while True:
+            left = (when - datetime.now()).total_seconds()
+            if left <= 0:
+                return
+            if check_session and self.context is None:
+                try:
+                    await loop.run_in_executor(None, self.monitor.check_once)
+                except Exception as e:
+                    print(f"⚠ 会话检查出错：{e}")
+                left = (when - datetime.now()).total_seconds()
+            await asyncio.sleep(max(0.0, min(left, self.check_interval)))
+
+    # ---------- 预热 / 冷却 ----------
+    async def warm(self):
+        """启动浏览器并停在已登录的看板上；返回是否可以导出。"""
+        from playwright.async_api import async_playwright
+        t0 = time.perf_counter()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        if self.context is None:
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                user_data_dir=str(PROFILE_DIR),
+                headless=True,
+                accept_downloads=True,
+                viewport={"width": 1920, "height": 1080},
+                user_agent=USER_AGENT,
+            )
+            self.page = await self.context.new_page()
+        ok = await open_dashboard(self.page, TARGET_URL)
+        if ok:
+            print(f"✓ 预热完成：浏览器已就绪并停在看板上（{time.perf_counter() - t0:.1f}s）")
+        else:
+            print("🚫 预热时发现需要登录，请运行 python dingding_export.py --headed 扫码后再启动常驻模式")
+        return ok
+
+    async def cool(self):
+        if self.context is not None:
+            try:
+                await save_session_state(self.context)
+            except Exception:
+                pass
+            await self.context.close()
+        self.context = self.page = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        print("✓ 已关闭浏览器，等待下一个导出时间")
+
+    # ---------- 导出 ----------
+    async def export(self, label):
+        """导出一次；内容与本轮已处理过的相同则丢弃，否则交给流水线。"""
+        t0 = time.perf_counter()
+        try:
+            if not await self.page.locator(EXPORT_SELECTOR).first.is_visible():
+                if not await open_dashboard(self.page, TARGET_URL):
+                    print("🚫 会话已失效，本次导出跳过")
+                    return False
+            stored, winner = await export_and_download(self.page, self.context, self.downloads_dir)
+        except Exception as e:
+            print(f"⚠ {label} 导出失败：{e}")
+            return False
+        path = stored.path
+        # 仓库判定与上一份相同时，path 是上一份的文件名（可能已经整理过），不能再处理，也不能删除
+        if stored.unchanged or stored.sha in self.shas:
+            print(f"  · {label}：内容没有变化（{time.perf_counter() - t0:.1f}s）")
+            return False
+        from download_store import store_for
+        store = store_for(self.downloads_dir)
+        loop = asyncio.get_event_loop()
+        # 指纹按仓库里的原始对象计算，不读友好文件名（那里可能已是整理后的内容）
+        fp = await loop.run_in_executor(None, workbook_fingerprint, store.object_path(stored.sha))
+        self.shas.add(stored.sha)
+        if fp in self.fingerprints:
+            store.discard(path)
+            print(f"  · {label}：内容没有变化（仅文件时间戳不同），已撤销 {path.name}（{time.perf_counter() - t0:.1f}s）")
+            return False
+        self.fingerprints.add(fp)
+        print(f"✓ {label}：{path.name}（{winner}），触发到下载完成 {time.perf_counter() - t0:.1f}s")
+        pipe = build_run_pipeline(stream=stream_mode_enabled())
+        pipe.submit(path)
+        errors = await loop.run_in_executor(None, pipe.join)
+        pipe.print_timeline()
+        if errors:
+            print(f"⚠ 流水线中有 {errors} 个步骤出错，请检查上面的日志")
+        return True
+
+    def poll_deadline(self, start):
+        if not self.poll_until:
+            return start
+        h, m = self.poll_until
+        end = start.replace(hour=h, minute=m)
+        return end if end > start else start
+
+    async def run_forever(self):
+        print(f"✓ 常驻模式启动：导出时间 {', '.join('%02d:%02d' % t for t in self.times)}，"
+              f"提前 {int(self.prewarm.total_seconds() // 60)} 分钟预热")
+        while True:
+            at = next_run(datetime.now(), self.times)
+            print(f"下一次导出：{at:%m-%d %H:%M}")
+            await self.sleep_until(at - self.prewarm)
+            self.shas = set()
+            self.fingerprints = set()
+            try:
+                ready = await self.warm()
+                await self.sleep_until(at, check_session=False)
+                if ready or await open_dashboard(self.page, TARGET_URL):
+                    await self.export(f"{at:%H:%M} 定时导出")
+                    end = self.poll_deadline(at)
+                    n = 1
+                    while datetime.now() + self.poll_interval <= end:
+                        await self.sleep_until(datetime.now() + self.poll_interval, check_session=False)
+                        n += 1
+                        await self.export(f"第 {n} 次轮询导出")
+            except Exception as e:
+                print(f"⚠ 本轮导出出错：{e}")
+            finally:
+                await self.cool()
+
+
+def run():
+    times = parse_times(os.environ.get("EXPORT_TIMES", "07:30"))
+    if not times:
+        print("🚫 EXPORT_TIMES 中没有有效的导出时间（格式 07:30,13:00）")
+        return
+    poll = parse_times(os.environ.get("POLL_UNTIL", "11:00"))
+    daemon = ExportDaemon(
+        times,
+        prewarm_minutes=float(os.environ.get("PREWARM_MINUTES", "3")),
+        poll_until=poll[0] if poll else None,
+        poll_minutes=float(os.environ.get("POLL_MINUTES", "15")),
+    )
+    try:
+        asyncio.run(daemon.run_forever())
+    except KeyboardInterrupt:
+        print("\n已退出常驻模式")
@@ -2,8 +2,13 @@
 # -*- coding: utf-8 -*-
 """
 钉钉抓取鱼单自动导出 / 下载 / 整理 / 打印  一体脚本
-python dingding_export.py
+python dingding_export.py            （--async 使用异步抓取引擎，--multi 按 targets.json 并发导出多个看板，
+                                      --daemon 常驻并按 EXPORT_TIMES 定时导出，
+                                      --watch [目录] 监视文件夹，手动下载的抓鱼单自动整理打印，
+                                      --serve 启动本地 HTTP 整理 / 打印服务，
+                                      上次运行中断时自动从断点继续，--fresh 重新导出）
 首次运行会弹出浏览器扫码登录，后续复用登录状态。
+下载按内容哈希存入 downloads/.store（见 download_store.py），抓鱼单YYYYMMDD.xlsx 是指向它的硬链接。
 """
 import subprocess
 import sys
@@ -15,6 +20,16 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill, Font, Border, Side
 import re
 from pathlib import Path
+from pagination import plan_workbook, plan_sheet, measure_sheet, plan_packing
+from openpyxl.worksheet.pagebreak import Break
+from pipeline import build_run_pipeline
+from summary_sheet import (summary_enabled, build_summary_sheet, lookup_aggregates, remember_aggregates,
+                           sheet_aggregates, order_day)
+from row_export import row_export_format, export_rows
+from coercion import coerce_sheet
+from sheet_utils import find_qty_start_col, safe_file_part
+from normalize import default_normalizer
+from layout_template import HEADER_ROWS, load_template, save_template
 
 # ---------- 工具：确保 playwright 已安装 ----------
 def get_chromium_path():
@@ -48,28 +63,69 @@ def install_chromium_browser():
     subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
     print("✓ Chromium 浏览器安装完成")
 
+# ---------- 钉钉页面 / 下载位置 ----------
+TARGET_URL = "https://app82759.eapps.dingtalkcloud.com/dsp_base_app/index.html?sys=9befbf6d068e4096bb7283edc4bec916#/dashboard/7ad53c390ed94c34ac8354213afa6697?sys=9befbf6d068e4096bb7283edc4bec916&id=7ad53c390ed94c34ac8354213afa6697"
+EXPORT_SELECTOR = "i.el-tooltip.b-icon-import"
+DOWNLOAD_SELECTOR = "text=立即下载"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+
+PROFILE_DIR = Path(__file__).parent / "playwright_profile"
+
+
+def resolve_headless():
+    """是否无头：环境变量 HEADLESS=0/1 优先，否则默认无头，传 --headed 切换为有界面。"""
+    env_headless = os.environ.get("HEADLESS", "").lower()
+    if env_headless in ("0", "false", "no"):
+        return False
+    if env_headless in ("1", "true", "yes"):
+        return True
+    return "--headed" not in sys.argv
+
+
+def profile_needs_login(profile_dir):
+    """profile 目录不存在或为空（首次运行）时需要扫码登录。"""
+    try:
+        return not profile_dir.exists() or (not any(profile_dir.iterdir()))
+    except Exception:
+        return True
+
+
+def resolve_downloads_dir():
+    """优先使用脚本目录下的 downloads，不可写时回退到系统下载目录。"""
+    downloads_dir = Path(__file__).parent / "downloads"
+    downloads_dir.mkdir(exist_ok=True)
+    if not downloads_dir.exists() or not os.access(str(downloads_dir), os.W_OK):
+        try:
+            downloads_dir = Path(os.environ["USERPROFILE"]) / "Downloads"
+        except Exception:
+            downloads_dir = Path.home() / "Downloads"
+    return downloads_dir
+
+
 # ---------- 主逻辑 ----------
 def main():
     from playwright.sync_api import sync_playwright
     print("\n开始运行主程序...")
     print("=" * 50)
 
-    # 是否无头
-    env_headless = os.environ.get("HEADLESS", "").lower()
-    if env_headless in ("0", "false", "no"):
-        headless = False
-    elif env_headless in ("1", "true", "yes"):
-        headless = True
-    else:
-        headless = ("--headed" not in sys.argv)
+    if "--fresh" not in sys.argv:
+        from run_journal import resume_pending
+        if resume_pending(stream=stream_mode_enabled()):
+            return
 
+    headless = resolve_headless()
+    if headless:
+        # 会话已确定失效时直接有界面启动，省掉一次必然失败的导航
+        from session_monitor import preflight
+        if not preflight():
+            headless = False
+
+    pipe = None
+    t_close = None
     with sync_playwright() as p:
-        profile_dir = Path(__file__).parent / "playwright_profile"
-        try:
-            first_run_needs_login = not profile_dir.exists() or (not any(profile_dir.iterdir()))
-        except Exception:
-            first_run_needs_login = True
-        if first_run_needs_login and headless:
+        profile_dir = PROFILE_DIR
+        if profile_needs_login(profile_dir) and headless:
             print("⚠ 检测到首次运行需要登录，自动切换为有界面模式（headless=False）以便扫码登录。")
             headless = False
 
@@ -80,10 +136,10 @@ def main():
             accept_downloads=True,
             args=["--start-maximized"],
             viewport={"width": 1920, "height": 1080},
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+            user_agent=USER_AGENT
         )
         page = context.new_page()
-        target_url = "https://app82759.eapps.dingtalkcloud.com/dsp_base_app/index.html?sys=9befbf6d068e4096bb7283edc4bec916#/dashboard/7ad53c390ed94c34ac8354213afa6697?sys=9befbf6d068e4096bb7283edc4bec916&id=7ad53c390ed94c34ac8354213afa6697"
+        target_url = TARGET_URL
 
         print(f"正在访问: {target_url}")
         try:
@@ -117,9 +173,9 @@ def main():
         print(f"当前URL: {page.url}")
 
         # 自动点击导出
-        auto_candidates = ["i.el-tooltip.b-icon-import"]
+        auto_candidates = [EXPORT_SELECTOR]
         clicked = False
-        fast_sel = "i.el-tooltip.b-icon-import"
+        fast_sel = EXPORT_SELECTOR
         try:
             page.locator(fast_sel).first.wait_for(state="visible", timeout=3000)
             page.locator(fast_sel).first.click(timeout=5000)
@@ -137,16 +193,9 @@ def main():
         download_done = False
         if clicked:
             print("等待通知并点击\"立即下载\"最多 60s...")
-            downloads_dir = Path(__file__).parent / "downloads"
-            downloads_dir.mkdir(exist_ok=True)
-            if not downloads_dir.exists() or not os.access(str(downloads_dir), os.W_OK):
-                try:
-                    downloads_dir = Path(os.environ["USERPROFILE"]) / "Downloads"
-                except Exception:
-                    downloads_dir = Path.home() / "Downloads"
-
+            downloads_dir = resolve_downloads_dir()
             print(f"✓ 将下载到: {downloads_dir}")
-            download_selector = "text=立即下载"
+            download_selector = DOWNLOAD_SELECTOR
 
             try:
                 page.wait_for_selector("text=导出文件准备中", state="hidden", timeout=10000)
@@ -156,22 +205,22 @@ def main():
                 with page.expect_download(timeout=60000) as dl_info:
                     page.click(download_selector, timeout=30000)
                 download = dl_info.value
-                date_str = datetime.now().strftime("%Y%m%d")
-                base_name = f"抓鱼单{date_str}"
-                fn = base_name + ".xlsx"
-                target = downloads_dir / fn
-                idx = 1
-                while target.exists():
-                    fn = f"{base_name}_{idx}.xlsx"
-                    target = downloads_dir / fn
-                    idx += 1
-                download.save_as(str(target))
-                adjust_excel_fit(target)
-                silent_print_with_wps(str(target), r"Canon LBP2900")
+                from download_store import store_for
+                store = store_for(downloads_dir)
+                incoming = store.incoming_path()
+                # 整理 / 拆分 / 归档 / 打印在后台流水线中进行，与关闭浏览器重叠
+                pipe = build_run_pipeline(stream=stream_mode_enabled())
+                with pipe.track("下载保存", incoming.name):
+                    download.save_as(str(incoming))
+                    stored = store.put(incoming)
+                target = stored.path
                 download_done = True
-                print(f"✓ 下载完成并保存: {target}")
-                context.close()
-                return
+                if stored.unchanged:
+                    # 沿用上一份的文件名，那里可能已经整理、打印过，不再交给流水线
+                    print(f"  · 下载内容与上一份相同，沿用 {target.name}，不再整理 / 打印")
+                else:
+                    pipe.submit(target)
+                    print(f"✓ 下载完成并保存: {target}")
             except Exception as e:
                 print(f"⚠ 未通过 expect_download 成功捕获下载: {e}")
 
@@ -180,6 +229,23 @@ def main():
             input()
             context.close()
             print("✓ 浏览器已关闭")
+        else:
+            try:
+                from session_monitor import save_session_state
+                save_session_state(context)
+            except Exception as e:
+                print(f"⚠ 保存登录状态失败：{e}")
+            t_close = time.perf_counter()
+            context.close()
+
+    if pipe is not None:
+        # 关闭浏览器包括 sync_playwright 退出时结束驱动进程
+        pipe.log("关闭浏览器", "", t_close, time.perf_counter())
+        print("✓ 浏览器已关闭，等待整理 / 打印完成...")
+        errors = pipe.join()
+        pipe.print_timeline()
+        if errors:
+            print(f"⚠ 流水线中有 {errors} 个步骤出错，请检查上面的日志")
 
 # ---------- 稳健点击 ----------
 def try_click_selectors(page, candidates, max_retries=3, parent_levels=5) -> bool:
@@ -267,287 +333,634 @@ def adjust_excel_fit(path_or_file):
     except Exception as e:
         print("无法打开 xlsx：", e)
         return None
+    # 同一内容整理 / 入库过时有汇总缓存，汇总页直接取用（按改写之前的文件内容查）；日期同样要在改写标题前取
+    raw_sha, agg = lookup_aggregates(p)
+    day = order_day(p, wb.worksheets[0]) if wb.worksheets else None
 
-    SCALE_FOR_EXCEL = 1.15
     sheet_last_idx = {}
     original_ws = list(wb.worksheets)
+    route_sheets = {}
+    summary_sheets = []
 
     for ws in original_ws:
         try:
-            max_col = ws.max_column or 0
-            start_col = 2
-            last_idx = 0
-            first_non_empty = None
-
-            for r in ws.iter_rows():
-                for cell in r:
-                    if isinstance(cell.value, str):
-                        if '--' in cell.value:
-                            cell.value = cell.value.replace('--', '')
-                        if '-' in cell.value:
-                            cell.value = cell.value.replace('-', '_')
-                        if ' 斤' in cell.value:
-                            cell.value = cell.value.replace(' 斤', '')
-                    try:
-                        cell.fill = PatternFill(fill_type=None)
-                        cell.font = Font(color=None)
-                    except Exception:
-                        pass
-
-            for c in range(start_col, max_col + 1):
-                v = ws.cell(row=4, column=c).value
-                if v is not None and str(v).strip() != "":
-                    first_non_empty = c
-                    break
-            if first_non_empty:
-                idx = first_non_empty
-                while idx <= max_col:
-                    v = ws.cell(row=4, column=idx).value
-                    if v is None or str(v).strip() == "":
-                        break
-                    last_idx = idx
-                    idx += 1
-            sheet_last_idx[ws.title] = last_idx
+            sheet_last_idx[ws.title] = clean_sheet(ws)
         except Exception as e:
             print(f"⚠ 处理 sheet {ws.title}（替换/清理/计算）时出错，已跳过该 sheet：{e}")
+            continue
+        # 数字文本整列转为数字，之后的分组 / 合计只做数值运算
+        try:
+            report = coerce_sheet(ws)
+            if report.failures:
+                print("⚠ " + report.summary())
+        except Exception as e:
+            print(f"⚠ 转换数量列类型时出错（sheet {ws.title}）：{e}")
 
-    try:
-        if wb.worksheets:
-            first = wb.worksheets[0]
-            first['A1'] = datetime.now().strftime("%Y年%m月%d日") + " 抓鱼单"
-            last_idx = sheet_last_idx.get(first.title, 0)
-            for mr in list(first.merged_cells.ranges):
-                try:
-                    if mr.min_row == 1 and mr.min_col == 1:
-                        first.unmerge_cells(str(mr))
-                except Exception:
-                    pass
-            if last_idx and last_idx >= 1:
-                merge_range = f"A1:{get_column_letter(last_idx)}1"
-                try:
-                    first.merge_cells(merge_range)
-                    print(f"✓ 已把 A1 合并调整为: {merge_range}")
-                except Exception as e:
-                    print("⚠ 调整 A1 合并范围失败：", e)
-    except Exception as e:
-        print("⚠ 写入 A1 / 合并调整时出错：", e)
+    # 旁路输出清理后的明细（CSV / NDJSON），在改写标题前读取原始日期
+    if wb.worksheets and row_export_format():
+        try:
+            export_rows(wb.worksheets[0], p)
+        except Exception as e:
+            print(f"⚠ 输出明细数据时出错：{e}")
+
+    if wb.worksheets:
+        retitle_first_sheet(wb.worksheets[0], sheet_last_idx.get(wb.worksheets[0].title, 0))
 
     for ws in original_ws:
         try:
-            max_col_len = {}
-            for row in ws.iter_rows(values_only=True):
-                for idx, cell in enumerate(row, start=1):
-                    if cell is None:
-                        continue
-                    s = str(cell)
-                    length = 0
-                    for ch in s:
-                        o = ord(ch)
-                        if 0x4E00 <= o <= 0x9FFF or 0x3000 <= o <= 0x303F:
-                            length += 2
-                        else:
-                            length += 1
-                    lines = s.splitlines()
-                    longest = max((len(line) for line in lines), default=0)
-                    est = max(length, longest)
-                    if est > max_col_len.get(idx, 0):
-                        max_col_len[idx] = est
-
-            for idx in range(1, (ws.max_column or 0) + 1):
-                col_letter = get_column_letter(idx)
-                if idx == 1 or idx == 2:
-                    ws.column_dimensions[col_letter].width = 5.0
-                elif idx == 3:
-                    ws.column_dimensions[col_letter].width = 16.0
-                elif idx == 4:
-                    est = max_col_len.get(idx, 0)
-                    width = max(6.0, min(est * SCALE_FOR_EXCEL + 2.0, 20.0))
-                    ws.column_dimensions[col_letter].width = round(width, 1)
-                else:
-                    ws.column_dimensions[col_letter].width = 5.7
-
-            if ws.max_row and ws.max_column:
-                for r in range(1, ws.max_row + 1):
-                    max_lines = 1
-                    for c in range(1, ws.max_column + 1):
-                        v = ws.cell(row=r, column=c).value
-                        if v is None:
-                            continue
-                        lines = str(v).splitlines()
-                        if len(lines) > max_lines:
-                            max_lines = len(lines)
-                    ws.row_dimensions[r].height = max(15, max_lines * 15)
-
-            try:
-                ws.print_title_rows = "1:4"
-                ws.page_setup.orientation = "landscape"
-                ws.page_setup.fitToWidth = 1
-                ws.page_setup.fitToHeight = 0
-                ws.page_margins.left = 0.15
-                ws.page_margins.right = 0.15
-                ws.page_margins.top = 0.40
-                ws.page_margins.bottom = 0.20
-                ws.page_margins.header = 0.0
-                ws.page_margins.footer = 0.0
-                last_idx = sheet_last_idx.get(ws.title, 0) or ws.max_column
-                last_col_letter = get_column_letter(last_idx)
-                ws.print_area = f"A1:{last_col_letter}{ws.max_row}"
-            except Exception as e:
-                print(f"⚠ 设置打印选项时出错（sheet {ws.title}）：{e}")
+            template = load_template(ws)
+            fit_sheet_layout(ws, sheet_last_idx.get(ws.title, 0), template)
+            if template is None:
+                template = save_template(ws)
 
             # ---------- 拆分路线 ----------
             try:
-                numeric_checked = 0
-                numeric_count = 0
                 start_data_row = 5
-                for r in range(start_data_row, (ws.max_row or 0) + 1):
-                    v = ws.cell(row=r, column=1).value
-                    if v is None:
-                        continue
-                    numeric_checked += 1
-                    try:
-                        float(str(v))
-                        numeric_count += 1
-                    except Exception:
-                        pass
-                is_serial_a = (numeric_checked > 0 and numeric_count / numeric_checked >= 0.6)
-
-                if is_serial_a:
-                    from collections import defaultdict
-                    route_rows = defaultdict(list)
-                    for r in range(start_data_row, (ws.max_row or 0) + 1):
-                        a_val = ws.cell(row=r, column=1).value
-                        if a_val is None:
-                            continue
-                        try:
-                            float(str(a_val))
-                        except Exception:
-                            continue
-                        b_val = ws.cell(row=r, column=2).value
-                        key = '未分配' if b_val is None or str(b_val).strip() == '' else str(b_val).strip()
-                        route_rows[key].append(r)
-
-                    MAX_SHEETS = 30
-                    if len(route_rows) > MAX_SHEETS:
-                        print(f"⚠ 路线种类过多（{len(route_rows)}），超过 {MAX_SHEETS}，取消自动拆分。")
+                route_rows = group_route_rows(ws, start_data_row)
+                if route_rows is not None:
+                    if len(route_rows) > MAX_ROUTE_SHEETS:
+                        print(f"⚠ 路线种类过多（{len(route_rows)}），超过 {MAX_ROUTE_SHEETS}，取消自动拆分。")
                     else:
-                        base_name = ws.title
                         used_names = set(wb.sheetnames)
-
-                        def make_unique_sheet_name(base, route):
-                            safe_route = re.sub(r'[\\/:*?\[\]]', '_', route)[:20]
-                            candidate = f"{base}_{safe_route}"
-                            candidate = candidate[:31]
-                            if candidate not in used_names:
-                                used_names.add(candidate)
-                                return candidate
-                            idx = 2
-                            while True:
-                                cand = f"{base}_{safe_route}_{idx}"[:31]
-                                if cand not in used_names:
-                                    used_names.add(cand)
-                                    return cand
-                                idx += 1
-
                         for route, rows in route_rows.items():
-                            new_name = make_unique_sheet_name(base_name, route)
-                            new_ws = wb.create_sheet(title=new_name)
-                            # 复制表头（通常不会包含 0）
-                            for rr in range(1, 5):
-                                for cc in range(1, (ws.max_column or 0) + 1):
-                                    new_ws.cell(row=rr, column=cc).value = ws.cell(row=rr, column=cc).value
-                            dest_row = start_data_row
-                            # 复制数据行：如果值为 0（数字或字符串 '0'）则跳过写入，保持为空
-                            for r in rows:
-                                for cc in range(1, (ws.max_column or 0) + 1):
-                                    val = ws.cell(row=r, column=cc).value
-                                    write_val = True
-                                    if val is None:
-                                        write_val = False
-                                    else:
-                                        try:
-                                            if isinstance(val, (int, float)) and float(val) == 0.0:
-                                                write_val = False
-                                            elif isinstance(val, str) and val.strip() in ("0", "0.0"):
-                                                write_val = False
-                                        except Exception:
-                                            pass
-                                    if write_val:
-                                        new_ws.cell(row=dest_row, column=cc).value = val
-                                dest_row += 1
-                            if dest_row > start_data_row:
-                                new_ws.cell(row=dest_row, column=1).value = '总计'
-                                for cc in range(2, (ws.max_column or 0) + 1):
-                                    s = 0
-                                    any_num = False
-                                    for rr in range(start_data_row, dest_row):
-                                        try:
-                                            v = new_ws.cell(row=rr, column=cc).value
-                                            if v is None or (isinstance(v, str) and str(v).strip() == ""):
-                                                continue
-                                            s += float(v)
-                                            any_num = True
-                                        except Exception:
-                                            pass
-                                    # 仅当合计非 0 时才写入合计，0 值保持为空
-                                    if any_num and abs(s) > 1e-9:
-                                        new_ws.cell(row=dest_row, column=cc).value = int(s) if abs(s - int(s)) < 1e-9 else s
-                            # 仅对新建 sheet 添加边框（不影响原表）
-                            # 计算新 sheet 中最远有内容的行和列（边界从 A1 开始），然后对该矩形区域内所有单元格绘制网格边框
-                            thin = Side(border_style="thin", color="000000")
-                            bd = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-                            last_row = 0
-                            last_col = 0
-                            # 扫描 1..dest_row 行，1..原表最大列 列，找到最远含内容的行/列
-                            max_col_scan = (ws.max_column or 0)
-                            for rr in range(1, dest_row + 1):
-                                for cc in range(1, max_col_scan + 1):
-                                    cell = new_ws.cell(row=rr, column=cc)
-                                    if cell.value is not None and str(cell.value).strip() != "":
-                                        if rr > last_row:
-                                            last_row = rr
-                                        if cc > last_col:
-                                            last_col = cc
-
-                            # 如果找到了边界，则对从 A1 到 (last_col,last_row) 的所有单元格统一设置边框（包含空单元格），
-                            # 以便显示完整网格线；否则保持当前不添加边框
-                            if last_row > 0 and last_col > 0:
-                                for rr in range(1, last_row + 1):
-                                    for cc in range(1, last_col + 1):
-                                        try:
-                                            new_ws.cell(row=rr, column=cc).border = bd
-                                        except Exception:
-                                            pass
-                            # 复制列宽与打印设置到新 sheet
-                            for idx in range(1, (ws.max_column or 0) + 1):
-                                col_letter = get_column_letter(idx)
-                                try:
-                                    new_ws.column_dimensions[col_letter].width = ws.column_dimensions[col_letter].width
-                                except Exception:
-                                    pass
-                            new_ws.print_title_rows = ws.print_title_rows
-                            new_ws.page_setup.orientation = ws.page_setup.orientation
-                            new_ws.page_setup.fitToWidth = ws.page_setup.fitToWidth
-                            new_ws.page_setup.fitToHeight = ws.page_setup.fitToHeight
-                            new_ws.page_margins = ws.page_margins
+                            new_name = make_unique_sheet_name(used_names, ws.title, route)
+                            route_sheets.setdefault(ws.title, []).append(
+                                build_route_sheet(wb, ws, new_name, rows, start_data_row, template))
             except Exception as e:
                 print(f"⚠ 拆分按路线生成 sheet 时出错（sheet {ws.title}）：{e}")
 
+            # ---------- 汇总页（只针对总表） ----------
+            if ws is original_ws[0] and ws.title in route_sheets and summary_enabled():
+                try:
+                    if agg is None:
+                        agg = sheet_aggregates(ws, day)
+                    summary = build_summary_sheet(wb, ws, index=wb.index(ws) + 1, agg=agg)
+                    if summary is not None:
+                        summary_sheets.append(summary)
+                except Exception as e:
+                    print(f"⚠ 生成汇总页时出错（sheet {ws.title}）：{e}")
+
             # 注意：不要在原表上添加边框（仅对新建的按路线拆分的 sheet 添加边框）
 
         except Exception as e:
             print(f"⚠ 处理 sheet {ws.title}（列宽/行高）时出错，已跳过该 sheet：{e}")
             continue
 
+    # 拼版模式：把多条小路线合并到同一页，减少页数与打印作业
+    packed_sheets = []
+    if pack_mode_enabled():
+        for base_title, sheets in route_sheets.items():
+            try:
+                packed = pack_route_sheets(wb, sheets, f"{base_title}_拼版"[:31])
+                if packed is not None:
+                    packed_sheets.append(packed)
+            except Exception as e:
+                print(f"⚠ 拼版时出错（sheet {base_title}）：{e}")
+
+    # 纸张方向 / 缩放 / 分页由分页规划统一决定（页数最少且不小于最小字号）；拼版与汇总页已各自规划
+    plan_workbook(wb, sheets=[w for w in wb.worksheets if w not in packed_sheets and w not in summary_sheets])
+
+    # 先写临时文件再整体替换：下载文件可能是下载仓库对象的硬链接，原地写会改坏仓库里的原始内容；
+    # 写到一半中断时原文件也保持完整
+    tmp = p.with_name(f".{p.name}.tmp")
     try:
-        wb.save(p)
+        wb.save(tmp)
+        os.replace(str(tmp), str(p))
         print("✓ 已调整并保存：", p)
+        remember_aggregates(p, agg, raw_sha)
     except Exception as e:
         print("⚠ 保存调整后的 xlsx 时出错：", e)
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
         return None
     return p
 
+# ---------- Excel 整理：各步骤 ----------
+SCALE_FOR_EXCEL = 1.15
+MAX_ROUTE_SHEETS = 30
+
+
+def clean_sheet(ws):
+    """替换 '--'、'-'、' 斤'（及 NORMALIZE_UNITS 单位），清除填充、重置颜色；返回第 4 行表头最后一个连续非空列（用于 A1 合并与打印区域）。"""
+    max_col = ws.max_column or 0
+    start_col = 2
+    last_idx = 0
+    first_non_empty = None
+
+    normalize = default_normalizer().normalize
+    for r in ws.iter_rows():
+        for cell in r:
+            v = cell.value
+            if isinstance(v, str):
+                # 替换规则编译为一个正则，结果按原字符串缓存（见 normalize.py）
+                nv = normalize(v)
+                if nv != v:
+                    cell.value = nv
+            try:
+                cell.fill = PatternFill(fill_type=None)
+                cell.font = Font(color=None)
+            except Exception:
+                pass
+
+    for c in range(start_col, max_col + 1):
+        v = ws.cell(row=4, column=c).value
+        if v is not None and str(v).strip() != "":
+            first_non_empty = c
+            break
+    if first_non_empty:
+        idx = first_non_empty
+        while idx <= max_col:
+            v = ws.cell(row=4, column=idx).value
+            if v is None or str(v).strip() == "":
+                break
+            last_idx = idx
+            idx += 1
+    return last_idx
+
+
+def retitle_first_sheet(first, last_idx):
+    """A1 写入当天日期标题，并把 A1 合并范围收紧到表头最后一列。"""
+    try:
+        first['A1'] = datetime.now().strftime("%Y年%m月%d日") + " 抓鱼单"
+        for mr in list(first.merged_cells.ranges):
+            try:
+                if mr.min_row == 1 and mr.min_col == 1:
+                    first.unmerge_cells(str(mr))
+            except Exception:
+                pass
+        if last_idx and last_idx >= 1:
+            merge_range = f"A1:{get_column_letter(last_idx)}1"
+            try:
+                first.merge_cells(merge_range)
+                print(f"✓ 已把 A1 合并调整为: {merge_range}")
+            except Exception as e:
+                print("⚠ 调整 A1 合并范围失败：", e)
+    except Exception as e:
+        print("⚠ 写入 A1 / 合并调整时出错：", e)
+
+
+def _text_width(value):
+    """估算显示宽度：中文按 2 个字符计，多行取最长一行与总长中的较大者。"""
+    s = str(value)
+    length = 0
+    for ch in s:
+        o = ord(ch)
+        if 0x4E00 <= o <= 0x9FFF or 0x3000 <= o <= 0x303F:
+            length += 2
+        else:
+            length += 1
+    longest = max((len(line) for line in s.splitlines()), default=0)
+    return max(length, longest)
+
+
+def note_column_width(ws):
+    """备注列（D）宽度：按当天内容估算，6-20 之间。"""
+    est = max((_text_width(v) for (v,) in ws.iter_rows(min_col=4, max_col=4, values_only=True) if v is not None),
+              default=0)
+    return round(max(6.0, min(est * SCALE_FOR_EXCEL + 2.0, 20.0)), 1)
+
+
+def fit_sheet_layout(ws, last_idx, template=None):
+    """
+    按内容设置列宽 / 行高，设置打印标题行、页边距与打印区域。
+    有同一表头的版式模板（layout_template）时直接套用列宽，只按内容计算备注列宽与行高。
+    """
+    if template is not None:
+        template.apply_widths(ws, note_column_width(ws))
+    else:
+        for idx in range(1, (ws.max_column or 0) + 1):
+            col_letter = get_column_letter(idx)
+            if idx == 1 or idx == 2:
+                ws.column_dimensions[col_letter].width = 5.0
+            elif idx == 3:
+                ws.column_dimensions[col_letter].width = 16.0
+            elif idx == 4:
+                ws.column_dimensions[col_letter].width = note_column_width(ws)
+            else:
+                ws.column_dimensions[col_letter].width = 5.7
+
+    if ws.max_row and ws.max_column:
+        for r in range(1, ws.max_row + 1):
+            max_lines = 1
+            for c in range(1, ws.max_column + 1):
+                v = ws.cell(row=r, column=c).value
+                if v is None:
+                    continue
+                lines = str(v).splitlines()
+                if len(lines) > max_lines:
+                    max_lines = len(lines)
+            ws.row_dimensions[r].height = max(15, max_lines * 15)
+
+    try:
+        ws.print_title_rows = "1:4"
+        ws.page_margins.left = 0.15
+        ws.page_margins.right = 0.15
+        ws.page_margins.top = 0.40
+        ws.page_margins.bottom = 0.20
+        ws.page_margins.header = 0.0
+        ws.page_margins.footer = 0.0
+        last_idx = last_idx or ws.max_column
+        last_col_letter = get_column_letter(last_idx)
+        ws.print_area = f"A1:{last_col_letter}{ws.max_row}"
+    except Exception as e:
+        print(f"⚠ 设置打印选项时出错（sheet {ws.title}）：{e}")
+
+
+def group_route_rows(ws, start_data_row=5):
+    """
+    A 列为序号（≥60% 为数字）时，按 B 列线路分组数据行，返回 {线路: [行号]}；否则返回 None。
+    序号已由 coerce_sheet 转为数字，这里只按类型判断。
+    """
+    numeric_checked = 0
+    route_rows = {}
+    for r, (a_val, b_val) in enumerate(ws.iter_rows(min_row=start_data_row, max_col=2, values_only=True),
+                                       start=start_data_row):
+        if a_val is None:
+            continue
+        numeric_checked += 1
+        if type(a_val) not in (int, float):
+            continue
+        key = '未分配' if b_val is None or str(b_val).strip() == '' else str(b_val).strip()
+        route_rows.setdefault(key, []).append(r)
+    numeric_count = sum(len(rows) for rows in route_rows.values())
+    if not (numeric_checked > 0 and numeric_count / numeric_checked >= 0.6):
+        return None
+    return route_rows
+
+
+def make_unique_sheet_name(used_names, base, route):
+    """生成不重复且不超过 31 个字符的路线 sheet 名，并登记到 used_names。"""
+    safe_route = re.sub(r'[\\/:*?\[\]]', '_', route)[:20]
+    candidate = f"{base}_{safe_route}"
+    candidate = candidate[:31]
+    if candidate not in used_names:
+        used_names.add(candidate)
+        return candidate
+    idx = 2
+    while True:
+        cand = f"{base}_{safe_route}_{idx}"[:31]
+        if cand not in used_names:
+            used_names.add(cand)
+            return cand
+        idx += 1
+
+# ---------- 按路线生成 sheet ----------
+def is_blank_or_zero(val):
+    """空值、数字 0、字符串 '0' / '0.0' 视为无数据（路线 sheet 中保持为空）。"""
+    if val is None:
+        return True
+    try:
+        if isinstance(val, (int, float)) and float(val) == 0.0:
+            return True
+        if isinstance(val, str) and val.strip() in ("", "0", "0.0"):
+            return True
+    except Exception:
+        pass
+    return False
+
+
+def route_column_totals(data, max_col):
+    """按列合计路线数据：返回 {列号: (合计, 是否有数字, 是否有文本)}，第 1 列（序号）不参与。"""
+    totals = {}
+    for cc in range(2, max_col + 1):
+        s = 0
+        any_num = False
+        any_text = False
+        for vals in data:
+            v = vals[cc - 1]
+            if v is None:
+                continue
+            # 数量已由 coerce_sheet 转为数字；仍是文本的是无法识别的单元格
+            if type(v) in (int, float):
+                s += v
+                any_num = True
+            elif not (isinstance(v, str) and v.strip() == ""):
+                any_text = True
+        totals[cc] = (s, any_num, any_text)
+    return totals
+
+
+def copy_route_header(ws, new_ws, keep, col_map, start_data_row=5):
+    """逐格复制表头（通常不会包含 0）：合并单元格按保留的列重新合并。"""
+    header_merges = [mr for mr in ws.merged_cells.ranges if mr.max_row < start_data_row]
+    covered = set()
+    for mr in header_merges:
+        for rr in range(mr.min_row, mr.max_row + 1):
+            for cc in range(mr.min_col, mr.max_col + 1):
+                covered.add((rr, cc))
+    for rr in range(1, start_data_row):
+        for src in keep:
+            if (rr, src) not in covered:
+                new_ws.cell(row=rr, column=col_map[src]).value = ws.cell(row=rr, column=src).value
+    for mr in header_merges:
+        cols = [col_map[c] for c in range(mr.min_col, mr.max_col + 1) if c in col_map]
+        if not cols:
+            continue
+        new_ws.cell(row=mr.min_row, column=cols[0]).value = ws.cell(row=mr.min_row, column=mr.min_col).value
+        if len(cols) > 1 or mr.max_row > mr.min_row:
+            try:
+                new_ws.merge_cells(start_row=mr.min_row, start_column=cols[0],
+                                   end_row=mr.max_row, end_column=cols[-1])
+            except Exception:
+                pass
+
+
+def build_route_sheet(wb, ws, new_name, rows, start_data_row=5, template=None):
+    """
+    按路线生成 sheet：复制表头与该路线的数据行（0 值留空），追加 总计 行，
+    并去掉该路线合计为空 / 0 的数量列，表头 1-4 行（含合并单元格）随之压缩。
+    给出版式模板时表头、列宽与打印设置从模板克隆。
+    """
+    max_col = ws.max_column or 0
+    new_ws = wb.create_sheet(title=new_name)
+
+    # 读取数据行：如果值为 0（数字或字符串 '0'）则视为空
+    data = []
+    for r in rows:
+        data.append([None if is_blank_or_zero(v) else v
+                     for v in (ws.cell(row=r, column=cc).value for cc in range(1, max_col + 1))])
+    totals = route_column_totals(data, max_col)
+
+    # 数量列中该路线全为空 / 合计为 0 的列不输出；序号、线路、门店、备注、打标等前置列始终保留
+    qty_start = template.qty_start if template is not None else find_qty_start_col(ws)
+    keep = []
+    for cc in range(1, max_col + 1):
+        if cc < qty_start:
+            keep.append(cc)
+            continue
+        s, any_num, any_text = totals[cc]
+        if any_text or (any_num and abs(s) > 1e-9):
+            keep.append(cc)
+    col_map = {src: dst for dst, src in enumerate(keep, start=1)}
+
+    use_template = template is not None and start_data_row - 1 == HEADER_ROWS
+    if use_template:
+        # 表头、列宽、打印标题行与页边距从版式模板克隆
+        widths = {src: ws.column_dimensions[get_column_letter(src)].width for src in keep}
+        template.clone_header(new_ws, keep, ws.cell(row=1, column=1).value, widths)
+    else:
+        copy_route_header(ws, new_ws, keep, col_map, start_data_row)
+
+    dest_row = start_data_row
+    for vals in data:
+        for src in keep:
+            val = vals[src - 1]
+            if val is not None:
+                new_ws.cell(row=dest_row, column=col_map[src]).value = val
+        dest_row += 1
+    if dest_row > start_data_row:
+        new_ws.cell(row=dest_row, column=1).value = '总计'
+        for src in keep:
+            if src < 2:
+                continue
+            s, any_num, _ = totals[src]
+            # 仅当合计非 0 时才写入合计，0 值保持为空
+            if any_num and abs(s) > 1e-9:
+                new_ws.cell(row=dest_row, column=col_map[src]).value = int(s) if abs(s - int(s)) < 1e-9 else s
+
+    # 仅对新建 sheet 添加边框（不影响原表）
+    # 计算新 sheet 中最远有内容的行和列（边界从 A1 开始），然后对该矩形区域内所有单元格绘制网格边框
+    thin = Side(border_style="thin", color="000000")
+    bd = Border(left=thin, right=thin, top=thin, bottom=thin)
+    last_row = 0
+    last_col = 0
+    for rr in range(1, dest_row + 1):
+        for cc in range(1, len(keep) + 1):
+            cell = new_ws.cell(row=rr, column=cc)
+            if cell.value is not None and str(cell.value).strip() != "":
+                if rr > last_row:
+                    last_row = rr
+                if cc > last_col:
+                    last_col = cc
+    if last_row > 0 and last_col > 0:
+        for rr in range(1, last_row + 1):
+            for cc in range(1, last_col + 1):
+                try:
+                    new_ws.cell(row=rr, column=cc).border = bd
+                except Exception:
+                    pass
+
+    # 复制列宽与打印设置到新 sheet（模板克隆时已设置），打印区域只覆盖保留下来的列
+    if not use_template:
+        for src in keep:
+            try:
+                new_ws.column_dimensions[get_column_letter(col_map[src])].width = \
+                    ws.column_dimensions[get_column_letter(src)].width
+            except Exception:
+                pass
+        new_ws.print_title_rows = ws.print_title_rows
+        new_ws.page_margins = ws.page_margins
+    if last_row > 0 and last_col > 0:
+        new_ws.print_area = f"A1:{get_column_letter(last_col)}{last_row}"
+    dropped = max_col - len(keep)
+    if dropped:
+        print(f"  · {new_name}: 省略 {dropped} 个无数据列，保留 {len(keep)} 列")
+    return new_ws
+
+# ---------- 拼版 ----------
+CUT_GAP_ROW_PT = 9.0
+
+
+def pack_mode_enabled():
+    """--pack 参数或环境变量 PACK_ROUTES=1 开启拼版模式。"""
+    return "--pack" in sys.argv or os.environ.get("PACK_ROUTES", "").lower() in ("1", "true", "yes")
+
+
+def _copy_block(src, dst, row_offset):
+    """把 src 打印区域内的值、边框、合并单元格、行高复制到 dst 的 row_offset 行起，返回占用行数。"""
+    col_pts, row_pts = measure_sheet(src)
+    n_rows, n_cols = len(row_pts), len(col_pts)
+    for r in range(1, n_rows + 1):
+        for c in range(1, n_cols + 1):
+            cell = src.cell(row=r, column=c)
+            out = dst.cell(row=row_offset + r - 1, column=c)
+            if cell.value is not None:
+                out.value = cell.value
+            if cell.has_style:
+                out.border = cell.border.copy()
+        h = src.row_dimensions[r].height
+        if h:
+            dst.row_dimensions[row_offset + r - 1].height = h
+    for mr in src.merged_cells.ranges:
+        if mr.max_row <= n_rows:
+            dst.merge_cells(start_row=mr.min_row + row_offset - 1, start_column=mr.min_col,
+                            end_row=mr.max_row + row_offset - 1, end_column=mr.max_col)
+    return n_rows
+
+
+def pack_route_sheets(wb, sheets, packed_name):
+    """
+    拼版：按预计块高装箱，把能放进一页的路线 sheet（各自带表头与总计行）依次排到同一个 sheet，
+    块之间留剪切线，每页之间显式分页；被合并的路线 sheet 从工作簿中移除。没有减少页数时不做处理。
+    """
+    if len(sheets) < 2:
+        return None
+    blocks = [measure_sheet(ws) for ws in sheets]
+    m = sheets[0].page_margins
+    margins = (m.left or 0.0, m.right or 0.0, m.top or 0.0, m.bottom or 0.0)
+    plan = plan_packing([b[0] for b in blocks], [b[1] for b in blocks],
+                        gap_pt=CUT_GAP_ROW_PT * 2, margins=margins)
+    if not plan:
+        return None
+    packed_count = sum(len(b) for b in plan["bins"])
+    if packed_count < 2 or plan["pages"] >= packed_count:
+        print(f"  · {packed_name}: 拼版不能减少页数，保持每条路线单独一页")
+        return None
+
+    packed = wb.create_sheet(title=packed_name)
+    cut = Side(border_style="dashed", color="808080")
+    widths = {}
+    row = 1
+    for bi, bin_ in enumerate(plan["bins"]):
+        for k, i in enumerate(bin_):
+            src = sheets[i]
+            row += _copy_block(src, packed, row)
+            for c in range(1, len(blocks[i][0]) + 1):
+                letter = get_column_letter(c)
+                w = src.column_dimensions[letter].width
+                if w and w > widths.get(letter, 0):
+                    widths[letter] = w
+            if k < len(bin_) - 1:
+                # 剪切线：两行半高空行，中间画虚线
+                width = max(len(blocks[j][0]) for j in bin_)
+                for c in range(1, width + 1):
+                    packed.cell(row=row, column=c).border = Border(bottom=cut)
+                packed.row_dimensions[row].height = CUT_GAP_ROW_PT
+                packed.row_dimensions[row + 1].height = CUT_GAP_ROW_PT
+                row += 2
+        if bi < len(plan["bins"]) - 1:
+            packed.row_breaks.append(Break(id=row - 1))
+    for letter, w in widths.items():
+        packed.column_dimensions[letter].width = w
+
+    packed.page_margins = sheets[0].page_margins
+    packed.page_setup.paperSize = packed.PAPERSIZE_A4
+    packed.page_setup.orientation = plan["orientation"]
+    packed.page_setup.scale = plan["scale"]
+    packed.sheet_properties.pageSetUpPr.fitToPage = False
+    packed.print_area = f"A1:{get_column_letter(max(len(b[0]) for b in blocks))}{row - 1}"
+
+    for bin_ in plan["bins"]:
+        for i in bin_:
+            wb.remove(sheets[i])
+    orient = "横向" if plan["orientation"] == "landscape" else "纵向"
+    print(f"✓ 拼版：{packed_count} 条路线合并为 {plan['pages']} 页（{packed_name}，{orient} {plan['scale']}%）")
+    return packed
+
+# ---------- 按 sheet 拆分打印文件 ----------
+def iter_route_files(xlsx_path, out_dir=None):
+    """把整理后的工作簿按 sheet 拆成独立 xlsx（每条路线一个打印作业），逐个产出 (sheet 名, 路径, 预计页数)。"""
+    p = Path(xlsx_path)
+    out_dir = Path(out_dir) if out_dir else p.parent / f"{p.stem}_路线"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    names = openpyxl.load_workbook(p, read_only=True).sheetnames
+    for i, name in enumerate(names, start=1):
+        wb = openpyxl.load_workbook(p)
+        for other in list(wb.worksheets):
+            if other.title != name:
+                wb.remove(other)
+        ws = wb.worksheets[0]
+        pages = (len(ws.row_breaks.brk) + 1) * (len(ws.col_breaks.brk) + 1)
+        target = out_dir / f"{i:02d}_{safe_file_part(name)}.xlsx"
+        wb.save(target)
+        yield name, target, pages
+
+
+def export_route_files(xlsx_path, out_dir=None):
+    """把整理后的工作簿按 sheet 拆成独立 xlsx，返回 [(sheet 名, 路径, 预计页数)]。"""
+    return list(iter_route_files(xlsx_path, out_dir))
+
+# ---------- 流式输出路线 ----------
+def stream_mode_enabled():
+    """--stream 参数或环境变量 STREAM_ROUTES=1 开启流式模式。"""
+    return "--stream" in sys.argv or os.environ.get("STREAM_ROUTES", "").lower() in ("1", "true", "yes")
+
+
+def route_priority():
+    """路线打印优先级：--route-order A,C,B 或环境变量 ROUTE_ORDER=A,C,B（例如最早出车的路线在前）。"""
+    raw = os.environ.get("ROUTE_ORDER", "")
+    if "--route-order" in sys.argv:
+        i = sys.argv.index("--route-order")
+        if i + 1 < len(sys.argv):
+            raw = sys.argv[i + 1]
+    return [r.strip() for r in re.split(r"[,，\s]+", raw) if r.strip()]
+
+
+def order_routes(routes, priority):
+    """按优先级排序路线；未列出的路线保持原出现顺序排在后面。"""
+    rank = {r: i for i, r in enumerate(priority)}
+    return sorted(routes, key=lambda r: (rank.get(r, len(rank)), routes.index(r)))
+
+
+def stream_routes(path_or_file, priority=None, out_dir=None):
+    """
+    流式模式：不等整个工作簿处理完，按优先级逐条路线生成单独的 xlsx，生成一条就产出一条
+    (sheet 名, 路径, 预计页数)，最后产出总表。原文件不修改（完整整理仍由 adjust_excel_fit 负责）。
+    """
+    t0 = time.perf_counter()
+    p = Path(path_or_file)
+    wb = openpyxl.load_workbook(p)
+    _, agg = lookup_aggregates(p)
+    day = order_day(p, wb.worksheets[0]) if wb.worksheets else None
+    out_dir = Path(out_dir) if out_dir else p.parent / f"{p.stem}_路线"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    priority = route_priority() if priority is None else priority
+    if pack_mode_enabled():
+        print("⚠ 流式模式逐条输出路线，拼版设置不生效")
+
+    seq = 0
+    for ws in list(wb.worksheets):
+        last_idx = clean_sheet(ws)
+        report = coerce_sheet(ws)
+        if report.failures:
+            print("⚠ " + report.summary())
+        if ws is wb.worksheets[0]:
+            retitle_first_sheet(ws, last_idx)
+        template = load_template(ws)
+        fit_sheet_layout(ws, last_idx, template)
+        if template is None:
+            template = save_template(ws)
+        route_rows = group_route_rows(ws)
+        if route_rows is None or len(route_rows) > MAX_ROUTE_SHEETS:
+            continue
+        used_names = set(wb.sheetnames)
+        for route in order_routes(list(route_rows), priority):
+            out_wb = openpyxl.Workbook()
+            placeholder = out_wb.active
+            name = make_unique_sheet_name(used_names, ws.title, route)
+            rs = build_route_sheet(out_wb, ws, name, route_rows[route], template=template)
+            out_wb.remove(placeholder)
+            plan = plan_sheet(rs)
+            seq += 1
+            target = out_dir / f"{seq:02d}_{safe_file_part(name)}.xlsx"
+            out_wb.save(target)
+            if seq == 1:
+                print(f"✓ 第一条路线 {route} 已可打印（{time.perf_counter() - t0:.2f}s）")
+            yield name, target, plan["pages"] if plan else 1
+        if ws is wb.worksheets[0] and summary_enabled():
+            out_wb = openpyxl.Workbook()
+            placeholder = out_wb.active
+            if agg is None:
+                agg = sheet_aggregates(ws, day)
+                # 流式模式不改原文件：按原文件内容登记，归档入库时直接沿用
+                remember_aggregates(p, agg)
+            summary = build_summary_sheet(out_wb, ws, agg=agg)
+            if summary is not None:
+                out_wb.remove(placeholder)
+                seq += 1
+                target = out_dir / f"{seq:02d}_{safe_file_part(summary.title)}.xlsx"
+                out_wb.save(target)
+                yield summary.title, target, (len(summary.row_breaks.brk) + 1) * (len(summary.col_breaks.brk) + 1)
+
+    # 总表最后输出
+    plans = plan_workbook(wb)
+    seq += 1
+    target = out_dir / f"{seq:02d}_总表.xlsx"
+    wb.save(target)
+    yield "总表", target, sum(pl["pages"] for pl in plans.values()) or 1
+
 # ---------- 静默打印 ----------
 def get_system_printers():
     """返回系统中可见的打印机名称列表（优先使用 PowerShell，回退到 WMIC）。"""
@@ -657,15 +1070,8 @@ def set_default_printer(printer_name, retries=3, delay=0.6):
     return False
 
 
-def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default_printer=r"Fujitsu DPK750PRO"):
-    import subprocess
-    import os
-    import time
-    try:
-        import ctypes
-    except Exception:
-        ctypes = None
-
+def choose_printer(printer_name):
+    """在系统打印机里找与 printer_name 对应的那一台（完全相同 > 包含 / Canon > 第一台）。"""
     printers = get_system_printers()
     print(f"检测到系统打印机（{len(printers)}）：{printers}")
     chosen = None
@@ -684,21 +1090,55 @@ def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default
     else:
         chosen = printer_name
     print(f"选择用于打印的打印机: '{chosen}' (请求名: '{printer_name}')")
+    return chosen
 
-    # 保存当前默认打印机，便于恢复
-    original_default = get_default_printer()
-    if original_default:
-        print(f"当前系统默认打印机: {original_default}")
-    else:
-        print("当前系统默认打印机: 未检测到")
 
-    # 先尝试把默认打印机设置为我们要使用的打印机，降低在系统对话中需手动选择的概率
+def _set_active_printer(xl, chosen):
+    """设置 Excel 的 ActivePrinter；Excel 要求 "名称 on NeXX:" 形式时逐个尝试。"""
     try:
-        ok_set = set_default_printer(chosen)
-        if not ok_set:
-            print(f"⚠ 无法将系统默认打印机切换到 '{chosen}'，将继续尝试打印但可能需要人工确认打印对话。")
-    except Exception as e:
-        print(f"⚠ 尝试设置默认打印机时发生异常: {e}")
+        xl.ActivePrinter = chosen
+        return
+    except Exception:
+        pass
+    for i in range(0, 8):
+        try:
+            xl.ActivePrinter = f"{chosen} on Ne0{i}:"
+            return
+        except Exception:
+            continue
+
+
+def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default_printer=r"Fujitsu DPK750PRO",
+                          switch_default=True):
+    """
+    switch_default=False 时不切换系统默认打印机（Excel COM 与 printto 都显式指定打印机），
+    多台打印机可以同时调用；此时不使用只能打印到默认打印机的 os.startfile 回退。
+    """
+    import subprocess
+    import os
+    import time
+    try:
+        import ctypes
+    except Exception:
+        ctypes = None
+
+    chosen = choose_printer(printer_name)
+
+    if switch_default:
+        # 保存当前默认打印机，便于恢复
+        original_default = get_default_printer()
+        if original_default:
+            print(f"当前系统默认打印机: {original_default}")
+        else:
+            print("当前系统默认打印机: 未检测到")
+
+        # 先尝试把默认打印机设置为我们要使用的打印机，降低在系统对话中需手动选择的概率
+        try:
+            ok_set = set_default_printer(chosen)
+            if not ok_set:
+                print(f"⚠ 无法将系统默认打印机切换到 '{chosen}'，将继续尝试打印但可能需要人工确认打印对话。")
+        except Exception as e:
+            print(f"⚠ 尝试设置默认打印机时发生异常: {e}")
 
     try:
         import win32com.client
@@ -706,16 +1146,7 @@ def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default
         xl = win32com.client.DispatchEx("Excel.Application")
         xl.Visible = False
         wb = xl.Workbooks.Open(os.path.abspath(str(xlsx_path)))
-        try:
-            xl.ActivePrinter = chosen
-        except Exception:
-            for i in range(0, 8):
-                try_name = f"{chosen} on Ne0{i}:"
-                try:
-                    xl.ActivePrinter = try_name
-                    break
-                except Exception:
-                    continue
+        _set_active_printer(xl, chosen)
         wb.PrintOut(Copies=1)
         wb.Close(SaveChanges=False)
         xl.Quit()
@@ -753,6 +1184,9 @@ def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default
     except Exception as e:
         print("⚠ ShellExecuteW printto 调用异常：", e)
 
+    if not switch_default:
+        print(f"❌ 无法静默打印到 '{chosen}'（未切换默认打印机，跳过 os.startfile 回退）")
+        return False
     try:
         print("尝试 os.startfile(..., 'print') 作为回退（可能会弹出对话框）")
         os.startfile(os.path.abspath(str(xlsx_path)), 'print')
@@ -770,11 +1204,117 @@ def silent_print_with_wps(xlsx_path, printer_name=r"Canon LBP2900", post_default
     print("❌ 所有打印方法均失败，无法静默打印")
     return False
 
+class ExcelPrintSession:
+    """
+    一次运行内连续打印多个文件（每条路线一个）：打印机只查找一次，Excel 只启动一次，
+    ActivePrinter 指定打印机，不切换系统默认打印机。
+    COM 对象只能在创建它的线程里使用：print_file / close 要在同一个线程调用（流水线的打印阶段、打印机池的单线程队列）。
+    Excel 不可用或打印出错时，该文件回退到 silent_print_with_wps。
+    """
+
+    def __init__(self, printer_name=r"Canon LBP2900", switch_default=True):
+        self.printer_name = printer_name
+        self.switch_default = switch_default
+        self.chosen = None
+        self.xl = None
+        self.printed = 0
+
+    def _excel(self):
+        if self.xl is None:
+            import win32com.client
+            try:
+                import pythoncom
+                pythoncom.CoInitialize()
+            except Exception:
+                pass
+            if self.chosen is None:
+                self.chosen = choose_printer(self.printer_name)
+            xl = win32com.client.DispatchEx("Excel.Application")
+            xl.Visible = False
+            xl.DisplayAlerts = False
+            _set_active_printer(xl, self.chosen)
+            self.xl = xl
+        return self.xl
+
+    def print_file(self, xlsx_path):
+        try:
+            xl = self._excel()
+            wb = xl.Workbooks.Open(os.path.abspath(str(xlsx_path)))
+            try:
+                wb.PrintOut(Copies=1)
+            finally:
+                wb.Close(SaveChanges=False)
+            self.printed += 1
+            print(f"✓ Excel COM: {Path(xlsx_path).name} 已发送到 {self.chosen}")
+            return True
+        except Exception as e:
+            print(f"⚠ Excel COM 打印 {Path(xlsx_path).name} 失败：{e}，改用逐个打印")
+            self.close()
+            # 切换了默认打印机时与逐个打印一样恢复为 Fujitsu；不切换时默认打印机保持不动
+            post_default = r"Fujitsu DPK750PRO" if self.switch_default else None
+            return silent_print_with_wps(str(xlsx_path), self.chosen or self.printer_name,
+                                         post_default_printer=post_default, switch_default=self.switch_default)
+
+    def close(self):
+        if self.xl is not None:
+            try:
+                self.xl.Quit()
+            except Exception:
+                pass
+            self.xl = None
+            try:
+                import pythoncom
+                pythoncom.CoUninitialize()
+            except Exception:
+                pass
+
+# ---------- 打印入口 ----------
+def print_output(xlsx_path):
+    """
+    配置了打印机池（printers.json）时按路线分发到多台打印机；
+    设置了 PRINTER_URI（socket://host:9100 或 ipp://host:631/ipp/print）时直连网络打印；否则走 WPS/Excel 静默打印。
+    """
+    from printer_pool import load_printer_config, print_with_pool
+    printers_conf = load_printer_config()
+    if printers_conf:
+        if print_with_pool(xlsx_path, printers_conf):
+            return True
+        print("⚠ 打印机池有作业失败，请检查上面的日志")
+        return False
+    printer_uri = os.environ.get("PRINTER_URI", "").strip()
+    if printer_uri:
+        from net_print import net_print_file, shared_printer
+        timeout = float(os.environ.get("PRINT_TIMEOUT", "60"))
+        # 按路线逐个打印时共用一个 NetPrinter，连接在文件之间复用
+        sent = net_print_file(xlsx_path, printer_uri, timeout=timeout, printer=shared_printer(printer_uri, timeout))
+        if sent:
+            return True
+        if sent is False:
+            # 数据可能已被打印机接收，改用系统打印会重复打印
+            print(f"⚠ 网络打印发送失败，未改用系统打印，请检查打印机是否已打出 {Path(xlsx_path).name}")
+            return False
+        print("⚠ 网络打印未发出，回退到系统打印")
+    return silent_print_with_wps(str(xlsx_path), r"Canon LBP2900")
+
 # ---------- 入口 ----------
 if __name__ == "__main__":
     try:
         ensure_playwright_installed()
-        main()
+        if "--serve" in sys.argv:
+            from http_service import run
+            run()
+        elif "--watch" in sys.argv:
+            from watch_folder import run
+            i = sys.argv.index("--watch")
+            run(sys.argv[i + 1] if i + 1 < len(sys.argv) and not sys.argv[i + 1].startswith("-") else None)
+        elif "--daemon" in sys.argv:
+            from daemon import run
+            run()
+        elif "--async" in sys.argv or "--multi" in sys.argv:
+            from async_fetch import run
+            run()
+        else:
+            main()
     except KeyboardInterrupt:
         print("\n\n⚠️  程序被用户中断")
         sys.exit(0)
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+下载仓库：按内容哈希保存每一份导出，downloads 下的 抓鱼单YYYYMMDD[_看板][_N].xlsx 只是指向它的硬链接。
+  - 对象：downloads/.store/objects/<哈希前两位>/<哈希>.xlsx，内容相同的导出只存一份
+  - 索引：downloads/.store/index.json，文件名 → 哈希、（日期, 看板）→ 下一个序号 / 最新文件，查找与取名都是 O(1)，
+    不再逐个试探 _1、_2 … 是否存在
+  - 同一天同一看板再次导出内容完全相同时，直接复用上一份文件名，不再生成新的 _N 副本；
+    put 返回 PutResult(path, sha, unchanged)，unchanged 为 True 时 path 可能已是整理后的文件，调用方不应当作新下载
+  - 仓库管理的文件名只能通过 discard / compact 删除（同时更新索引），不要直接 unlink
+  - 文件系统不支持硬链接时退化为复制；整理（adjust_excel_fit）整体替换文件，不会改到仓库里的原始内容
+  - 保留策略：STORE_KEEP_DAYS（默认 90，0 表示不清理）天以前的导出连同其路线 / 数据目录、运行日志、汇总缓存一起清理；
+    STORE_MAX_MB（默认不限）超出时从最早的日期开始清理；每天第一次保存时自动整理一次
+python download_store.py [--import] [--compact] [--stats]
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sheet_utils import safe_file_part
+
+STORE_DIRNAME = ".store"
+NAME_PREFIX = "抓鱼单"
+
+# path：友好文件名；sha：原始内容哈希；unchanged：与同一天同一看板的上一份内容相同，沿用了原文件名
+PutResult = namedtuple("PutResult", "path sha unchanged")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store_for(downloads_dir=None):
+    """每个下载目录一个仓库实例（进程内共享索引与锁）。"""
+    if downloads_dir is None:
+        from dingding_export import resolve_downloads_dir
+        downloads_dir = resolve_downloads_dir()
+    key = str(Path(downloads_dir).resolve())
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = DownloadStore(downloads_dir)
+        return _stores[key]
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(str(src), str(dst))
+    except OSError:
+        shutil.copy2(str(src), str(dst))
+
+
+class DownloadStore:
+    def __init__(self, downloads_dir):
+        self.downloads_dir = Path(downloads_dir)
+        self.root = self.downloads_dir / STORE_DIRNAME
+        self.index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.index = self._load()
+
+    # ---------- 索引 ----------
+    def _load(self):
+        try:
+            self._mtime = self.index_path.stat().st_mtime
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self._mtime = None
+            data = {}
+        data.setdefault("names", {})
+        data.setdefault("next", {})
+        data.setdefault("latest", {})
+        data.setdefault("compacted", "")
+        return data
+
+    def _refresh(self):
+        """其它进程（常驻模式 / 监视文件夹）可能改过索引，修改前重新读取。"""
+        try:
+            mtime = self.index_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            self.index = self._load()
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(f"index.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.index, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(str(tmp), str(self.index_path))
+        self._mtime = self.index_path.stat().st_mtime
+
+    def object_path(self, sha):
+        return self.root / "objects" / sha[:2] / f"{sha}.xlsx"
+
+    def incoming_path(self):
+        """下载先写到仓库内的临时文件，保存时再按哈希归档。"""
+        incoming = self.root / "incoming"
+        incoming.mkdir(parents=True, exist_ok=True)
+        return incoming / f"{uuid.uuid4().hex}.xlsx"
+
+    def lookup(self, name):
+        """友好文件名 → 原始内容的哈希。"""
+        entry = self.index["names"].get(Path(name).name)
+        return entry["sha"] if entry else None
+
+    def owns(self, path):
+        """path 是否是仓库建立的友好文件名（由保存它的程序自己整理 / 打印）。"""
+        path = Path(path)
+        if path.parent.resolve() != self.downloads_dir.resolve():
+            return False
+        with self._lock:
+            self._refresh()
+            return path.name in self.index["names"]
+
+    def latest(self, day=None, tag=None):
+        """某天（默认今天）某看板最新一份导出的路径。"""
+        day = day or datetime.now().strftime("%Y%m%d")
+        name = self.index["latest"].get(f"{day}|{tag or ''}")
+        return self.downloads_dir / name if name else None
+
+    # ---------- 保存 ----------
+    def _friendly_name(self, day, tag, seq):
+        base = f"{NAME_PREFIX}{day}" + (f"_{tag}" if tag else "")
+        return f"{base}.xlsx" if seq == 0 else f"{base}_{seq}.xlsx"
+
+    def put(self, src, tag=None, day=None):
+        """把刚下载的文件 src 按内容哈希归档，并在 downloads 下建立友好文件名，返回 PutResult。"""
+        from pipeline import file_sha256
+        src = Path(src)
+        tag = safe_file_part(tag) if tag else ""
+        day = day or datetime.now().strftime("%Y%m%d")
+        key = f"{day}|{tag or ''}"
+        sha = file_sha256(src)
+        with self._lock:
+            self._refresh()
+            obj = self.object_path(sha)
+            if obj.exists():
+                src.unlink()
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(str(src), str(obj))
+
+            latest = self.index["latest"].get(key)
+            if latest and self.index["names"][latest]["sha"] == sha:
+                target = self.downloads_dir / latest
+                if not target.exists():
+                    _link_or_copy(obj, target)
+                print(f"✓ 与上一份导出内容相同，沿用 {latest}")
+                return PutResult(target, sha, True)
+
+            seq = self.index["next"].get(key, 0)
+            target = self.downloads_dir / self._friendly_name(day, tag, seq)
+            # 仓库建立前留下的同名文件：先登记进来，序号顺延
+            while target.exists():
+                self._adopt(target, day, tag, seq)
+                seq += 1
+                target = self.downloads_dir / self._friendly_name(day, tag, seq)
+            # 先登记再建文件名：监视文件夹看到新文件时，索引里已经能查到它归仓库管
+            self._record(target.name, sha, day, tag, seq)
+            self._save()
+            try:
+                _link_or_copy(obj, target)
+            except OSError:
+                self._remove_name(target.name)
+                self._save()
+                raise
+            compact_due = self.index["compacted"] != datetime.now().strftime("%Y%m%d")
+            self._save()
+        if compact_due:
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠ 整理下载仓库时出错：{e}")
+        return PutResult(target, sha, False)
+
+    def discard(self, path):
+        """撤销一个刚保存的友好文件名（连同派生物），原始对象没有其它文件名引用时一起删除。"""
+        name = Path(path).name
+        with self._lock:
+            self._refresh()
+            entry = self.index["names"].get(name)
+            if entry is None:
+                return False
+            self._remove_name(name)
+            if all(e["sha"] != entry["sha"] for e in self.index["names"].values()):
+                try:
+                    self.object_path(entry["sha"]).unlink()
+                except OSError:
+                    pass
+            self._save()
+        return True
+
+    def _record(self, name, sha, day, tag, seq):
+        key = f"{day}|{tag or ''}"
+        self.index["names"][name] = {"sha": sha, "day": day, "tag": tag or "", "seq": seq,
+                                     "time": datetime.now().isoformat(timespec="seconds")}
+        self.index["next"][key] = max(self.index["next"].get(key, 0), seq + 1)
+        prev = self.index["latest"].get(key)
+        if prev is None or self.index["names"][prev]["seq"] <= seq:
+            self.index["latest"][key] = name
+
+    def _adopt(self, path, day, tag, seq):
+        """把已有的友好文件名登记进索引（内容按当前文件计算，已整理的也按现状归档）。"""
+        from pipeline import file_sha256
+        if path.name in self.index["names"]:
+            return
+        sha = file_sha256(path)
+        obj = self.object_path(sha)
+        if not obj.exists():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(path, obj)
+        self._record(path.name, sha, day, tag, seq)
+
+    def import_existing(self):
+        """一次性登记 downloads 下已有的 抓鱼单*.xlsx，返回新登记的数量。"""
+        from order_archive import parse_file_name
+        added = 0
+        with self._lock:
+            self._refresh()
+            for f in sorted(self.downloads_dir.glob(f"{NAME_PREFIX}*.xlsx")):
+                if f.name in self.index["names"]:
+                    continue
+                day, tag, seq = parse_file_name(f)
+                if day is None:
+                    continue
+                self._adopt(f, day.replace("-", ""), tag, seq)
+                added += 1
+            if added:
+                self._save()
+        return added
+
+    # ---------- 保留与清理 ----------
+    def _remove_name(self, name):
+        """删除一个友好文件名及其派生物（路线 / 数据目录、运行日志、汇总缓存）。"""
+        from aggregates import AGG_DIRNAME
+        from run_journal import JOURNAL_DIRNAME
+        stem = Path(name).stem
+        for p in (self.downloads_dir / name, self.downloads_dir / JOURNAL_DIRNAME / f"{stem}.json",
+                  self.downloads_dir / AGG_DIRNAME / f"{stem}.json"):
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        for derived in ("路线", "数据"):
+            shutil.rmtree(str(self.downloads_dir / f"{stem}_{derived}"), ignore_errors=True)
+        entry = self.index["names"].pop(name)
+        key = f"{entry['day']}|{entry['tag']}"
+        if self.index["latest"].get(key) == name:
+            rest = [n for n, e in self.index["names"].items() if f"{e['day']}|{e['tag']}" == key]
+            if rest:
+                self.index["latest"][key] = max(rest, key=lambda n: self.index["names"][n]["seq"])
+            else:
+                self.index["latest"].pop(key, None)
+                self.index["next"].pop(key, None)
+
+    def _objects(self):
+        return {p.stem: p for p in (self.root / "objects").glob("*/*.xlsx")}
+
+    def compact(self, keep_days=None, max_mb=None):
+        """按保留天数与容量上限清理过期导出，并删除没有文件名引用的对象。返回 (删除文件名数, 删除对象数, 释放 MB)。"""
+        keep_days = int(os.environ.get("STORE_KEEP_DAYS", "90")) if keep_days is None else keep_days
+        max_mb = float(os.environ.get("STORE_MAX_MB", "0")) if max_mb is None else max_mb
+        now = datetime.now()
+        today = now.strftime("%Y%m%d")
+        # 今天才保存的文件（补录、上传的旧日期导出）可能正在整理 / 打印，本次不清理
+        saved_today = now.date().isoformat()
+        removed_names = removed_objects = freed = 0
+        with self._lock:
+            self._refresh()
+            if keep_days > 0:
+                cutoff = (now - timedelta(days=keep_days)).strftime("%Y%m%d")
+                for name in [n for n, e in self.index["names"].items()
+                             if e["day"] < cutoff and not e.get("time", "").startswith(saved_today)]:
+                    self._remove_name(name)
+                    removed_names += 1
+
+            objects = self._objects()
+            if max_mb > 0:
+                sizes = {sha: p.stat().st_size for sha, p in objects.items()}
+                used = sum(sizes.values())
+                # 从最早的日期开始清理，今天的导出永远保留
+                for day in sorted({e["day"] for e in self.index["names"].values()}):
+                    if used <= max_mb * (1 << 20) or day >= today:
+                        break
+                    names = [n for n, e in self.index["names"].items()
+                             if e["day"] == day and not e.get("time", "").startswith(saved_today)]
+                    for name in names:
+                        self._remove_name(name)
+                        removed_names += 1
+                    live = {e["sha"] for e in self.index["names"].values()}
+                    used = sum(s for sha, s in sizes.items() if sha in live)
+
+            live = {e["sha"] for e in self.index["names"].values()}
+            for sha, p in objects.items():
+                if sha not in live:
+                    freed += p.stat().st_size
+                    p.unlink()
+                    removed_objects += 1
+            for d in (self.root / "objects").glob("*"):
+                try:
+                    d.rmdir()
+                except OSError:
+                    pass
+            # 中断的下载留下的临时文件；其它线程正在写入的（一小时内）不动
+            for p in (self.root / "incoming").glob("*"):
+                try:
+                    if time.time() - p.stat().st_mtime > 3600:
+                        p.unlink()
+                except OSError:
+                    pass
+            self.index["compacted"] = today
+            self._save()
+        if removed_names or removed_objects:
+            print(f"✓ 下载仓库已整理：清理 {removed_names} 个过期导出、{removed_objects} 个对象，释放 {freed / (1 << 20):.1f}MB")
+        return removed_names, removed_objects, freed / (1 << 20)
+
+    def stats(self):
+        objects = self._objects()
+        size = sum(p.stat().st_size for p in objects.values())
+        names = self.index["names"]
+        return {"names": len(names), "objects": len(objects), "mb": round(size / (1 << 20), 2),
+                "days": len({e["day"] for e in names.values()}),
+                "deduplicated": len(names) - len({e["sha"] for e in names.values()})}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="download_store.py", description="下载仓库维护")
+    ap.add_argument("--dir")
+    ap.add_argument("--import", dest="do_import", action="store_true", help="登记 downloads 下已有的抓鱼单")
+    ap.add_argument("--compact", action="store_true", help="按保留策略清理")
+    ap.add_argument("--stats", action="store_true")
+    args = ap.parse_args(argv)
+    store = store_for(args.dir)
+    if args.do_import:
+        print(f"✓ 已登记 {store.import_existing()} 个已有文件")
+    if args.compact:
+        store.compact()
+    if args.stats or not (args.do_import or args.compact):
+        s = store.stats()
+        print(f"{s['names']} 个文件名 → {s['objects']} 个对象（{s['mb']}MB，{s['days']} 天，"
+              f"内容重复 {s['deduplicated']} 个）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+本地 HTTP 整理 / 打印服务：店里其它电脑把导出的 xlsx POST 过来，由这台常驻、已预热的机器处理。
+  POST /process?format=xlsx   返回整理后的工作簿（默认）
+  POST /process?format=pdf    返回整理后转换的 PDF
+  POST /process?format=print  整理后交给本机打印流水线（打印机池 / PRINTER_URI / 系统打印），立即返回 202；
+                              与同一来源上一份上传内容相同时不再打印，返回 200 {"unchanged": 文件名}
+  GET  /health                工作进程数、处理中 / 已完成数量
+请求体是 xlsx 文件内容，例如：
+  curl --data-binary @抓鱼单20250101.xlsx "http://192.168.1.20:8765/process?format=pdf" -o out.pdf
+整理在预先启动的工作进程中进行（openpyxl 与整理模块已导入），响应头 Server-Timing 给出排队 / 整理 / 转换 / 总耗时。
+服务没有身份验证（而且可以直接打印），默认只监听本机 127.0.0.1；要让店里其它电脑访问，
+需明确设置 HTTP_HOST=0.0.0.0（或本机局域网地址），只在可信的局域网里这样做。
+python dingding_export.py --serve
+环境变量：HTTP_HOST（默认 127.0.0.1）、HTTP_PORT（默认 8765）、HTTP_WORKERS（默认 CPU 数，最多 4）、
+HTTP_MAX_INFLIGHT（同时处理的请求数，默认 工作进程数×2）、HTTP_QUEUE_WAIT（排队超时秒数，默认 30）、
+HTTP_WORK_TIMEOUT（单个请求的整理 / 转换超时秒数，默认 120，超时返回 504）、HTTP_MAX_MB（默认 20）
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from workers import warm_worker, worker_pid
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+# ---------- 工作进程 ----------
+def process_export(data, fmt):
+    """在工作进程中整理（必要时转 PDF），返回 (结果内容, {阶段: 毫秒}, 开始时间)。"""
+    from dingding_export import adjust_excel_fit
+    started = time.time()
+    timings = {}
+    workdir = Path(tempfile.mkdtemp(prefix="fish_http_"))
+    try:
+        src = workdir / "抓鱼单.xlsx"
+        src.write_bytes(data)
+        t = time.perf_counter()
+        out = adjust_excel_fit(src)
+        timings["transform"] = (time.perf_counter() - t) * 1000
+        if out is None:
+            raise RuntimeError("整理失败：不是可识别的抓鱼单")
+        if fmt == "pdf":
+            from net_print import xlsx_to_pdf
+            t = time.perf_counter()
+            pdf = xlsx_to_pdf(out)
+            timings["pdf"] = (time.perf_counter() - t) * 1000
+            if pdf is None:
+                raise RuntimeError("PDF 转换失败（未找到 Excel 或 LibreOffice）")
+            return Path(pdf).read_bytes(), timings, started
+        return Path(out).read_bytes(), timings, started
+    finally:
+        shutil.rmtree(str(workdir), ignore_errors=True)
+
+
+# ---------- HTTP ----------
+class ProcessingService:
+    """持有工作进程池、并发限制和本机打印流水线。"""
+
+    def __init__(self, workers=None, max_inflight=None, queue_wait=None, max_mb=None, work_timeout=None):
+        self.workers = workers or int(os.environ.get("HTTP_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.max_inflight = max_inflight or int(os.environ.get("HTTP_MAX_INFLIGHT", str(self.workers * 2)))
+        self.queue_wait = queue_wait if queue_wait is not None else float(os.environ.get("HTTP_QUEUE_WAIT", "30"))
+        self.max_bytes = int(float(max_mb or os.environ.get("HTTP_MAX_MB", "20")) * (1 << 20))
+        self.work_timeout = work_timeout or float(os.environ.get("HTTP_WORK_TIMEOUT", "120"))
+        self.slots = threading.BoundedSemaphore(self.max_inflight)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_worker)
+        self.inflight = 0
+        self.done = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._print_pipe = None
+
+    def warm(self):
+        """让所有工作进程立即启动并完成预热，第一个请求不再付启动成本。"""
+        t = time.perf_counter()
+        pids = set(self.pool.map(worker_pid, range(self.workers * 2)))
+        print(f"✓ {len(pids)} 个工作进程已预热（{time.perf_counter() - t:.1f}s）")
+
+    def print_pipeline(self):
+        with self._lock:
+            if self._print_pipe is None:
+                from pipeline import build_run_pipeline
+                # 工作进程已整理完，流水线只负责 拆分 → 打印 / 归档
+                self._print_pipe = build_run_pipeline(transform=lambda p: p)
+            return self._print_pipe
+
+    def queue_print(self, raw, out, tag):
+        """
+        原始上传按内容归档到下载库，整理结果写到它的友好文件名上，交给打印流水线，返回 (文件路径, 是否已排队)。
+        文件名用原始标题里的订单日期：整理后的标题是今天，归档按文件名取日期。
+        与同一天同一来源的上一份上传内容相同时沿用原文件（可能已打印过），不覆盖也不再打印。
+        """
+        from download_store import store_for
+        from order_archive import raw_order_date
+        store = store_for()
+        incoming = store.incoming_path()
+        incoming.write_bytes(raw)
+        day = raw_order_date(incoming)
+        stored = store.put(incoming, tag, day.replace("-", "") if day else None)
+        target = stored.path
+        if stored.unchanged:
+            print(f"  · 上传内容与上一份相同，沿用 {target.name}，不再打印")
+            return target, False
+        # 与 adjust_excel_fit 一样先写临时文件再替换：友好文件名换成整理结果，库里的原始对象不变
+        tmp = target.with_name(f".{target.name}.tmp")
+        tmp.write_bytes(out)
+        os.replace(str(tmp), str(target))
+        self.print_pipeline().submit(target)
+        return target, True
+
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def health(self):
+        return {"workers": self.workers, "max_inflight": self.max_inflight, "inflight": self.inflight,
+                "done": self.done, "failed": self.failed, "rejected": self.rejected}
+
+    def close(self):
+        if self._print_pipe is not None:
+            self._print_pipe.join()
+        self.pool.shutdown(wait=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        print(f"  · {self.client_address[0]} {fmt % args}")
+
+    def _send(self, code, body, ctype="application/json; charset=utf-8", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/health":
+            return self._send(200, self.service.health())
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        svc = self.service
+        t0 = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path != "/process":
+            return self._send(404, {"error": "not found"})
+        fmt = parse_qs(url.query).get("format", ["xlsx"])[0].lower()
+        if fmt not in ("xlsx", "pdf", "print"):
+            return self._send(400, {"error": f"不支持的 format：{fmt}"})
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > svc.max_bytes:
+            return self._send(413 if length else 411, {"error": f"请求体为空或超过 {svc.max_bytes >> 20}MB"})
+        data = self.rfile.read(length)
+        if not data.startswith(b"PK"):
+            return self._send(400, {"error": "请求体不是 xlsx 文件"})
+
+        t_wait = time.perf_counter()
+        if not svc.slots.acquire(timeout=svc.queue_wait):
+            svc.count("rejected")
+            return self._send(503, {"error": "处理繁忙，请稍后重试"}, headers={"Retry-After": "5"})
+        # wait：等待并发名额；queue：提交到工作进程真正开始处理
+        timings = {"wait": (time.perf_counter() - t_wait) * 1000}
+        try:
+            with svc._lock:
+                svc.inflight += 1
+            t_submit = time.time()
+            fut = svc.pool.submit(process_export, data, "pdf" if fmt == "pdf" else "xlsx")
+            out, work, started = fut.result(timeout=svc.work_timeout)
+            timings["queue"] = max(0.0, started - t_submit) * 1000
+            timings.update(work)
+        except FutureTimeout:
+            # 还没开始的直接取消；已经卡在工作进程里的无法中断，但不再占用请求线程和并发名额
+            fut.cancel()
+            svc.count("failed")
+            return self._send(504, {"error": f"处理超过 {svc.work_timeout:.0f}s 未完成"})
+        except Exception as e:
+            svc.count("failed")
+            return self._send(500, {"error": str(e)})
+        finally:
+            with svc._lock:
+                svc.inflight -= 1
+            svc.slots.release()
+
+        headers = {}
+        if fmt == "print":
+            tag = parse_qs(url.query).get("name", [self.client_address[0].replace(".", "-")])[0]
+            target, queued = svc.queue_print(data, out, tag)
+            code, body = (202, {"queued": target.name}) if queued else (200, {"unchanged": target.name})
+            ctype = "application/json; charset=utf-8"
+        elif fmt == "pdf":
+            code, body, ctype = 200, out, "application/pdf"
+            headers["Content-Disposition"] = 'attachment; filename="fish.pdf"'
+        else:
+            code, body, ctype = 200, out, XLSX_TYPE
+            headers["Content-Disposition"] = 'attachment; filename="fish.xlsx"'
+        timings["total"] = (time.perf_counter() - t0) * 1000
+        headers["Server-Timing"] = ", ".join(f"{k};dur={v:.1f}" for k, v in timings.items())
+        svc.count("done")
+        self._send(code, body, ctype, headers)
+
+
+def run(host=None, port=None):
+    host = host or os.environ.get("HTTP_HOST", "127.0.0.1")
+    port = int(port or os.environ.get("HTTP_PORT", "8765"))
+    service = ProcessingService()
+    service.warm()
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"✓ 整理服务已启动：http://{host}:{port}/process（{service.workers} 个工作进程，"
+          f"最多同时处理 {service.max_inflight} 个请求），Ctrl+C 退出")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止服务...")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    run()
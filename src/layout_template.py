@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+版式模板：表头（1-4 行的内容与合并单元格）、列宽、打印标题行与页边距按表头内容做指纹，
+每种看板版式只计算一次，存到 layout_templates/<指纹>.json，之后的导出直接套用：
+  - 整理总表时只需按当天内容算备注列宽与行高，其余列宽不再逐格统计
+  - 每条路线 sheet 按保留的列从模板克隆表头（同一组保留列只规划一次），不再逐格复制、逐个检查合并区域
+看板增减品种 / 规格后表头变化，指纹随之改变，自动生成新模板。
+环境变量 LAYOUT_TEMPLATE_DIR 可指定模板目录。
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from openpyxl.utils import get_column_letter
+
+from sheet_utils import find_qty_start_col
+
+HEADER_ROWS = 4
+NOTE_COL = 4
+MARGIN_FIELDS = ("left", "right", "top", "bottom", "header", "footer")
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def template_dir():
+    return Path(os.environ.get("LAYOUT_TEMPLATE_DIR") or Path(__file__).parent / "layout_templates")
+
+
+def _header_values(ws):
+    rows = [list(r) for r in ws.iter_rows(min_row=1, max_row=HEADER_ROWS, max_col=ws.max_column or 1,
+                                          values_only=True)]
+    if rows and rows[0]:
+        rows[0][0] = None  # A1 是当天日期标题，不属于版式
+    return rows
+
+
+def _header_merges(ws):
+    return sorted([mr.min_row, mr.min_col, mr.max_row, mr.max_col]
+                  for mr in ws.merged_cells.ranges if mr.max_row <= HEADER_ROWS)
+
+
+def header_fingerprint(ws):
+    """由表头 1-4 行内容（除 A1 标题）、表头合并区域与列数计算指纹。"""
+    payload = json.dumps([ws.max_column or 0, _header_values(ws), _header_merges(ws)],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class LayoutTemplate:
+    def __init__(self, fingerprint, max_col, header, merges, widths, qty_start,
+                 print_title_rows="1:4", margins=None, created=None):
+        self.fingerprint = fingerprint
+        self.max_col = max_col
+        self.header = header
+        self.merges = [tuple(m) for m in merges]
+        self.widths = {int(k): v for k, v in widths.items()}
+        self.qty_start = qty_start
+        self.print_title_rows = print_title_rows
+        self.margins = margins or {}
+        self.created = created or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._plans = {}
+
+    @classmethod
+    def capture(cls, ws, fingerprint=None):
+        """从已经完成 fit_sheet_layout 的总表提取模板。"""
+        max_col = ws.max_column or 0
+        widths = {}
+        for c in range(1, max_col + 1):
+            dim = ws.column_dimensions.get(get_column_letter(c))
+            if dim is not None and dim.width:
+                widths[c] = dim.width
+        return cls(fingerprint or header_fingerprint(ws), max_col, _header_values(ws), _header_merges(ws),
+                   widths, find_qty_start_col(ws), ws.print_title_rows,
+                   {k: getattr(ws.page_margins, k) for k in MARGIN_FIELDS})
+
+    def to_dict(self):
+        return {"fingerprint": self.fingerprint, "max_col": self.max_col, "header": self.header,
+                "merges": [list(m) for m in self.merges], "widths": self.widths, "qty_start": self.qty_start,
+                "print_title_rows": self.print_title_rows, "margins": self.margins, "created": self.created}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["fingerprint"], d["max_col"], d["header"], d["merges"], d["widths"], d["qty_start"],
+                   d.get("print_title_rows", "1:4"), d.get("margins"), d.get("created"))
+
+    # ---------- 总表 ----------
+    def apply_widths(self, ws, note_width):
+        """套用模板列宽，备注列用当天内容算出的宽度。"""
+        for c, w in self.widths.items():
+            ws.column_dimensions[get_column_letter(c)].width = note_width if c == NOTE_COL else w
+
+    # ---------- 路线 sheet ----------
+    def header_plan(self, keep):
+        """
+        按保留的源列规划路线 sheet 的表头：返回 (单元格 [(行, 列, 值)], 合并 [(行, 列, 行, 列)], 源列列表)。
+        与逐格复制的结果一致：合并区域内只写左上角，按保留的列重新合并。
+        """
+        keep = tuple(keep)
+        plan = self._plans.get(keep)
+        if plan is not None:
+            return plan
+        col_map = {src: dst for dst, src in enumerate(keep, start=1)}
+        covered = set()
+        for r1, c1, r2, c2 in self.merges:
+            for rr in range(r1, r2 + 1):
+                for cc in range(c1, c2 + 1):
+                    covered.add((rr, cc))
+        cells = []
+        for rr, values in enumerate(self.header, start=1):
+            for src in keep:
+                if (rr, src) not in covered and src <= len(values):
+                    cells.append((rr, col_map[src], values[src - 1]))
+        merges = []
+        for r1, c1, r2, c2 in self.merges:
+            cols = [col_map[c] for c in range(c1, c2 + 1) if c in col_map]
+            if not cols:
+                continue
+            row = self.header[r1 - 1]
+            cells.append((r1, cols[0], row[c1 - 1] if c1 <= len(row) else None))
+            if len(cols) > 1 or r2 > r1:
+                merges.append((r1, cols[0], r2, cols[-1]))
+        plan = self._plans[keep] = (cells, merges, keep)
+        return plan
+
+    def clone_header(self, new_ws, keep, title, widths):
+        """把模板表头克隆到路线 sheet：表头、合并、列宽、打印标题行与页边距。"""
+        cells, merges, keep = self.header_plan(keep)
+        for rr, cc, value in cells:
+            new_ws.cell(row=rr, column=cc).value = value
+        # A1 标题按当天内容
+        if title is not None:
+            new_ws.cell(row=1, column=1).value = title
+        for r1, c1, r2, c2 in merges:
+            try:
+                new_ws.merge_cells(start_row=r1, start_column=c1, end_row=r2, end_column=c2)
+            except Exception:
+                pass
+        for dst, src in enumerate(keep, start=1):
+            if src in widths:
+                new_ws.column_dimensions[get_column_letter(dst)].width = widths[src]
+        new_ws.print_title_rows = self.print_title_rows
+        for k, v in self.margins.items():
+            setattr(new_ws.page_margins, k, v)
+
+
+def load_template(ws):
+    """按表头指纹取模板（内存 → 磁盘），没有时返回 None。"""
+    fp = header_fingerprint(ws)
+    with _cache_lock:
+        if fp in _cache:
+            return _cache[fp]
+    try:
+        tpl = LayoutTemplate.from_dict(json.loads((template_dir() / f"{fp}.json").read_text(encoding="utf-8")))
+    except (OSError, ValueError, KeyError):
+        return None
+    with _cache_lock:
+        _cache[fp] = tpl
+    return tpl
+
+
+def save_template(ws):
+    """从刚完成版式计算的总表生成模板并持久化。"""
+    tpl = LayoutTemplate.capture(ws)
+    with _cache_lock:
+        _cache[tpl.fingerprint] = tpl
+    try:
+        d = template_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f"{tpl.fingerprint}.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(tpl.to_dict(), ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(str(tmp), str(d / f"{tpl.fingerprint}.json"))
+        print(f"✓ 已保存新的版式模板 {tpl.fingerprint}（{tpl.max_col} 列）")
+    except OSError as e:
+        print(f"⚠ 保存版式模板失败：{e}")
+    return tpl
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+网络直连打印：不经过 Windows 后台打印 / WPS，直接把 PDF、PCL 字节发到打印机
+  socket://192.168.1.50:9100        RAW（JetDirect 9100 端口）
+  ipp://192.168.1.50:631/ipp/print  IPP（HTTP POST application/ipp）
+
+python net_print.py socket://127.0.0.1:9100 a.pdf b.pdf      发送文件
+python net_print.py --fake-server [端口] [作业目录]           启动本地假打印机，记录收到的作业（Linux 上测试 / 压测用）
+"""
+import atexit
+import os
+import select
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Queue, Empty
+from urllib.parse import urlparse
+import http.client
+
+UEL = b"\x1b%-12345X"
+PJL_EOJ = b"@PJL EOJ"
+
+# ---------- 转换：xlsx -> pdf ----------
+def xlsx_to_pdf(xlsx_path, pdf_path=None, timeout=120):
+    """把 xlsx 转成 PDF（优先 Excel COM，回退 LibreOffice soffice），返回 pdf 路径，失败返回 None。"""
+    xlsx_path = Path(xlsx_path).resolve()
+    pdf_path = Path(pdf_path) if pdf_path else xlsx_path.with_suffix(".pdf")
+    try:
+        import pythoncom
+        import win32com.client
+        # 会在流水线打印线程、打印机池的线程里调用：COM 要在当前线程初始化
+        pythoncom.CoInitialize()
+        try:
+            xl = win32com.client.DispatchEx("Excel.Application")
+            xl.Visible = False
+            try:
+                wb = xl.Workbooks.Open(str(xlsx_path))
+                wb.ExportAsFixedFormat(0, str(pdf_path.resolve()))
+                wb.Close(SaveChanges=False)
+            finally:
+                xl.Quit()
+        finally:
+            pythoncom.CoUninitialize()
+        if pdf_path.exists():
+            return pdf_path
+    except Exception:
+        pass
+
+    for exe in ("soffice", "libreoffice"):
+        try:
+            subprocess.check_call(
+                [exe, "--headless", "--convert-to", "pdf", "--outdir", str(pdf_path.parent), str(xlsx_path)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout
+            )
+            produced = pdf_path.parent / (xlsx_path.stem + ".pdf")
+            if produced != pdf_path and produced.exists():
+                produced.replace(pdf_path)
+            if pdf_path.exists():
+                return pdf_path
+        except Exception:
+            continue
+    print(f"⚠ 无法把 {xlsx_path.name} 转换为 PDF（未找到 Excel 或 LibreOffice）")
+    return None
+
+# ---------- 打印机连接 ----------
+def _pjl_wrap(data, job_name, language):
+    """用 PJL UEL 包裹作业，使同一条 9100 连接上可以连续发送多个作业。"""
+    name = job_name.replace('"', "'")
+    head = UEL + f'@PJL JOB NAME="{name}"\r\n'.encode("utf-8")
+    if language:
+        head += f"@PJL ENTER LANGUAGE={language}\r\n".encode("ascii")
+    tail = UEL + f'@PJL EOJ NAME="{name}"\r\n'.encode("utf-8") + UEL
+    return head + data + tail
+
+
+def _ipp_attr(tag, name, value):
+    n = name.encode("utf-8")
+    v = value.encode("utf-8")
+    return struct.pack(">bh", tag, len(n)) + n + struct.pack(">h", len(v)) + v
+
+
+def build_ipp_print_job(printer_uri, data, job_name, document_format, request_id=1):
+    """构造 IPP Print-Job 请求体（IPP/1.1）。"""
+    body = struct.pack(">bbhi", 1, 1, 0x0002, request_id)
+    body += b"\x01"  # operation-attributes-tag
+    body += _ipp_attr(0x47, "attributes-charset", "utf-8")
+    body += _ipp_attr(0x48, "attributes-natural-language", "zh-cn")
+    body += _ipp_attr(0x45, "printer-uri", printer_uri)
+    body += _ipp_attr(0x42, "requesting-user-name", os.environ.get("USERNAME") or os.environ.get("USER") or "fish")
+    body += _ipp_attr(0x42, "job-name", job_name)
+    body += _ipp_attr(0x49, "document-format", document_format)
+    body += b"\x03"  # end-of-attributes-tag
+    return body + data
+
+
+class JobNotSent(IOError):
+    """连接打印机失败，作业一个字节都没有发出：可以放心改用其它方式打印。"""
+
+
+def _peer_closed(sock):
+    """发送前检查复用的连接：对端已关闭（可读且读到 EOF）或连接出错时返回 True，不消耗数据。"""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+class _RawConnection:
+    """9100 端口长连接，作业之间用 PJL UEL 分隔。"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sock = None
+
+    def send(self, payload, timeout):
+        # 打印机会关掉空闲的 9100 连接：发送前发现已关闭就重连，一个字节都还没发，不会重复打印
+        if self.sock is not None and _peer_closed(self.sock):
+            self.close()
+        if self.sock is None:
+            try:
+                self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+            except OSError as e:
+                raise JobNotSent(f"无法连接打印机 {self.host}:{self.port}：{e}") from e
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.sendall(payload)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            self.sock = None
+
+
+class _IppConnection:
+    """IPP over HTTP/1.1 keep-alive 连接。"""
+
+    def __init__(self, host, port, path, printer_uri):
+        self.host = host
+        self.port = port
+        self.path = path or "/ipp/print"
+        self.printer_uri = printer_uri
+        self.conn = None
+        self.request_id = 0
+
+    def send(self, payload, timeout):
+        if self.conn is not None and self.conn.sock is not None and _peer_closed(self.conn.sock):
+            self.close()
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        self.conn.timeout = timeout
+        if self.conn.sock is None:
+            # 先单独建立连接：连不上时请求还没发出，与发送中途失败区分开
+            try:
+                self.conn.connect()
+            except OSError as e:
+                self.close()
+                raise JobNotSent(f"无法连接打印机 {self.host}:{self.port}：{e}") from e
+        self.conn.sock.settimeout(timeout)
+        self.conn.request("POST", self.path, body=payload, headers={"Content-Type": "application/ipp"})
+        resp = self.conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            raise IOError(f"IPP HTTP 状态码 {resp.status}")
+        if len(body) >= 4:
+            status = struct.unpack(">h", body[2:4])[0]
+            if status >= 0x0100:
+                raise IOError(f"IPP 状态码 0x{status:04x}")
+        if resp.getheader("Connection", "").lower() == "close":
+            self.close()
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class NetPrinter:
+    """网络打印后端：连接复用、限制同时在途作业数、每个作业独立超时。"""
+
+    def __init__(self, uri, max_inflight=1, timeout=60.0, language="PDF"):
+        u = urlparse(uri)
+        if u.scheme not in ("socket", "raw", "ipp", "http"):
+            raise ValueError(f"不支持的打印机地址: {uri}（应为 socket://host:9100 或 ipp://host:631/ipp/print）")
+        self.uri = uri
+        self.scheme = "raw" if u.scheme in ("socket", "raw") else "ipp"
+        self.host = u.hostname
+        self.port = u.port or (9100 if self.scheme == "raw" else 631)
+        self.path = u.path
+        self.timeout = timeout
+        self.language = language
+        self.max_inflight = max(1, int(max_inflight))
+        self._pool = Queue()
+        for _ in range(self.max_inflight):
+            self._pool.put(self._new_connection())
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="netprint")
+        self._lock = threading.Lock()
+        self.jobs_done = 0
+        self.bytes_sent = 0
+        self.busy_seconds = 0.0
+
+    def _new_connection(self):
+        if self.scheme == "raw":
+            return _RawConnection(self.host, self.port)
+        printer_uri = f"ipp://{self.host}:{self.port}{self.path or '/ipp/print'}"
+        return _IppConnection(self.host, self.port, self.path, printer_uri)
+
+    def _send(self, data, job_name, document_format):
+        conn = self._pool.get()
+        t0 = time.perf_counter()
+        try:
+            if self.scheme == "raw":
+                payload = _pjl_wrap(data, job_name, self.language)
+            else:
+                conn.request_id += 1
+                payload = build_ipp_print_job(conn.printer_uri, data, job_name, document_format, conn.request_id)
+            # 不重发：数据可能已被打印机接收（超时、错误状态码），重发会重复打印
+            conn.send(payload, self.timeout)
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.jobs_done += 1
+                self.bytes_sent += len(data)
+                self.busy_seconds += elapsed
+            return elapsed
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def submit(self, data, job_name="fish", document_format="application/pdf"):
+        """提交一个作业（bytes），返回 Future，结果为发送耗时（秒）。"""
+        return self._executor.submit(self._send, data, job_name, document_format)
+
+    def print_file(self, path, job_name=None):
+        """发送一个已可直接打印的文件（.pdf / .pcl / .prn），返回 Future。"""
+        p = Path(path)
+        fmt = "application/pdf" if p.suffix.lower() == ".pdf" else "application/vnd.hp-PCL"
+        return self.submit(p.read_bytes(), job_name or p.name, fmt)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                break
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared_printer(printer_uri, timeout=60.0):
+    """同一进程内按地址共用一个 NetPrinter，多个文件连续打印时复用连接；进程退出时关闭。"""
+    key = (printer_uri, float(timeout))
+    with _shared_lock:
+        printer = _shared.get(key)
+        if printer is None:
+            printer = _shared[key] = NetPrinter(printer_uri, timeout=timeout)
+        return printer
+
+
+@atexit.register
+def close_shared_printers():
+    with _shared_lock:
+        printers = list(_shared.values())
+        _shared.clear()
+    for printer in printers:
+        printer.close()
+
+
+def net_print_file(path, printer_uri, timeout=60.0, printer=None):
+    """把 xlsx / pdf 直接发到网络打印机；xlsx 会先转成 PDF。
+    成功返回 True；什么都没发出（转换失败、连不上打印机）返回 None，调用方可以改用系统打印；
+    发送中途失败（超时、错误状态码）返回 False，打印机可能已收到数据，不能再换方式重打。
+    传入 printer 时复用它（及其连接），不在这里关闭。"""
+    p = Path(path)
+    if p.suffix.lower() in (".xlsx", ".xls"):
+        pdf = xlsx_to_pdf(p)
+        if not pdf:
+            return None
+        p = pdf
+    own = printer is None
+    if own:
+        printer = NetPrinter(printer_uri, timeout=timeout)
+    try:
+        elapsed = printer.print_file(p).result()
+        print(f"✓ 网络打印: {p.name} -> {printer_uri}（{elapsed:.2f}s）")
+        return True
+    except JobNotSent as e:
+        print(f"⚠ 网络打印未发出（{printer_uri}）：{e}")
+        return None
+    except Exception as e:
+        print(f"⚠ 网络打印失败（{printer_uri}）：{e}")
+        return False
+    finally:
+        if own:
+            printer.close()
+
+# ---------- 本地假打印机 ----------
+class FakePrinterServer(socketserver.ThreadingTCPServer):
+    """本地假打印机：同一端口同时接受 RAW(9100) 与 IPP(HTTP) 作业，并把作业记录到目录。"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=9100, jobs_dir=None, delay_per_mb=0.0):
+        super().__init__((host, port), _FakePrinterHandler)
+        self.jobs_dir = Path(jobs_dir) if jobs_dir else None
+        if self.jobs_dir:
+            self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.delay_per_mb = delay_per_mb
+        self.jobs = []
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def record(self, protocol, data):
+        with self._lock:
+            seq = len(self.jobs) + 1
+            path = None
+            if self.jobs_dir:
+                path = self.jobs_dir / f"job_{seq:05d}.bin"
+                path.write_bytes(data)
+            self.jobs.append({"seq": seq, "protocol": protocol, "bytes": len(data), "time": time.time(), "path": path})
+        if self.delay_per_mb:
+            time.sleep(len(data) / 1048576.0 * self.delay_per_mb)
+
+    def start_background(self):
+        t = threading.Thread(target=self.serve_forever, name="fake-printer", daemon=True)
+        t.start()
+        return t
+
+
+class _FakePrinterHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        with self.server._lock:
+            self.server.connections += 1
+        sock = self.request
+        sock.settimeout(30)
+        buf = b""
+        try:
+            buf = sock.recv(65536)
+            if buf.startswith(b"POST "):
+                self._handle_http(sock, buf)
+            else:
+                self._handle_raw(sock, buf)
+        except (socket.timeout, ConnectionError):
+            pass
+
+    def _handle_raw(self, sock, buf):
+        while True:
+            # 每个作业以 "@PJL EOJ ...\r\n" 结束；未包裹的 RAW 数据在断开时作为一个作业
+            while True:
+                i = buf.find(PJL_EOJ)
+                if i < 0:
+                    break
+                j = buf.find(b"\r\n", i)
+                if j < 0:
+                    break
+                job, buf = buf[:j + 2], buf[j + 2:]
+                if buf.startswith(UEL):
+                    buf = buf[len(UEL):]
+                self.server.record("raw", job)
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+        if buf.strip(UEL):
+            self.server.record("raw", buf)
+
+    def _handle_http(self, sock, buf):
+        while buf:
+            while b"\r\n\r\n" not in buf:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+            head, buf = buf.split(b"\r\n\r\n", 1)
+            headers = {}
+            for line in head.split(b"\r\n")[1:]:
+                k, _, v = line.partition(b":")
+                headers[k.strip().lower()] = v.strip()
+            length = int(headers.get(b"content-length", b"0"))
+            while len(buf) < length:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    return
+                buf += chunk
+            body, buf = buf[:length], buf[length:]
+            request_id = struct.unpack(">i", body[4:8])[0] if len(body) >= 8 else 0
+            self.server.record("ipp", body)
+            resp = struct.pack(">bbhi", 1, 1, 0x0000, request_id) + b"\x01" \
+                + _ipp_attr(0x47, "attributes-charset", "utf-8") \
+                + _ipp_attr(0x48, "attributes-natural-language", "zh-cn") + b"\x03"
+            sock.sendall(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/ipp\r\nConnection: keep-alive\r\n"
+                + f"Content-Length: {len(resp)}\r\n\r\n".encode("ascii") + resp
+            )
+            if headers.get(b"connection", b"").lower() == b"close":
+                return
+            if not buf:
+                try:
+                    buf = sock.recv(65536)
+                except socket.timeout:
+                    return
+
+# ---------- 入口 ----------
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--fake-server":
+        port = int(sys.argv[2]) if len(sys.argv) >= 3 else 9100
+        jobs_dir = sys.argv[3] if len(sys.argv) >= 4 else str(Path(__file__).parent / "fake_printer_jobs")
+        srv = FakePrinterServer("0.0.0.0", port, jobs_dir)
+        print(f"✓ 假打印机已启动: 0.0.0.0:{port}（RAW / IPP），作业保存到 {jobs_dir}")
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n共收到 {len(srv.jobs)} 个作业，{srv.connections} 个连接")
+    elif len(sys.argv) >= 3:
+        uri = sys.argv[1]
+        ok = all(net_print_file(f, uri) for f in sys.argv[2:])
+        sys.exit(0 if ok else 1)
+    else:
+        print(__doc__)
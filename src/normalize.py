@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+文本规范化：把清理规则（'--' 删除、'-' 改为 '_'、' 斤' 删除）编译成一个正则，一次替换完成，
+并按输入值缓存结果——抓鱼单里规格、门店、备注大量重复，同一个字符串只处理一次。
+  - 整个单元格是 数字+重量单位 时换算成斤并去掉单位（"3斤" → "3"，"2.5 公斤" → "5"），交给类型转换变成数字；
+    单位可扩展：环境变量 NORMALIZE_UNITS=斤,公斤,kg（默认 斤），不增加遍数。换算系数见 UNIT_FACTORS，
+    其它单位写成 单位=每单位的斤数（如 箱=20）；条 这类计数单位没有系数，不去单位，按文本保留
+  - 备注里的 "3条（4_6斤的）" 这类文字不会被去单位，只有整格是 数字+单位 才处理
+  - 单次替换遇到删除后才拼出的新匹配（" --斤" 删掉 '--' 后成了 " 斤"）时，该值改按规则逐条 replace，
+    结果与原写法一致
+python bench_normalize.py 对比逐条 replace 与编译后的单次替换
+"""
+import os
+import re
+
+# (原文, 替换为)，按顺序优先匹配：'--' 要排在 '-' 前面
+DEFAULT_RULES = (("--", ""), ("-", "_"), (" 斤", ""))
+DEFAULT_UNITS = ("斤",)
+# 每单位折合多少斤（键为小写）
+UNIT_FACTORS = {"斤": 1, "两": 0.1, "公斤": 2, "千克": 2, "kg": 2}
+CACHE_SIZE = 1 << 16
+
+
+class _Memo(dict):
+    """按输入值缓存：未命中时计算并记下，条目过多时整体清空。"""
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+
+    def __missing__(self, s):
+        if len(self) >= CACHE_SIZE:
+            self.clear()
+        v = self[s] = self.fn(s)
+        return v
+
+
+def _scaled(num, factor):
+    """数字文本乘以换算系数，按整数 / 最多 6 位小数输出。"""
+    if factor == 1:
+        return num
+    v = round(float(num) * factor, 6)
+    return str(int(v)) if v.is_integer() else str(v)
+
+
+class Normalizer:
+    """
+    把替换规则与单位后缀编译为一个正则；__call__(s) 返回规范化后的字符串（带缓存）。
+    units 为单位名（须在 UNIT_FACTORS 中）或 (单位, 每单位的斤数)。
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, units=DEFAULT_UNITS):
+        self.rules = tuple(rules)
+        self.factors = {}
+        for u in units:
+            name, factor = (u, UNIT_FACTORS.get(u.lower())) if isinstance(u, str) else u
+            if factor is None:
+                raise ValueError(f"单位 {name} 没有换算成斤的系数")
+            self.factors[name.lower()] = factor
+        self.units = tuple(self.factors)
+        self._replacement = dict(self.rules)
+        parts = []
+        if self.units:
+            # 长单位在前：公斤 不能被 斤 截断
+            unit_alt = "|".join(re.escape(u) for u in sorted(self.units, key=len, reverse=True))
+            parts.append(rf"^\s*(?P<num>\d+(?:\.\d+)?)\s*(?P<unit>(?i:{unit_alt}))\s*$")
+        parts.extend(re.escape(src) for src, _ in self.rules)
+        self.pattern = re.compile("|".join(parts))
+        # 单次替换后仍含规则原文，说明是删除后新拼出的匹配
+        self._leftover = re.compile("|".join(re.escape(src) for src, _ in self.rules)) if self.rules else None
+        self._memo = _Memo(self._normalize)
+        # 命中缓存时是一次 dict 取值（C 层），不经过 Python 函数调用
+        self.normalize = self._memo.__getitem__
+
+    def _sub(self, m):
+        num = m.group("num") if self.units else None
+        if num is not None:
+            return _scaled(num, self.factors[m.group("unit").lower()])
+        return self._replacement[m.group(0)]
+
+    def _sequential(self, s):
+        for src, dst in self.rules:
+            s = s.replace(src, dst)
+        return s
+
+    def _normalize(self, s):
+        out = self.pattern.sub(self._sub, s)
+        if out != s and self._leftover is not None and self._leftover.search(out):
+            return self._sequential(s)
+        return out
+
+    def __call__(self, s):
+        return self.normalize(s)
+
+
+def units_from_env():
+    """NORMALIZE_UNITS：逗号分隔的单位，已知重量单位直接写名称，其它写 单位=每单位的斤数；无法换算的忽略并提示。"""
+    raw = os.environ.get("NORMALIZE_UNITS", "")
+    units = []
+    for item in re.split(r"[,，\s]+", raw):
+        name, sep, factor = item.strip().partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        if sep:
+            try:
+                units.append((name, float(factor)))
+            except ValueError:
+                print(f"⚠ NORMALIZE_UNITS：{item} 的换算系数不是数字，已忽略")
+        elif name.lower() in UNIT_FACTORS:
+            units.append(name)
+        else:
+            print(f"⚠ NORMALIZE_UNITS：{name} 不是重量单位（没有换算成斤的系数），按文本保留")
+    return tuple(units) or DEFAULT_UNITS
+
+
+_default = None
+
+
+def default_normalizer():
+    global _default
+    if _default is None:
+        _default = Normalizer(units=units_from_env())
+    return _default
+
+
+def normalize_text(s):
+    """按默认规则规范化一个字符串。"""
+    return default_normalizer()(s)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+历史订单库：把每份抓鱼单的明细写入本地 SQLite（downloads/orders.db，或环境变量 ORDER_DB），
+按 日期 / 路线 / 门店 / 品种规格 建索引，一年的数据查询也是毫秒级，不用再逐个打开 xlsx。
+  - 维度表 routes / customers / products 去重存名称，事实表 facts 只存整数编号与数量
+  - 以文件内容哈希去重：同一个文件重复入库不做任何事（幂等）
+  - 同一天同一来源（看板）的重新导出（抓鱼单YYYYMMDD_1、_2 ……）以序号最大的一份为准，旧的明细被替换
+  - daily 表预先按 日期 × 路线 × 品种规格 汇总（数量、门店数），随明细一起更新，供查询直接使用
+  - 入库时登记该文件的汇总缓存（aggregates.py）：整理时已由汇总页写好的直接沿用，否则由明细算出
+  - 整理流水线的归档阶段自动入库；也可以手动补录：python order_archive.py [目录或文件 ...]
+订单日期以文件名 抓鱼单YYYYMMDD 为准（或调用方在整理之前从原始标题取得后显式传入）：
+整理后的 A1 是处理当天的日期，不能当作订单日期，只有文件名没有日期时才退而看标题。
+"""
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS routes    (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS customers (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS products  (id INTEGER PRIMARY KEY, variety TEXT NOT NULL, spec TEXT NOT NULL,
+                                      UNIQUE (variety, spec));
+CREATE TABLE IF NOT EXISTS exports (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    sha256 TEXT NOT NULL UNIQUE,
+    order_date TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    seq INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER NOT NULL DEFAULT 0,
+    active INTEGER NOT NULL DEFAULT 0,
+    ingested_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_exports_day ON exports (order_date, source, active);
+CREATE TABLE IF NOT EXISTS facts (
+    order_date TEXT NOT NULL,
+    route_id INTEGER NOT NULL REFERENCES routes (id),
+    customer_id INTEGER NOT NULL REFERENCES customers (id),
+    product_id INTEGER NOT NULL REFERENCES products (id),
+    qty REAL NOT NULL,
+    marked INTEGER NOT NULL DEFAULT 0,
+    note TEXT,
+    export_id INTEGER NOT NULL REFERENCES exports (id)
+);
+CREATE INDEX IF NOT EXISTS ix_facts_date     ON facts (order_date);
+CREATE INDEX IF NOT EXISTS ix_facts_route    ON facts (route_id, order_date);
+CREATE INDEX IF NOT EXISTS ix_facts_customer ON facts (customer_id, order_date);
+CREATE INDEX IF NOT EXISTS ix_facts_product  ON facts (product_id, order_date);
+CREATE INDEX IF NOT EXISTS ix_facts_export   ON facts (export_id);
+CREATE TABLE IF NOT EXISTS daily (
+    order_date TEXT NOT NULL,
+    route_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    qty REAL NOT NULL,
+    customers INTEGER NOT NULL,
+    PRIMARY KEY (order_date, route_id, product_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_daily_product ON daily (product_id, order_date);
+"""
+
+FILE_RE = re.compile(r"抓鱼单(\d{8})(.*)$")
+TITLE_DATE_RES = (re.compile(r"(\d{4})年(\d{1,2})月(\d{1,2})日"), re.compile(r"(\d{4})(\d{2})(\d{2})"))
+
+
+def db_path():
+    from dingding_export import resolve_downloads_dir
+    return Path(os.environ.get("ORDER_DB") or resolve_downloads_dir() / "orders.db")
+
+
+def open_db(path=None):
+    con = sqlite3.connect(str(path or db_path()), timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.executescript(SCHEMA)
+    if con.execute("SELECT NOT EXISTS (SELECT 1 FROM daily) AND EXISTS (SELECT 1 FROM facts)").fetchone()[0]:
+        with con:
+            for (day,) in con.execute("SELECT DISTINCT order_date FROM facts").fetchall():
+                refresh_daily(con, day)
+    return con
+
+
+def refresh_daily(con, day):
+    """重算某一天的 daily 汇总（在调用方的事务内）。"""
+    con.execute("DELETE FROM daily WHERE order_date = ?", (day,))
+    con.execute(
+        "INSERT INTO daily (order_date, route_id, product_id, qty, customers) "
+        "SELECT order_date, route_id, product_id, SUM(qty), COUNT(DISTINCT customer_id) "
+        "FROM facts WHERE order_date = ? GROUP BY route_id, product_id", (day,))
+
+
+# ---------- 解析 ----------
+def parse_file_name(path):
+    """抓鱼单20251203_河西店_2.xlsx -> ("2025-12-03", "河西店", 2)；不符合命名时返回 (None, "", 0)。"""
+    m = FILE_RE.match(Path(path).stem)
+    if not m:
+        return None, "", 0
+    day = datetime.strptime(m.group(1), "%Y%m%d").strftime("%Y-%m-%d")
+    rest = m.group(2).strip("_")
+    seq = 0
+    tail = re.search(r"(?:^|_)(\d+)$", rest)
+    if tail:
+        seq = int(tail.group(1))
+        rest = rest[:tail.start()]
+    return day, rest, seq
+
+
+def title_date(title):
+    for rx in TITLE_DATE_RES:
+        m = rx.search(str(title or ""))
+        if m:
+            try:
+                return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).strftime("%Y-%m-%d")
+            except ValueError:
+                continue
+    return None
+
+
+def raw_order_date(path):
+    """整理之前调用：原始导出第一个 sheet 的 A1 标题里的日期（"20251203抓鱼单"），取不到时用文件名日期。"""
+    import openpyxl
+    try:
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            title = next(wb.worksheets[0].iter_rows(max_row=1, max_col=1, values_only=True), (None,))[0]
+        finally:
+            wb.close()
+    except Exception:
+        title = None
+    return title_date(title) or parse_file_name(path)[0]
+
+
+def _qty_start(header_row, default=6):
+    """与 find_qty_start_col 相同：第 2 行从 C 列起第一个非空表头（1 起算的列号）。"""
+    for c in range(3, len(header_row) + 1):
+        v = header_row[c - 1]
+        if v is not None and str(v).strip() != "":
+            return c
+    return default
+
+
+def parse_export(path, day=None):
+    """
+    读取工作簿第一个 sheet（原始导出或整理后的总表均可），返回 (日期, [(路线, 门店, 品种, 规格, 数量, 打标, 备注)])。
+    日期：传入的 day > 文件名日期 > A1 标题 > 文件修改时间。
+    只取序号列为数字（含整理前的数字文本）的明细行；空、0 和无法识别为数字的数量不入库。
+    标题以下的文本按整理时的规则规范化（见 normalize.py），原始导出与整理后的总表得到相同的路线 / 规格名称。
+    """
+    import openpyxl
+    from coercion import to_number
+    from normalize import default_normalizer
+    normalize = default_normalizer().normalize
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = [tuple(r) if n == 0 else tuple(normalize(v) if isinstance(v, str) else v for v in r)
+                for n, r in enumerate(ws.iter_rows(values_only=True))]
+    finally:
+        wb.close()
+    if len(rows) < 5:
+        return None, []
+    day = day or parse_file_name(path)[0] or title_date(rows[0][0] if rows[0] else None) \
+        or datetime.fromtimestamp(Path(path).stat().st_mtime).strftime("%Y-%m-%d")
+    width = max(len(r) for r in rows[:4])
+    head2 = list(rows[1]) + [None] * (width - len(rows[1]))
+    head3 = list(rows[2]) + [None] * (width - len(rows[2]))
+    start = _qty_start(head2)
+    # 品种是合并单元格，只有左上角有值，向右填充
+    products = {}
+    variety = None
+    for c in range(start, width + 1):
+        v = head2[c - 1]
+        if v is not None and str(v).strip():
+            variety = str(v).strip()
+        if variety:
+            spec = head3[c - 1]
+            products[c] = (variety, "" if spec is None else str(spec).strip())
+    facts = []
+    for r in rows[4:]:
+        if not r or to_number(r[0]) is None:
+            continue
+        route = str(r[1]).strip() if len(r) > 1 and r[1] is not None else ""
+        customer = str(r[2]).strip() if len(r) > 2 and r[2] is not None else ""
+        if not customer:
+            continue
+        note = str(r[3]).strip() if len(r) > 3 and r[3] is not None else None
+        marked = 1 if len(r) > 4 and r[4] is not None and str(r[4]).strip() else 0
+        for c, (variety, spec) in products.items():
+            if c > len(r):
+                break
+            q = to_number(r[c - 1])
+            if q:
+                facts.append((route, customer, variety, spec, float(q), marked, note or None))
+    return day, facts
+
+
+# ---------- 入库 ----------
+def _ids(con, table, column, names):
+    """批量取维度编号，不存在的先插入。"""
+    names = set(names)
+    con.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", [(n,) for n in names])
+    out = {}
+    for n in names:
+        out[n] = con.execute(f"SELECT id FROM {table} WHERE {column} = ?", (n,)).fetchone()[0]
+    return out
+
+
+def _product_ids(con, pairs):
+    pairs = set(pairs)
+    con.executemany("INSERT OR IGNORE INTO products (variety, spec) VALUES (?, ?)", list(pairs))
+    return {p: con.execute("SELECT id FROM products WHERE variety = ? AND spec = ?", p).fetchone()[0] for p in pairs}
+
+
+def store_export(con, path, sha, day, facts):
+    """把已解析的一份导出写入库（调用方负责哈希去重），返回 "ingested" 或 "superseded"。"""
+    _, source, seq = parse_file_name(path)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with con:
+        cur = con.execute(
+            "SELECT id, seq FROM exports WHERE order_date = ? AND source = ? AND active = 1", (day, source)).fetchone()
+        active = cur is None or seq >= cur[1]
+        eid = con.execute(
+            "INSERT INTO exports (file, sha256, order_date, source, seq, rows, active, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (Path(path).name, sha, day, source, seq, len(facts), int(active), now)).lastrowid
+        if not active:
+            return "superseded"
+        if cur is not None:
+            con.execute("DELETE FROM facts WHERE export_id = ?", (cur[0],))
+            con.execute("UPDATE exports SET active = 0 WHERE id = ?", (cur[0],))
+        routes = _ids(con, "routes", "name", (f[0] for f in facts))
+        customers = _ids(con, "customers", "name", (f[1] for f in facts))
+        products = _product_ids(con, ((f[2], f[3]) for f in facts))
+        con.executemany(
+            "INSERT INTO facts (order_date, route_id, customer_id, product_id, qty, marked, note, export_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(day, routes[f[0]], customers[f[1]], products[(f[2], f[3])], f[4], f[5], f[6], eid) for f in facts])
+        refresh_daily(con, day)
+    return "ingested"
+
+
+def ingest_file(path, con=None, day=None):
+    """
+    把一份导出入库，返回 (状态, 明细行数)；状态为 ingested / superseded / skipped（内容已入库）。
+    day（YYYY-MM-DD）是整理前取得的订单日期，文件名里没有日期时由调用方传入。
+    """
+    from aggregates import load_aggregates, save_aggregates, store_aggregates
+    from pipeline import file_sha256
+    own = con is None
+    con = con or open_db()
+    try:
+        sha = file_sha256(path)
+        if con.execute("SELECT 1 FROM exports WHERE sha256 = ?", (sha,)).fetchone():
+            return "skipped", 0
+        day, facts = parse_export(path, day)
+        if day is None:
+            raise ValueError("不是可识别的抓鱼单")
+        status = store_export(con, path, sha, day, facts)
+        # 整理时已写好的汇总（同一取数规则）直接沿用，只补上订单日期
+        cached = load_aggregates(path, sha)
+        if cached is None:
+            save_aggregates(path, sha, day, facts)
+        elif cached.get("day") != day:
+            store_aggregates(path, dict(cached, day=day), cached["shas"])
+        return status, len(facts)
+    finally:
+        if own:
+            con.close()
+
+
+def ingest_paths(paths):
+    """逐个入库文件或目录中的 抓鱼单*.xlsx，输出汇总。"""
+    files = []
+    for p in map(Path, paths):
+        files.extend(sorted(p.glob("抓鱼单*.xlsx")) if p.is_dir() else [p])
+    con = open_db()
+    t0 = time.perf_counter()
+    counts = {}
+    rows = 0
+    try:
+        for f in files:
+            try:
+                status, n = ingest_file(f, con)
+            except Exception as e:
+                status, n = "failed", 0
+                print(f"⚠ 入库失败：{f.name}：{e}")
+            counts[status] = counts.get(status, 0) + 1
+            rows += n
+    finally:
+        con.close()
+    print(f"✓ 入库完成：{len(files)} 个文件，{rows} 行明细，用时 {time.perf_counter() - t0:.2f}s "
+          + "（" + "，".join(f"{k} {v}" for k, v in counts.items()) + "）")
+    return counts
+
+
+if __name__ == "__main__":
+    from dingding_export import resolve_downloads_dir
+    ingest_paths(sys.argv[1:] or [resolve_downloads_dir()])
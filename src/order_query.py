@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+订单库查询（数据来自 order_archive 的 orders.db，不再打开 xlsx）：
+  python order_query.py totals --by product|route|customer|date [筛选]   合计
+  python order_query.py top [-n 10] [筛选]                               门店排行
+  python order_query.py change [--date 2025-12-04] [--by product|route|customer]   与上一个有单日的对比
+筛选：--from 2025-12-01 --to 2025-12-31 --route A --customer 田三湘 --product 草鱼（或 草鱼:1.5）
+输出：--format table（默认）| csv | sheet；--out 文件名；sheet 生成可打印的 xlsx，加 --print 直接打印
+不按门店分组 / 筛选时使用预先汇总的 daily 表，否则查明细表 facts，均走索引。
+"""
+import argparse
+import csv
+import io
+import time
+from pathlib import Path
+
+from order_archive import open_db
+
+DIMENSIONS = {
+    # 分组键: (列标题, 分组表达式, 需要的连接)
+    "product": ("品种规格", "p.variety || CASE WHEN p.spec = '' THEN '' ELSE ' ' || p.spec END",
+                "JOIN products p ON p.id = t.product_id"),
+    "route": ("路线", "r.name", "JOIN routes r ON r.id = t.route_id"),
+    "customer": ("门店", "c.name", "JOIN customers c ON c.id = t.customer_id"),
+    "date": ("日期", "t.order_date", ""),
+}
+
+
+def _filters(args):
+    """按命令行参数拼 WHERE 条件，返回 (条件列表, 参数, 是否按门店筛选)。"""
+    where, params = [], []
+    if args.date_from:
+        where.append("t.order_date >= ?")
+        params.append(args.date_from)
+    if args.date_to:
+        where.append("t.order_date <= ?")
+        params.append(args.date_to)
+    if args.route:
+        where.append("t.route_id IN (SELECT id FROM routes WHERE name = ?)")
+        params.append(args.route)
+    if args.customer:
+        where.append("t.customer_id IN (SELECT id FROM customers WHERE name LIKE ?)")
+        params.append(f"%{args.customer}%")
+    if args.product:
+        variety, _, spec = args.product.replace("：", ":").partition(":")
+        if spec:
+            where.append("t.product_id IN (SELECT id FROM products WHERE variety = ? AND spec = ?)")
+            params.extend([variety, spec])
+        else:
+            where.append("t.product_id IN (SELECT id FROM products WHERE variety = ?)")
+            params.append(variety)
+    return where, params, bool(args.customer)
+
+
+def grouped_totals(con, args, by):
+    """按 by 分组合计数量，返回 (表头, 行)。"""
+    label, expr, join = DIMENSIONS[by]
+    where, params, by_customer = _filters(args)
+    use_facts = by == "customer" or by_customer
+    table = "facts" if use_facts else "daily"
+    # daily 已按路线 × 品种汇总，门店数无法跨行去重，只有查明细时才给出
+    customers = ", COUNT(DISTINCT t.customer_id)" if use_facts else ""
+    sql = (f"SELECT {expr} AS k, SUM(t.qty){customers}, COUNT(DISTINCT t.order_date) "
+           f"FROM {table} t {join} {'WHERE ' + ' AND '.join(where) if where else ''} "
+           f"GROUP BY k ORDER BY {'k' if by == 'date' else 'SUM(t.qty) DESC'}")
+    rows = con.execute(sql, params).fetchall()
+    head = [label, "数量"] + (["门店数"] if use_facts else []) + ["天数"]
+    return head, rows
+
+
+def cmd_totals(con, args):
+    return grouped_totals(con, args, args.by)
+
+
+def cmd_top(con, args):
+    head, rows = grouped_totals(con, args, "customer")
+    return ["名次"] + head, [(i,) + tuple(r) for i, r in enumerate(rows[:args.n], start=1)]
+
+
+def cmd_change(con, args):
+    """某天（默认最近一天）与上一个有单日按 by 分组的数量变化。"""
+    day = args.date or con.execute("SELECT MAX(order_date) FROM daily").fetchone()[0]
+    if not day:
+        return ["说明"], [("订单库为空",)]
+    prev = con.execute("SELECT MAX(order_date) FROM daily WHERE order_date < ?", (day,)).fetchone()[0]
+    out = {}
+    for d in (prev, day):
+        if d is None:
+            continue
+        args.date_from = args.date_to = d
+        _, rows = grouped_totals(con, args, args.by)
+        for r in rows:
+            out.setdefault(r[0], {})[d] = r[1]
+    head = [DIMENSIONS[args.by][0], prev or "（无）", day, "变化", "变化率"]
+    rows = []
+    for k, v in out.items():
+        a, b = v.get(prev, 0) or 0, v.get(day, 0) or 0
+        rows.append((k, a, b, b - a, f"{(b - a) / a:+.0%}" if a else "新增"))
+    rows.sort(key=lambda r: -abs(r[3]))
+    return head, rows
+
+
+# ---------- 输出 ----------
+def _width(s):
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in s)
+
+
+def _fmt(v):
+    if isinstance(v, float):
+        return str(int(v)) if v.is_integer() else f"{v:.2f}"
+    return "" if v is None else str(v)
+
+
+def render_table(head, rows):
+    cells = [[_fmt(v) for v in head]] + [[_fmt(v) for v in r] for r in rows]
+    widths = [max(_width(r[i]) for r in cells) for i in range(len(head))]
+    lines = []
+    for n, r in enumerate(cells):
+        lines.append("  ".join(v + " " * (widths[i] - _width(v)) for i, v in enumerate(r)).rstrip())
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def render_csv(head, rows):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(head)
+    w.writerows([[_fmt(v) for v in r] for r in rows])
+    return buf.getvalue()
+
+
+def write_sheet(head, rows, title, path):
+    """生成可打印的查询结果表：标题、表头、边框、重复标题行，并按分页规划设置打印。"""
+    import openpyxl
+    from openpyxl.styles import Font, Border, Side, Alignment
+    from openpyxl.utils import get_column_letter
+    from pagination import plan_sheet
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "查询结果"
+    ws.cell(row=1, column=1, value=title).font = Font(size=14, bold=True)
+    ws.merge_cells(start_row=1, start_column=1, end_row=1, end_column=len(head))
+    thin = Side(style="thin")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    for r, values in enumerate([head] + [list(x) for x in rows], start=2):
+        for c, v in enumerate(values, start=1):
+            cell = ws.cell(row=r, column=c, value=int(v) if isinstance(v, float) and v.is_integer() else v)
+            cell.border = border
+            cell.alignment = Alignment(horizontal="center" if r == 2 else None, vertical="center")
+            if r == 2:
+                cell.font = Font(bold=True)
+    for c in range(1, len(head) + 1):
+        longest = max(_width(_fmt(ws.cell(row=r, column=c).value)) for r in range(2, len(rows) + 3))
+        ws.column_dimensions[get_column_letter(c)].width = min(40, max(8, longest + 2))
+    ws.print_title_rows = "1:2"
+    ws.page_margins.left = ws.page_margins.right = 0.3
+    plan_sheet(ws)
+    wb.save(path)
+    return Path(path)
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="order_query.py", description="订单库查询")
+    sub = ap.add_subparsers(dest="cmd")
+    sub.required = True
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--from", dest="date_from")
+    common.add_argument("--to", dest="date_to")
+    common.add_argument("--route")
+    common.add_argument("--customer")
+    common.add_argument("--product")
+    common.add_argument("--format", choices=("table", "csv", "sheet"), default="table")
+    common.add_argument("--out")
+    common.add_argument("--print", action="store_true", dest="do_print")
+    common.add_argument("--db")
+    p = sub.add_parser("totals", parents=[common], help="按维度合计")
+    p.add_argument("--by", choices=sorted(DIMENSIONS), default="product")
+    p = sub.add_parser("top", parents=[common], help="门店排行")
+    p.add_argument("-n", type=int, default=10)
+    p = sub.add_parser("change", parents=[common], help="与上一个有单日对比")
+    p.add_argument("--date")
+    p.add_argument("--by", choices=("product", "route", "customer"), default="product")
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    con = open_db(args.db)
+    t0 = time.perf_counter()
+    try:
+        head, rows = {"totals": cmd_totals, "top": cmd_top, "change": cmd_change}[args.cmd](con, args)
+    finally:
+        con.close()
+    elapsed = (time.perf_counter() - t0) * 1000
+    title = " ".join(x for x in (
+        {"totals": "合计", "top": "门店排行", "change": "日环比"}[args.cmd],
+        f"{args.date_from or ''}~{args.date_to or ''}" if args.cmd != "change" and (args.date_from or args.date_to) else "",
+        args.route and f"路线 {args.route}", args.customer, args.product) if x)
+    if args.format == "sheet":
+        path = write_sheet(head, rows, title, args.out or "查询结果.xlsx")
+        print(f"✓ 已生成 {path}（{len(rows)} 行，查询 {elapsed:.1f}ms）")
+        if args.do_print:
+            from dingding_export import print_output
+            print_output(str(path))
+        return
+    text = render_csv(head, rows) if args.format == "csv" else render_table(head, rows)
+    if args.out:
+        # utf-8-sig：Excel 直接打开 CSV 不乱码
+        Path(args.out).write_text(text, encoding="utf-8-sig" if args.format == "csv" else "utf-8")
+        print(f"✓ 已写入 {args.out}（{len(rows)} 行，查询 {elapsed:.1f}ms）")
+    else:
+        print(text)
+        if args.format == "table":
+            print(f"\n{title}：{len(rows)} 行，查询 {elapsed:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
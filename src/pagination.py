@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+分页规划：根据实际列宽 / 行高，为每个 sheet 选择纸张方向、缩放比例和显式分页，
+在保证最小字号的前提下让总页数最少，并在打印前给出预计页数。
+"""
+import os
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet.pagebreak import Break, RowBreak, ColBreak
+
+# A4（磅）
+PAPER_A4 = (595.3, 841.9)
+DEFAULT_COL_WIDTH = 8.43
+DEFAULT_ROW_HEIGHT = 15.0
+BASE_FONT_PT = 11.0
+
+
+def col_width_to_pt(width):
+    """Excel 列宽（字符数）换算为磅：像素 = 宽度*7+5，1 像素 = 0.75 磅。"""
+    return (width * 7.0 + 5.0) * 0.75
+
+
+def min_font_pt():
+    try:
+        return float(os.environ.get("MIN_FONT_PT", "8"))
+    except ValueError:
+        return 8.0
+
+
+def _print_bounds(ws):
+    """返回打印区域 (max_col, max_row)，未设置时使用整张表。"""
+    area = ws.print_area
+    if area:
+        if isinstance(area, (list, tuple)):
+            area = area[0]
+        ref = str(area).split(",")[0].split("!")[-1].replace("$", "")
+        try:
+            _, _, max_col, max_row = range_boundaries(ref)
+            if max_col and max_row:
+                return max_col, max_row
+        except Exception:
+            pass
+    return ws.max_column or 1, ws.max_row or 1
+
+
+def _title_rows(ws):
+    """返回重复标题行数（如 "1:4" -> 4）。"""
+    t = ws.print_title_rows
+    if not t:
+        return 0
+    try:
+        last = str(t).split(",")[0].split("!")[-1].replace("$", "").split(":")[-1]
+        return int(last)
+    except Exception:
+        return 0
+
+
+def measure_sheet(ws):
+    """读取打印区域内的列宽与行高（磅）。"""
+    max_col, max_row = _print_bounds(ws)
+    default_w = ws.sheet_format.defaultColWidth or DEFAULT_COL_WIDTH
+    default_h = ws.sheet_format.defaultRowHeight or DEFAULT_ROW_HEIGHT
+    col_pts = []
+    for c in range(1, max_col + 1):
+        dim = ws.column_dimensions.get(get_column_letter(c))
+        if dim is not None and dim.hidden:
+            col_pts.append(0.0)
+            continue
+        w = dim.width if dim is not None and dim.width else default_w
+        col_pts.append(col_width_to_pt(w))
+    row_pts = []
+    for r in range(1, max_row + 1):
+        dim = ws.row_dimensions.get(r)
+        if dim is not None and dim.hidden:
+            row_pts.append(0.0)
+            continue
+        h = dim.height if dim is not None and dim.height else default_h
+        row_pts.append(float(h))
+    return col_pts, row_pts
+
+
+def _pack(sizes, capacity, start=0):
+    """贪心装页：返回每页起始下标（相对 sizes）。单个超宽元素独占一页。"""
+    breaks = [start]
+    used = 0.0
+    for i in range(start, len(sizes)):
+        s = sizes[i]
+        if used > 0 and used + s > capacity:
+            breaks.append(i)
+            used = 0.0
+        used += s
+    return breaks
+
+
+def plan_pages(col_pts, row_pts, title_rows=0, margins=(0.15, 0.15, 0.40, 0.20),
+               paper=PAPER_A4, base_font=BASE_FONT_PT, min_font=None):
+    """
+    在 纵向/横向 × 缩放(100%..最小字号对应比例) 中选择页数最少的方案。
+    页数相同时取更大的缩放比例（字更大），再取列方向页数更少的方案。
+    margins 为英寸 (左, 右, 上, 下)。
+    """
+    min_font = min_font if min_font is not None else min_font_pt()
+    min_scale = max(10, int(-(-100.0 * min_font // base_font)))
+    left, right, top, bottom = (m * 72.0 for m in margins)
+    title_h = sum(row_pts[:title_rows])
+    best = None
+    for orientation in ("portrait", "landscape"):
+        pw, ph = paper if orientation == "portrait" else (paper[1], paper[0])
+        for scale in range(100, min_scale - 1, -1):
+            f = scale / 100.0
+            avail_w = (pw - left - right) / f
+            avail_h = (ph - top - bottom) / f
+            col_starts = _pack(col_pts, avail_w)
+            body_cap = avail_h - title_h
+            if body_cap <= 0:
+                continue
+            if title_rows and len(row_pts) > title_rows:
+                row_starts = _pack(row_pts, body_cap, start=title_rows)
+                row_starts[0] = 0
+            else:
+                row_starts = _pack(row_pts, avail_h)
+            pages = len(col_starts) * len(row_starts)
+            key = (pages, -scale, len(col_starts), orientation != "landscape")
+            if best is None or key < best[0]:
+                best = (key, {
+                    "orientation": orientation,
+                    "scale": scale,
+                    "pages": pages,
+                    "col_pages": len(col_starts),
+                    "row_pages": len(row_starts),
+                    # 分页位置：Break(id=n) 表示在第 n 行 / 列之后分页
+                    "row_breaks": [s for s in row_starts[1:]],
+                    "col_breaks": [s for s in col_starts[1:]],
+                    "font_pt": round(base_font * f, 1),
+                })
+    return best[1] if best else None
+
+
+def apply_plan(ws, plan):
+    """把规划结果写入 sheet 的页面设置与显式分页。"""
+    ws.page_setup.paperSize = ws.PAPERSIZE_A4
+    ws.page_setup.orientation = plan["orientation"]
+    ws.page_setup.scale = plan["scale"]
+    ws.page_setup.fitToWidth = None
+    ws.page_setup.fitToHeight = None
+    ws.sheet_properties.pageSetUpPr.fitToPage = False
+    ws.row_breaks = RowBreak()
+    ws.col_breaks = ColBreak()
+    for r in plan["row_breaks"]:
+        ws.row_breaks.append(Break(id=r))
+    for c in plan["col_breaks"]:
+        ws.col_breaks.append(Break(id=c))
+
+
+def plan_sheet(ws, apply=True, **kw):
+    """为单个 sheet 规划分页（可选直接应用），返回规划结果。"""
+    col_pts, row_pts = measure_sheet(ws)
+    m = ws.page_margins
+    margins = (m.left or 0.0, m.right or 0.0, m.top or 0.0, m.bottom or 0.0)
+    plan = plan_pages(col_pts, row_pts, title_rows=_title_rows(ws), margins=margins, **kw)
+    if plan and apply:
+        apply_plan(ws, plan)
+    return plan
+
+
+def plan_workbook(wb, apply=True, sheets=None, **kw):
+    """为工作簿中每个 sheet 规划分页并打印预计页数，返回 {sheet 名: 规划}。"""
+    plans = {}
+    for ws in (sheets if sheets is not None else wb.worksheets):
+        try:
+            plan = plan_sheet(ws, apply=apply, **kw)
+        except Exception as e:
+            print(f"⚠ 分页规划失败（sheet {ws.title}）：{e}")
+            continue
+        if plan:
+            plans[ws.title] = plan
+            orient = "横向" if plan["orientation"] == "landscape" else "纵向"
+            print(f"  · {ws.title}: {orient} {plan['scale']}%（约 {plan['font_pt']}pt），预计 {plan['pages']} 页")
+    total = sum(p["pages"] for p in plans.values())
+    print(f"✓ 分页规划完成：{len(plans)} 个 sheet，预计共 {total} 页")
+    return plans
+
+
+def predict_pages(path):
+    """不修改文件，只报告工作簿按当前列宽/行高规划后的预计页数。"""
+    import openpyxl
+    wb = openpyxl.load_workbook(path)
+    return plan_workbook(wb, apply=False)
+
+
+# ---------- 拼版：多条小路线合并到同一页 ----------
+def pack_blocks(heights, capacity):
+    """First-Fit Decreasing 装箱，返回 [[块下标, ...], ...]；每箱内保持原顺序。超出容量的块不参与。"""
+    order = sorted((i for i in range(len(heights)) if heights[i] <= capacity), key=lambda i: -heights[i])
+    bins = []
+    for i in order:
+        for b in bins:
+            if b[0] + heights[i] <= capacity:
+                b[0] += heights[i]
+                b[1].append(i)
+                break
+        else:
+            bins.append([heights[i], [i]])
+    bins = [sorted(b[1]) for b in bins]
+    bins.sort(key=lambda b: b[0])
+    return bins
+
+
+def plan_packing(block_col_pts, block_row_pts, gap_pt=18.0, margins=(0.15, 0.15, 0.40, 0.20),
+                 paper=PAPER_A4, base_font=BASE_FONT_PT, min_font=None):
+    """
+    为若干路线块选择 方向 / 缩放，使装箱后的页数最少（页数相同取更大缩放）。
+    每块高度 = 行高之和 + 间隔（剪切线），页容量也加一个间隔以抵消最后一块多算的部分。
+    返回 {"orientation", "scale", "bins", "pages", "font_pt"}，bins 只包含能放进一页的块。
+    """
+    if not block_row_pts:
+        return None
+    min_font = min_font if min_font is not None else min_font_pt()
+    min_scale = max(10, int(-(-100.0 * min_font // base_font)))
+    left, right, top, bottom = (m * 72.0 for m in margins)
+    widest = max(sum(c) for c in block_col_pts)
+    heights = [sum(r) + gap_pt for r in block_row_pts]
+    best = None
+    for orientation in ("portrait", "landscape"):
+        pw, ph = paper if orientation == "portrait" else (paper[1], paper[0])
+        fit_w = int(100.0 * (pw - left - right) / widest) if widest else 100
+        top_scale = min(100, fit_w)
+        if top_scale < min_scale:
+            continue
+        for scale in range(top_scale, min_scale - 1, -1):
+            f = scale / 100.0
+            capacity = (ph - top - bottom) / f + gap_pt
+            bins = pack_blocks(heights, capacity)
+            packed = sum(len(b) for b in bins)
+            # 先保证放进去的块最多，再比页数，再比缩放
+            key = (-packed, len(bins), -scale, orientation != "portrait")
+            if best is None or key < best[0]:
+                best = (key, {
+                    "orientation": orientation,
+                    "scale": scale,
+                    "bins": bins,
+                    "pages": len(bins),
+                    "font_pt": round(base_font * f, 1),
+                })
+    return best[1] if best else None
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+分阶段流水线：下载保存后，关闭浏览器、整理工作簿、归档、拆分与打印各在自己的线程里运行，
+阶段之间用有界队列衔接；拆分出的第一条路线立即送去打印，后面的路线还在生成。
+运行结束后输出各阶段的时间线，便于查看重叠情况。
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from queue import Queue
+
+from run_journal import journal_for
+
+_STOP = object()
+
+
+class Stage:
+    """流水线的一个阶段：从有界队列取输入，func 的返回值（单个结果或生成器）逐个送往下游。"""
+
+    def __init__(self, name, func, workers=1, maxsize=4, on_close=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = Queue(maxsize=maxsize)
+        self.downstream = []
+        self.on_close = on_close
+        self.errors = 0
+        self._threads = []
+        self._stopped = 0
+        self._lock = threading.Lock()
+        self.pipeline = None
+
+    def then(self, *stages, when=None):
+        """连接下游阶段；when(item) 为真时才送往这些阶段（默认全部送）。"""
+        self.downstream.extend((st, when) for st in stages)
+        return stages[0] if len(stages) == 1 else stages
+
+    def _emit(self, item):
+        for st, when in self.downstream:
+            if when is None or when(item):
+                st.inbox.put(item)
+
+    def _run(self):
+        while True:
+            item = self.inbox.get()
+            if item is _STOP:
+                with self._lock:
+                    self._stopped += 1
+                    last = self._stopped == self.workers
+                if last:
+                    if self.on_close:
+                        with self.pipeline.track(f"{self.name}(收尾)"):
+                            try:
+                                self.on_close()
+                            except Exception as e:
+                                print(f"⚠ 阶段 {self.name} 收尾出错：{e}")
+                    for st, _ in self.downstream:
+                        for _ in range(st.workers):
+                            st.inbox.put(_STOP)
+                return
+            t0 = time.perf_counter()
+            try:
+                out = self.func(item)
+                if out is not None:
+                    if hasattr(out, "__next__"):
+                        for o in out:
+                            self._emit(o)
+                    else:
+                        self._emit(out)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠ 阶段 {self.name} 处理 {_label(item)} 时出错：{e}")
+            finally:
+                self.pipeline.log(self.name, _label(item), t0, time.perf_counter())
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"stage-{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+
+def _label(item):
+    if isinstance(item, (tuple, list)) and item:
+        name = str(item[0]).strip()
+        if not name and len(item) > 1:
+            name = Path(str(item[1])).name
+        return name
+    if isinstance(item, Path):
+        return item.name
+    return str(item)
+
+
+class Pipeline:
+    """把若干 Stage 连成流水线，记录每个阶段每个条目的起止时间。"""
+
+    def __init__(self, head, stages):
+        self.head = head
+        self.stages = stages
+        self.t0 = time.perf_counter()
+        self.events = []
+        self._lock = threading.Lock()
+        for st in stages:
+            st.pipeline = self
+
+    def start(self):
+        for st in self.stages:
+            st.start()
+        return self
+
+    def submit(self, item):
+        self.head.inbox.put(item)
+
+    def log(self, stage, label, t_start, t_end):
+        with self._lock:
+            self.events.append((stage, label, t_start - self.t0, t_end - self.t0))
+
+    @contextmanager
+    def track(self, stage, label=""):
+        """记录主线程（或任意代码块）的耗时，与流水线阶段放在同一条时间线上。"""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.log(stage, label, t, time.perf_counter())
+
+    def join(self):
+        """发送结束信号并等待所有阶段完成。"""
+        for _ in range(self.head.workers):
+            self.head.inbox.put(_STOP)
+        for st in self.stages:
+            st.join()
+        return sum(st.errors for st in self.stages)
+
+    def print_timeline(self, width=50):
+        """输出各阶段的时间线（秒），█ 表示该阶段正在工作。"""
+        if not self.events:
+            return
+        end = max(e[3] for e in self.events) or 1e-9
+        order = []
+        for e in self.events:
+            if e[0] not in order:
+                order.append(e[0])
+        print("\n流水线时间线（共 %.2fs）" % end)
+        for name in order:
+            row = [" "] * width
+            spans = [(s, t) for n, _, s, t in self.events if n == name]
+            for s, t in spans:
+                a = int(s / end * (width - 1))
+                b = max(a, int(t / end * (width - 1)))
+                for i in range(a, b + 1):
+                    row[i] = "█"
+            first = min(s for s, _ in spans)
+            last = max(t for _, t in spans)
+            busy = sum(t - s for s, t in spans)
+            pad = " " * max(0, 12 - sum(2 if ord(ch) > 0x2E80 else 1 for ch in name))
+            print(f"  {name}{pad}|{''.join(row)}| {first:6.2f}s → {last:6.2f}s  忙 {busy:5.2f}s  ×{len(spans)}")
+        # 与其它阶段时间上重叠的秒数（区间两两相交之和）
+        overlap = 0.0
+        for i, a in enumerate(self.events):
+            for b in self.events[i + 1:]:
+                if a[0] != b[0]:
+                    overlap += max(0.0, min(a[3], b[3]) - max(a[2], b[2]))
+        print(f"  阶段间重叠合计 {overlap:.2f}s")
+
+
+# ---------- 一次运行的标准流水线 ----------
+def file_sha256(path, chunk=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            b = f.read(chunk)
+            if not b:
+                break
+            h.update(b)
+    return h.hexdigest()
+
+
+def archive_output(path, order_date=None):
+    """
+    归档：把整理后的工作簿登记到 downloads/manifest.jsonl（哈希、大小、sheet 列表、时间），明细写入订单库。
+    order_date 是整理前从原始标题取得的订单日期（文件名没有日期时使用）。
+    """
+    import openpyxl
+    p = Path(path)
+    entry = {
+        "file": p.name,
+        "sha256": file_sha256(p),
+        "bytes": p.stat().st_size,
+        "sheets": openpyxl.load_workbook(p, read_only=True).sheetnames,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(p.parent / "manifest.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    try:
+        from order_archive import ingest_file
+        status, rows = ingest_file(p, day=order_date)
+        if status == "ingested":
+            print(f"✓ 已写入订单库：{rows} 行明细")
+    except Exception as e:
+        print(f"⚠ 写入订单库失败：{e}")
+    return None
+
+
+def make_route_printer(on_printed=None):
+    """
+    按配置返回 (打印一个路线作业的函数, 收尾函数)：打印机池 / PRINTER_URI / 系统打印。
+    on_printed(job) 在该作业确实打印成功后调用（打印机池是异步完成的）。
+    """
+    from printer_pool import load_printer_config, PrinterPool
+    printers_conf = load_printer_config()
+    if printers_conf:
+        pool = PrinterPool(printers_conf)
+
+        def print_job(job):
+            name, path, pages = job
+            fut = pool.submit(name, path, pages)
+            if on_printed:
+                fut.add_done_callback(lambda f: f.result() and on_printed(job))
+        return print_job, pool.finish
+
+    import os
+    from dingding_export import ExcelPrintSession, print_output
+    # 系统打印：整个运行共用一个 Excel 进程（打印阶段是单线程，COM 对象在同一线程创建、使用与关闭），
+    # 不再每条路线都枚举打印机、切换默认打印机、启动退出一次 Excel；单个文件回退逐个打印时也不切换默认打印机
+    session = None if os.environ.get("PRINTER_URI", "").strip() else ExcelPrintSession(switch_default=False)
+
+    def print_job(job):
+        name, path, pages = job
+        ok = session.print_file(path) if session is not None else print_output(path)
+        if not ok:
+            raise RuntimeError(f"{name} 打印失败")
+        if on_printed:
+            on_printed(job)
+    return print_job, session.close if session is not None else None
+
+
+def build_run_pipeline(transform=None, print_enabled=True, stream=False, transform_workers=1):
+    """
+    默认：整理 → (拆分 → 打印, 归档)。
+    transform 默认是 adjust_excel_fit（transform_workers 个线程并行整理）；拆分用 iter_route_files 逐个产出路线文件，打印阶段收到即打印。
+    stream=True：流式拆分（按优先级逐条路线直接从原表生成并送去打印）→ 打印；
+    全部路线产出后再把原文件交给 整理 → 归档，生成完整的整理后工作簿。
+    每个阶段完成后写入运行日志（run_journal），已完成的整理 / 归档 / 已打印的路线在续跑时跳过。
+    """
+    from dingding_export import adjust_excel_fit, iter_route_files, stream_routes
+
+    transform = transform or adjust_excel_fit
+
+    def do_transform(path):
+        from order_archive import parse_file_name, raw_order_date
+        journal = journal_for(path)
+        if journal.begin(path) == "transformed":
+            print(f"↻ {Path(path).name} 已整理过，跳过整理")
+            return Path(path)
+        # 整理会把 A1 改成处理当天的日期：文件名没有日期（手动放入的文件）时先从原始标题记下订单日期
+        order_date = None if parse_file_name(path)[0] else raw_order_date(path)
+        out = transform(path)
+        if out is None:
+            raise RuntimeError(f"整理失败：{path}")
+        journal.mark_transformed(out, order_date=order_date)
+        return Path(out)
+
+    def do_split(path):
+        names = []
+        for job in iter_route_files(path):
+            names.append(job[0])
+            yield job
+        journal_for(path).mark_split(names)
+
+    def do_stream(path):
+        journal = journal_for(path)
+        # 已整理过的文件（续跑）不能再按原表流式处理，直接按 sheet 拆分
+        jobs = iter_route_files(path) if journal.begin(path) == "transformed" else stream_routes(path)
+        names = []
+        for job in jobs:
+            names.append(job[0])
+            yield job
+        journal.mark_split(names)
+        yield Path(path)
+
+    def do_archive(path):
+        journal = journal_for(path)
+        if journal.done("archive"):
+            return None
+        archive_output(path, journal.data.get("transform", {}).get("order_date"))
+        journal.mark_archived()
+        return None
+
+    st_transform = Stage("整理", do_transform, workers=transform_workers, maxsize=2 * transform_workers)
+    st_archive = Stage("归档", do_archive, maxsize=2)
+    if stream:
+        st_head = Stage("流式拆分", do_stream, maxsize=2)
+        st_head.then(st_transform, when=lambda item: isinstance(item, Path))
+        st_transform.then(st_archive)
+        st_split = st_head
+        stages = [st_head, st_transform, st_archive]
+        is_job = lambda item: isinstance(item, tuple)
+    else:
+        st_head = st_transform
+        st_split = Stage("拆分", do_split, maxsize=2)
+        st_transform.then(st_split, st_archive)
+        stages = [st_transform, st_split, st_archive]
+        is_job = None
+    if print_enabled:
+        print_job, on_close = make_route_printer(
+            on_printed=lambda job: journal_for(job[1]).mark_printed(job[0]))
+
+        def print_pending(job):
+            if journal_for(job[1]).printed(job[0]):
+                print(f"  · {job[0]} 上次已打印，跳过")
+                return None
+            return print_job(job)
+
+        st_print = Stage("打印", print_pending, maxsize=4, on_close=on_close)
+        st_split.then(st_print, when=is_job)
+        stages.append(st_print)
+    return Pipeline(st_head, stages).start()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+多打印机负载均衡：把每条路线（一个 sheet = 一个作业，页不拆散）分配到打印机池，
+按 每分钟页数(ppm) 与当前队列深度估算完成时间，选最早完成的打印机，并发提交。
+作业按路线顺序分配（司机按这个顺序取单）；PRINT_LARGEST_FIRST=1 时页数多的先分配（LPT），整体更早打完。
+
+打印机池配置 printers.json（或环境变量 PRINTERS_CONFIG 指定路径）：
+[
+  {"name": "Canon LBP2900", "uri": "socket://192.168.1.50:9100", "ppm": 12},
+  {"name": "Fujitsu DPK750PRO", "ppm": 4}
+]
+有 uri 的走网络直连打印（net_print），否则按名称走系统打印（WPS / Excel），每台打印机各自串行、互不等待。
+ppm 使用配置值：能拿到的只是送出 / 入队耗时，不是出纸时间，不能当作实测速度。
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+# 系统打印按打印机加锁：同一台打印机同一时间只送一个作业，不同打印机并行（不切换默认打印机）
+_system_print_locks = {}
+_system_print_locks_guard = threading.Lock()
+
+
+def system_print_lock(name):
+    with _system_print_locks_guard:
+        return _system_print_locks.setdefault(name.lower(), threading.Lock())
+
+
+def load_printer_config(path=None):
+    """读取打印机池配置，不存在或格式错误时返回空列表。"""
+    path = Path(path or os.environ.get("PRINTERS_CONFIG") or BASE_DIR / "printers.json")
+    if not path.exists():
+        return []
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠ 读取打印机池配置失败（{path}）：{e}")
+        return []
+    printers = data.get("printers", []) if isinstance(data, dict) else data
+    return [p for p in printers if isinstance(p, dict) and p.get("name")]
+
+
+def system_queue_depth(name):
+    """系统打印队列中尚未完成的页数（需要 win32print，不可用时返回 0）。"""
+    try:
+        import win32print
+        h = win32print.OpenPrinter(name)
+        try:
+            jobs = win32print.EnumJobs(h, 0, 999, 1)
+            return sum(max(int(j.get("TotalPages") or 1) - int(j.get("PagesPrinted") or 0), 0) for j in jobs)
+        finally:
+            win32print.ClosePrinter(h)
+    except Exception:
+        return 0
+
+
+class PoolPrinter:
+    """池中的一台打印机：单线程顺序送出作业，记录队列页数与送出耗时。"""
+
+    def __init__(self, conf):
+        self.name = conf["name"]
+        self.uri = conf.get("uri")
+        self.ppm = float(conf.get("ppm") or 10)
+        self.timeout = float(conf.get("timeout", 120))
+        self.queued_pages = system_queue_depth(self.name) if not self.uri else 0
+        self.jobs = 0
+        self.pages = 0
+        self.busy_seconds = 0.0
+        self.failures = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"printer-{self.name}")
+        self._lock = threading.Lock()
+        self._net = None
+        self._session = None
+
+    def eta(self, extra_pages=0):
+        """按当前排队页数与 ppm 估算打印完 extra_pages 页需要的分钟数。"""
+        return (self.queued_pages + extra_pages) / self.ppm
+
+    def _print(self, path, pages):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            if self.uri:
+                from net_print import NetPrinter, xlsx_to_pdf
+                if self._net is None:
+                    self._net = NetPrinter(self.uri, timeout=self.timeout)
+                doc = xlsx_to_pdf(path) if Path(path).suffix.lower() in (".xlsx", ".xls") else Path(path)
+                if doc:
+                    self._net.print_file(doc).result()
+                    ok = True
+            else:
+                from dingding_export import ExcelPrintSession
+                # 每台打印机一个 Excel 会话，在本打印机的单线程队列里创建与使用
+                if self._session is None:
+                    self._session = ExcelPrintSession(self.name, switch_default=False)
+                with system_print_lock(self.name):
+                    ok = bool(self._session.print_file(path))
+        except Exception as e:
+            print(f"⚠ 打印机 {self.name} 打印 {Path(path).name} 失败：{e}")
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.queued_pages = max(0, self.queued_pages - pages)
+        if ok:
+            self.jobs += 1
+            self.pages += pages
+            self.busy_seconds += elapsed
+        else:
+            self.failures += 1
+        return ok
+
+    def submit(self, path, pages):
+        with self._lock:
+            self.queued_pages += pages
+        return self._executor.submit(self._print, path, pages)
+
+    def close(self):
+        if self._session is not None:
+            self._executor.submit(self._session.close).result()
+        self._executor.shutdown(wait=True)
+        if self._net is not None:
+            self._net.close()
+
+
+class PrinterPool:
+    """打印机池：作业到达即分配给预计完成最早的打印机（可边生成边提交），finish() 等待全部完成并汇报吞吐。"""
+
+    def __init__(self, printers_conf):
+        self.printers = [PoolPrinter(c) for c in printers_conf]
+        self.futures = []
+        self.t0 = time.perf_counter()
+
+    def submit(self, name, path, pages):
+        target = min(self.printers, key=lambda p: p.eta(pages))
+        print(f"  · {name}（{pages} 页）-> {target.name}（排队 {target.queued_pages} 页，约 {target.eta(pages):.1f} 分钟完成）")
+        fut = target.submit(path, pages)
+        self.futures.append((name, fut))
+        return fut
+
+    def finish(self):
+        """等待所有作业完成，输出每台打印机的作业数与送出耗时，返回 {打印机名: 统计}。"""
+        failed = [name for name, f in self.futures if not f.result()]
+        for p in self.printers:
+            p.close()
+        wall = time.perf_counter() - self.t0
+        report = {}
+        total_pages = 0
+        for p in self.printers:
+            report[p.name] = {
+                "jobs": p.jobs,
+                "pages": p.pages,
+                "failures": p.failures,
+                "busy_seconds": round(p.busy_seconds, 2),
+            }
+            total_pages += p.pages
+            # busy_seconds 是送出耗时（送到打印机 / 后台打印队列），不是出纸时间
+            print(f"  · {p.name}: {p.jobs} 个作业 / {p.pages} 页，送出耗时 {p.busy_seconds:.1f}s"
+                  + (f"，失败 {p.failures}" if p.failures else ""))
+        print(f"✓ 打印机池完成：{len(self.printers)} 台打印机，{total_pages} 页，总耗时 {wall:.1f}s")
+        if failed:
+            print(f"⚠ 以下作业打印失败：{failed}")
+        return report
+
+
+def largest_first_enabled():
+    return os.environ.get("PRINT_LARGEST_FIRST", "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def dispatch_jobs(jobs, printers_conf=None, largest_first=None):
+    """
+    把 [(名称, 路径, 页数)] 分配到打印机池并发打印，每个作业交给预计完成最早的打印机。
+    默认保持路线顺序；largest_first=True（或 PRINT_LARGEST_FIRST=1）时页数多的先分配（LPT）。
+    返回 {打印机名: 统计}。
+    """
+    printers_conf = printers_conf if printers_conf is not None else load_printer_config()
+    if not printers_conf:
+        print("⚠ 未配置打印机池（printers.json）")
+        return {}
+    pool = PrinterPool(printers_conf)
+    if largest_first if largest_first is not None else largest_first_enabled():
+        jobs = sorted(jobs, key=lambda j: -j[2])
+    for name, path, pages in jobs:
+        pool.submit(name, path, pages)
+    return pool.finish()
+
+
+def print_with_pool(xlsx_path, printers_conf=None):
+    """把整理后的工作簿按 sheet 拆成作业并分发到打印机池，全部成功返回 True。"""
+    from dingding_export import export_route_files
+    jobs = export_route_files(xlsx_path)
+    report = dispatch_jobs(jobs, printers_conf)
+    return bool(report) and all(r["failures"] == 0 for r in report.values())
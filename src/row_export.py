@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+明细数据旁路输出：整理时把清理后的明细（已去掉 '--'、'-'、' 斤'，数量为数字）逐行写成 CSV 或 NDJSON，
+开票 / 库存等系统直接读取，不必再用 openpyxl 解析 xlsx。
+  - ROW_EXPORT=csv 或 ndjson 开启（默认关闭）
+  - 输出到 <文件名>_数据/：全部.csv（或 .ndjson）与每条路线一个 路线_<线路>.csv
+  - 一个品种规格一行：date, serial, route, customer, note, marked, variety, spec, qty
+  - 边读边写并定期 flush，其它程序可以边生成边读；全部写完后才生成 manifest.json（行数、各路线文件）
+"""
+import csv
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from coercion import to_number
+from sheet_utils import find_qty_start_col, safe_file_part
+
+ROW_FIELDS = ("date", "serial", "route", "customer", "note", "marked", "variety", "spec", "qty")
+FLUSH_EVERY = 200
+MANIFEST_NAME = "manifest.json"
+
+
+def row_export_format():
+    """环境变量 ROW_EXPORT：csv / ndjson（json、jsonl 视同 ndjson）；未设置返回 None。"""
+    fmt = os.environ.get("ROW_EXPORT", "").strip().lower()
+    if fmt in ("json", "jsonl"):
+        fmt = "ndjson"
+    return fmt if fmt in ("csv", "ndjson") else None
+
+
+def data_dir_for(path):
+    p = Path(path)
+    return p.parent / f"{p.stem}_数据"
+
+
+def _typed(v):
+    """数字（含数字文本）转为 int / float，空白与 0 返回 None，其它文本原样返回。"""
+    if isinstance(v, bool):
+        return None
+    n = to_number(v)
+    if n is None:
+        # 空白返回 None，无法识别的文本原样返回
+        return None if v is None else (str(v).strip() or None)
+    if n == 0:
+        return None
+    return int(n) if float(n).is_integer() else n
+
+
+class RowStreamWriter:
+    """同时写总文件与各路线文件；路线文件在第一次出现该路线时才创建。"""
+
+    def __init__(self, out_dir, fmt):
+        self.out_dir = Path(out_dir)
+        self.fmt = fmt
+        self.ext = "csv" if fmt == "csv" else "ndjson"
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        # 上一次的输出作废：先删 manifest，读取方据此判断数据未完成
+        for f in [self.out_dir / MANIFEST_NAME] + list(self.out_dir.glob(f"*.{self.ext}")):
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+        self._files = {}
+        self.counts = {}
+        self.rows = 0
+
+    def _open(self, key, name):
+        f = open(self.out_dir / f"{name}.{self.ext}", "w", encoding="utf-8-sig" if self.fmt == "csv" else "utf-8",
+                 newline="")
+        writer = None
+        if self.fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(ROW_FIELDS)
+        self._files[key] = (f, writer)
+        return self._files[key]
+
+    def _emit(self, key, name, rec):
+        f, writer = self._files.get(key) or self._open(key, name)
+        if writer is not None:
+            writer.writerow([rec[k] for k in ROW_FIELDS])
+        else:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def write(self, rec):
+        route = rec["route"] or "未分配"
+        self._emit(None, "全部", rec)
+        self._emit(route, f"路线_{safe_file_part(route)}", rec)
+        self.counts[route] = self.counts.get(route, 0) + 1
+        self.rows += 1
+        if self.rows % FLUSH_EVERY == 0:
+            for f, _ in self._files.values():
+                f.flush()
+
+    def abort(self):
+        """出错时只关闭文件、不写 manifest，读取方不会把半截数据当成完整结果。"""
+        for f, _ in self._files.values():
+            f.close()
+
+    def close(self, **meta):
+        self.abort()
+        manifest = dict(meta, format=self.fmt, rows=self.rows, routes=self.counts,
+                        files=sorted(Path(f.name).name for f, _ in self._files.values()),
+                        time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        tmp = self.out_dir / f"{MANIFEST_NAME}.tmp"
+        tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(str(tmp), str(self.out_dir / MANIFEST_NAME))
+        return manifest
+
+
+def iter_records(ws, day):
+    """遍历清理后的总表，逐条产出明细记录（序号列为数字的行，每个非空数量一条）。"""
+    qty_start = find_qty_start_col(ws)
+    rows = ws.iter_rows(min_row=2, values_only=True)
+    head2 = list(next(rows, ()))
+    head3 = list(next(rows, ()))
+    next(rows, None)
+    products = []
+    variety = None
+    for c in range(qty_start, max(len(head2), len(head3)) + 1):
+        v = head2[c - 1] if c <= len(head2) else None
+        if v is not None and str(v).strip():
+            variety = str(v).strip()
+        spec = head3[c - 1] if c <= len(head3) else None
+        products.append((c - 1, variety or "", "" if spec is None else str(spec).strip()))
+    for r in rows:
+        if not r or not isinstance(r[0], (int, float)) or isinstance(r[0], bool):
+            continue
+        base = {
+            "date": day,
+            "serial": int(r[0]) if float(r[0]).is_integer() else r[0],
+            "route": str(r[1]).strip() if len(r) > 1 and r[1] is not None else "",
+            "customer": str(r[2]).strip() if len(r) > 2 and r[2] is not None else "",
+            "note": str(r[3]).strip() if len(r) > 3 and r[3] is not None else "",
+            "marked": 1 if len(r) > 4 and r[4] is not None and str(r[4]).strip() else 0,
+        }
+        for i, variety, spec in products:
+            if i >= len(r):
+                break
+            qty = _typed(r[i])
+            if qty is not None:
+                yield dict(base, variety=variety, spec=spec, qty=qty)
+
+
+def export_rows(ws, source, fmt=None):
+    """把 ws（已 clean_sheet）的明细写到 source 对应的 _数据 目录，返回 manifest。"""
+    from order_archive import parse_file_name, title_date
+    fmt = fmt or row_export_format() or "csv"
+    day = title_date(ws.cell(row=1, column=1).value) or parse_file_name(source)[0] \
+        or datetime.now().strftime("%Y-%m-%d")
+    writer = RowStreamWriter(data_dir_for(source), fmt)
+    try:
+        for rec in iter_records(ws, day):
+            writer.write(rec)
+    except Exception:
+        writer.abort()
+        raise
+    manifest = writer.close(source=Path(source).name, date=day)
+    print(f"✓ 明细已输出 {fmt.upper()}：{manifest['rows']} 行，{len(manifest['routes'])} 条路线 → {writer.out_dir.name}")
+    return manifest
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+运行日志（断点续跑）：每个下载的工作簿在 downloads/.journal/<文件名>.json 里记录已完成的阶段——
+下载（哈希）、整理（整理后哈希）、拆分出的路线、每条路线是否已打印、归档。
+下载之后任何一步出错（打印 COM 崩溃、保存失败……），再次运行时先检查当天未完成的日志，
+直接从第一个未完成的阶段继续：不再打开浏览器、不再生成新的 抓鱼单YYYYMMDD_N.xlsx，已打印的路线不重复打印。
+同一个文件最多续跑 RESUME_MAX_ATTEMPTS 次（默认 3），之后视为无法自动恢复（例如打印机一直失败），
+不再只做续跑，正常重新导出。
+路线名按 route_key 统一：总表在流式模式下叫 "总表"、按 sheet 拆分时是空白标题，记为同一条。
+python dingding_export.py --fresh    忽略未完成的日志，重新导出
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+JOURNAL_DIRNAME = ".journal"
+ROUTES_SUFFIX = "_路线"
+MAIN_ROUTE = "总表"
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _source_of(path):
+    """路线文件 downloads/X_路线/01_A.xlsx 对应的下载文件 downloads/X.xlsx，其它路径原样返回。"""
+    p = Path(path)
+    if p.parent.name.endswith(ROUTES_SUFFIX):
+        return p.parent.parent / (p.parent.name[:-len(ROUTES_SUFFIX)] + ".xlsx")
+    return p
+
+
+def route_key(name):
+    """日志里的路线名：去掉首尾空白，空白标题（整理后的总表 sheet）记为 总表。"""
+    return str(name).strip() or MAIN_ROUTE
+
+
+def max_resume_attempts():
+    try:
+        return max(1, int(os.environ.get("RESUME_MAX_ATTEMPTS", "3")))
+    except ValueError:
+        return 3
+
+
+class RunJournal:
+    """一个下载文件的运行日志；线程安全，每次更新立即原子写盘。"""
+
+    def __init__(self, source):
+        self.source = Path(source)
+        self.path = self.source.parent / JOURNAL_DIRNAME / (self.source.stem + ".json")
+        self._lock = threading.Lock()
+        try:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            self.data = {}
+
+    def _save(self):
+        self.path.parent.mkdir(exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(str(tmp), str(self.path))
+
+    def _mark(self, stage, **info):
+        with self._lock:
+            self.data[stage] = dict(info, time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            self._save()
+
+    def done(self, stage):
+        return stage in self.data
+
+    def begin(self, path):
+        """
+        流水线收到文件时调用：按当前哈希判断它处于哪个阶段，返回 "downloaded" 或 "transformed"。
+        哈希与日志都对不上（新文件或被改动过）时重新开始记录。
+        """
+        from pipeline import file_sha256
+        sha = file_sha256(path)
+        if self.data.get("transform", {}).get("sha256") == sha:
+            return "transformed"
+        if self.data.get("download", {}).get("sha256") != sha:
+            with self._lock:
+                self.data = {}
+            self._mark("download", file=Path(path).name, sha256=sha)
+        return "downloaded"
+
+    def mark_transformed(self, path, order_date=None):
+        from pipeline import file_sha256
+        self._mark("transform", file=Path(path).name, sha256=file_sha256(path), order_date=order_date)
+
+    def mark_split(self, routes):
+        self._mark("split", routes=list(dict.fromkeys(route_key(r) for r in routes)))
+
+    def mark_archived(self):
+        self._mark("archive")
+
+    def printed(self, route):
+        return route_key(route) in self.data.get("printed", {})
+
+    def mark_printed(self, route):
+        with self._lock:
+            self.data.setdefault("printed", {})[route_key(route)] = datetime.now().strftime("%H:%M:%S")
+            self._save()
+
+    @property
+    def resume_attempts(self):
+        return int(self.data.get("resumes", 0))
+
+    def mark_resumed(self):
+        with self._lock:
+            self.data["resumes"] = self.resume_attempts + 1
+            self._save()
+
+    def complete(self, print_enabled=True):
+        if not all(self.done(s) for s in ("download", "transform", "split", "archive")):
+            return False
+        return not print_enabled or all(self.printed(r) for r in self.data["split"]["routes"])
+
+    def describe(self):
+        """人看的进度：第一个未完成的阶段。"""
+        for stage, label in (("download", "下载"), ("transform", "整理"), ("split", "拆分")):
+            if not self.done(stage):
+                return f"{label}未完成"
+        left = [r for r in self.data["split"]["routes"] if not self.printed(r)]
+        if left:
+            return f"还有 {len(left)} 条路线未打印：{', '.join(left[:5])}{' …' if len(left) > 5 else ''}"
+        return "打印完成，归档未完成" if not self.done("archive") else "已完成"
+
+
+def journal_for(path):
+    """取 path（下载文件 / 整理后文件 / 路线文件）所属的运行日志，同一文件共用一个对象。"""
+    source = _source_of(path).resolve()
+    with _cache_lock:
+        j = _cache.get(source)
+        if j is None:
+            j = _cache[source] = RunJournal(source)
+        return j
+
+
+def pending_journals(downloads_dir, print_enabled=True, max_attempts=None):
+    """当天未完成、且下载文件仍在、续跑次数未超过上限的运行日志。"""
+    max_attempts = max_attempts or max_resume_attempts()
+    jdir = Path(downloads_dir) / JOURNAL_DIRNAME
+    if not jdir.is_dir():
+        return []
+    today = datetime.now().date()
+    found = []
+    for f in sorted(jdir.glob("*.json")):
+        if datetime.fromtimestamp(f.stat().st_mtime).date() != today:
+            continue
+        source = Path(downloads_dir) / (f.stem + ".xlsx")
+        if not source.exists():
+            continue
+        j = journal_for(source)
+        if j.done("download") and not j.complete(print_enabled):
+            if j.resume_attempts >= max_attempts:
+                print(f"⚠ {source.name} 已续跑 {j.resume_attempts} 次仍未完成（{j.describe()}），不再续跑")
+                continue
+            found.append(j)
+    return found
+
+
+def resume_pending(downloads_dir=None, stream=False):
+    """把当天未完成的运行接着跑完；有可恢复的运行返回 True。"""
+    from dingding_export import resolve_downloads_dir
+    from pipeline import build_run_pipeline
+    pending = pending_journals(downloads_dir or resolve_downloads_dir())
+    if not pending:
+        return False
+    t0 = time.perf_counter()
+    for j in pending:
+        j.mark_resumed()
+        print(f"↻ 继续上次未完成的运行：{j.source.name}（{j.describe()}，第 {j.resume_attempts} 次续跑）")
+    pipe = build_run_pipeline(stream=stream)
+    for j in pending:
+        pipe.submit(j.source)
+    errors = pipe.join()
+    pipe.print_timeline()
+    left = [j.source.name for j in pending if not j.complete()]
+    if errors or left:
+        print(f"⚠ 仍有未完成的步骤（{', '.join(left)}），修复后再次运行即可继续")
+    else:
+        print(f"✓ 已从断点恢复完成，用时 {time.perf_counter() - t0:.1f}s")
+    return True
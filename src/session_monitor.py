@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+登录会话监控：在打开浏览器之前判断钉钉登录是否还有效，并在夜间空闲时段提前续期，
+让早上的定时任务不再因为“导航 → 发现跳到登录页 → 切有界面扫码”而白跑一趟。
+  - 读取保存的登录状态（playwright_states/default.json，没有时读 playwright_profile 的 Cookies 库）中的 cookie 过期时间
+  - 配置了 SESSION_PROBE_URL 时，用 requests 带 cookie 请求一次（不跟随跳转），跳到登录页 / 401 / 403 视为失效
+  - 距离过期不足 SESSION_RENEW_HOURS 小时（默认 24）且处于 SESSION_QUIET_HOURS（默认 1-5 点）时，
+    后台无头打开看板一次刷新 cookie 并保存
+python session_monitor.py            查看会话状态
+python session_monitor.py --renew    立即续期
+python session_monitor.py --watch    常驻，按需在空闲时段续期
+只看登录会话 cookie（默认 DEFAULT_SESSION_COOKIES，域名含 SESSION_COOKIE_DOMAIN，默认 dingtalk）：
+同域名下还有大量短期的统计 / 埋点 cookie，它们过期不代表登录失效。
+环境变量 SESSION_COOKIES 可改为其它 cookie 名（逗号分隔）；设为 * 时看该域名下的全部 cookie。
+保存的状态里一个指定名称的会话 cookie 都没有时，改看该域名下全部持久 cookie 的最早过期时间并给出提示；
+一个持久 cookie 都没有时，过期时间视为无法判断。
+"""
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from dingding_export import TARGET_URL, USER_AGENT, PROFILE_DIR
+from context_pool import state_path, DEFAULT_ACCOUNT
+
+# Chromium cookie 时间戳：1601-01-01 起的微秒数
+_CHROMIUM_EPOCH_OFFSET = 11644473600
+# 钉钉网页登录与应用会话的 cookie
+DEFAULT_SESSION_COOKIES = ("account", "tianshu_corp_user", "tianshu_csrf_token")
+
+
+def session_cookie_names():
+    """要看的 cookie 名；返回 None 表示不按名称筛选（SESSION_COOKIES=*）。"""
+    raw = os.environ.get("SESSION_COOKIES", "").strip()
+    if raw == "*":
+        return None
+    names = [n.strip() for n in raw.split(",") if n.strip()]
+    return names or list(DEFAULT_SESSION_COOKIES)
+
+
+def _on_domain(domain):
+    return os.environ.get("SESSION_COOKIE_DOMAIN", "dingtalk") in (domain or "")
+
+
+_warned_fallback = set()
+
+
+def earliest_session_expiry(cookies, source=""):
+    """
+    cookies 为 (名称, 域名, 过期时间 unix 秒) 的序列，返回会话 cookie 最早的过期时间。
+    一个指定名称的 cookie 都没有（钉钉改了名称）时，退回到该域名下全部持久 cookie 的最早过期时间，并提示一次；
+    该域名下没有持久 cookie 时返回 None。
+    """
+    on_domain = [(name, exp) for name, domain, exp in cookies if exp and exp > 0 and _on_domain(domain)]
+    names = session_cookie_names()
+    expiries = [exp for name, exp in on_domain if names is None or name in names]
+    if not expiries and on_domain:
+        if source not in _warned_fallback:
+            _warned_fallback.add(source)
+            print(f"⚠ {source or '登录状态'}中没有会话 cookie（{', '.join(names)}），"
+                  f"按该域名下全部 cookie 的最早过期时间判断；可用 SESSION_COOKIES 指定实际的 cookie 名")
+        expiries = [exp for _, exp in on_domain]
+    return min(expiries) if expiries else None
+
+
+def state_cookie_expiry(state_file):
+    """storage_state 文件中会话 cookie 最早的过期时间（unix 秒）；没有持久 cookie 或读取失败时返回 None。"""
+    try:
+        cookies = json.loads(state_file.read_text(encoding="utf-8")).get("cookies", [])
+    except Exception:
+        return None
+    return earliest_session_expiry([(c.get("name"), c.get("domain"), c.get("expires", -1)) for c in cookies],
+                                   source=f"{state_file.name} ")
+
+
+def profile_cookie_expiry(profile_dir=PROFILE_DIR):
+    """直接读 Chromium profile 的 Cookies 库（复制一份以免被浏览器锁住），返回最早过期时间（unix 秒）。"""
+    for rel in ("Default/Network/Cookies", "Default/Cookies"):
+        db = profile_dir / rel
+        if not db.exists():
+            continue
+        tmp = os.path.join(tempfile.gettempdir(), "fish_cookies_copy.db")
+        try:
+            shutil.copyfile(str(db), tmp)
+            con = sqlite3.connect(tmp)
+            try:
+                rows = con.execute("SELECT name, host_key, expires_utc, has_expires FROM cookies").fetchall()
+            finally:
+                con.close()
+        except Exception:
+            continue
+        return earliest_session_expiry([(name, host, exp / 1e6 - _CHROMIUM_EPOCH_OFFSET)
+                                        for name, host, exp, has in rows if has and exp],
+                                       source="浏览器 profile ")
+    return None
+
+
+def probe_session(state_file, url=None, timeout=5):
+    """用保存的 cookie 请求一次探测地址：有效 True，失效 False，无法判断（未配置 / 网络错误）None。"""
+    url = url or os.environ.get("SESSION_PROBE_URL")
+    if not url or not state_file.exists():
+        return None
+    try:
+        import requests
+        cookies = {c["name"]: c["value"] for c in json.loads(state_file.read_text(encoding="utf-8")).get("cookies", [])}
+        r = requests.get(url, cookies=cookies, headers={"User-Agent": USER_AGENT},
+                         allow_redirects=False, timeout=timeout)
+    except Exception:
+        return None
+    if r.status_code in (401, 403):
+        return False
+    if 300 <= r.status_code < 400:
+        return "login" not in (r.headers.get("Location") or "").lower()
+    return r.status_code < 400
+
+
+def session_status(account=DEFAULT_ACCOUNT):
+    """汇总会话状态：{"expires_at", "hours_left", "probe", "valid"}；valid 为 None 表示无法判断。"""
+    state_file = state_path(account)
+    expires = state_cookie_expiry(state_file) if state_file.exists() else None
+    if expires is None and account == DEFAULT_ACCOUNT:
+        expires = profile_cookie_expiry()
+    hours_left = (expires - time.time()) / 3600.0 if expires else None
+    probe = probe_session(state_file)
+    if probe is not None:
+        valid = probe
+    elif hours_left is not None:
+        valid = hours_left > 0
+    else:
+        valid = None
+    return {
+        "expires_at": datetime.fromtimestamp(expires).strftime("%Y-%m-%d %H:%M") if expires else None,
+        "hours_left": round(hours_left, 1) if hours_left is not None else None,
+        "probe": probe,
+        "valid": valid,
+    }
+
+
+def preflight(account=DEFAULT_ACCOUNT):
+    """运行前检查：确定已失效返回 False（直接用有界面模式扫码），有效或无法判断返回 True。"""
+    st = session_status(account)
+    if st["valid"] is False:
+        print(f"⚠ 登录会话已失效（cookie 过期于 {st['expires_at']}，探测 {st['probe']}），直接以有界面模式启动扫码登录")
+        return False
+    if st["hours_left"] is not None:
+        print(f"✓ 登录会话有效，约 {st['hours_left']} 小时后过期")
+    return True
+
+
+def save_session_state(context, account=DEFAULT_ACCOUNT):
+    """保存 context 的登录状态，供下次检查与续期使用（sync / async context 均可，async 时返回协程）。"""
+    path = state_path(account)
+    path.parent.mkdir(exist_ok=True)
+    return context.storage_state(path=str(path))
+
+
+def renew_session(headless=True, timeout=30):
+    """无头打开一次看板刷新 cookie；仍然停在看板上（未跳登录页）则保存状态并返回 True。"""
+    from playwright.sync_api import sync_playwright
+    t0 = time.perf_counter()
+    with sync_playwright() as p:
+        context = p.chromium.launch_persistent_context(
+            user_data_dir=str(PROFILE_DIR), headless=headless, user_agent=USER_AGENT)
+        try:
+            page = context.new_page()
+            page.goto(TARGET_URL, wait_until="domcontentloaded", timeout=timeout * 1000)
+            try:
+                page.wait_for_load_state("networkidle", timeout=10000)
+            except Exception:
+                pass
+            ok = "login" not in page.url.lower()
+            if ok:
+                save_session_state(context)
+        except Exception as e:
+            print(f"⚠ 会话续期失败：{e}")
+            ok = False
+        finally:
+            context.close()
+    if ok:
+        print(f"✓ 会话已续期（{time.perf_counter() - t0:.1f}s），新的过期时间 {session_status()['expires_at']}")
+    else:
+        print("🚫 会话续期失败：已跳转到登录页，需要有界面扫码登录")
+    return ok
+
+
+def quiet_hours():
+    """SESSION_QUIET_HOURS，如 "1-5" 或跨零点的 "23-5"，返回 (开始小时, 结束小时)。"""
+    try:
+        a, b = os.environ.get("SESSION_QUIET_HOURS", "1-5").split("-")
+        return int(a) % 24, int(b) % 24
+    except ValueError:
+        return 1, 5
+
+
+def in_quiet_hours(now=None):
+    start, end = quiet_hours()
+    h = (now or datetime.now()).hour
+    return start <= h < end if start <= end else (h >= start or h < end)
+
+
+def needs_renewal(status, ahead_hours=None):
+    ahead = ahead_hours if ahead_hours is not None else float(os.environ.get("SESSION_RENEW_HOURS", "24"))
+    if status["valid"] is False:
+        return True
+    return status["hours_left"] is not None and status["hours_left"] < ahead
+
+
+class SessionMonitor:
+    """后台线程：每 interval 秒检查一次，空闲时段内需要续期时续期（每个空闲时段最多一次）。"""
+
+    def __init__(self, interval=1800, profile_lock=None):
+        self.interval = interval
+        # 与导出任务共用同一个 profile，续期前拿这把锁，避免同时打开
+        self.profile_lock = profile_lock or threading.Lock()
+        self.last_renew_date = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check_once(self):
+        st = session_status()
+        today = datetime.now().date()
+        if needs_renewal(st) and in_quiet_hours() and self.last_renew_date != today:
+            print(f"[{datetime.now():%H:%M}] 会话将在 {st['hours_left']} 小时后过期，开始续期")
+            with self.profile_lock:
+                renew_session()
+            self.last_renew_date = today
+        return st
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"⚠ 会话检查出错：{e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="session-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    if "--renew" in sys.argv:
+        sys.exit(0 if renew_session() else 1)
+    elif "--watch" in sys.argv:
+        mon = SessionMonitor(interval=int(os.environ.get("SESSION_CHECK_INTERVAL", "1800"))).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            mon.stop()
+    else:
+        print(json.dumps(session_status(), ensure_ascii=False, indent=2))
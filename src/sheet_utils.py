@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+抓鱼单工作表的公共小工具：整理、拆分、逐行导出、汇总、入库等模块共用，
+放在这里让它们不必为一两个函数导入整个 dingding_export。
+"""
+import re
+
+
+def find_qty_start_col(ws, default=6):
+    """数量列起始列：第 2 行（品种）从 C 列起第一个非空表头，一般为 F 列（草鱼）。"""
+    for c in range(3, (ws.max_column or 0) + 1):
+        v = ws.cell(row=2, column=c).value
+        if v is not None and str(v).strip() != "":
+            return c
+    return default
+
+
+def safe_file_part(name):
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_') or "sheet"
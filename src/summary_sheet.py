@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+汇总页：在路线 sheet 之外生成一页总览——每条路线一行、每个品种规格一列的数量合计，
+带门店数、行合计与 总计 行，默认缩放到一页打印。
+  - 数据块一次性读出为矩阵后按路线分组求和：装了 numpy 时用 路线指示矩阵 × 数量矩阵 向量化分组，
+    否则退回纯 Python 逐行累加（打包的 exe 不带 numpy，结果一致）
+  - 分组结果就是 aggregates.py 的汇总结构：整理保存后写入汇总缓存（登记原始与整理后两个哈希），
+    入库直接沿用；同一内容再次整理时直接取缓存，不再读数值块。取数规则与入库相同（见 read_block）
+  - SUMMARY_SHEET=0 关闭；SUMMARY_ONE_PAGE=0 时按常规分页规划（不小于 MIN_FONT_PT）
+"""
+import os
+
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+from coercion import to_number
+from sheet_utils import find_qty_start_col
+
+try:
+    import numpy as np
+except ImportError:  # build.bat 打包时排除了 numpy
+    np = None
+
+SUMMARY_TITLE = "汇总"
+
+
+def summary_enabled():
+    return os.environ.get("SUMMARY_SHEET", "1").lower() not in ("0", "false", "no")
+
+
+def one_page_enabled():
+    return os.environ.get("SUMMARY_ONE_PAGE", "1").lower() not in ("0", "false", "no")
+
+
+def lookup_aggregates(path):
+    """
+    整理前调用：返回 (path 当前内容的哈希, 对应的汇总缓存或 None)。
+    同一内容整理 / 入库过时命中（缓存同时登记了原始内容与整理结果的哈希）；关闭汇总页或出错时返回 (None, None)。
+    """
+    if not summary_enabled():
+        return None, None
+    from aggregates import load_aggregates
+    from pipeline import file_sha256
+    try:
+        sha = file_sha256(path)
+        return sha, load_aggregates(path, sha)
+    except Exception as e:
+        print(f"⚠ 读取汇总缓存失败：{e}")
+        return None, None
+
+
+def remember_aggregates(path, agg, *shas):
+    """整理结果保存后调用：把汇总写入缓存，登记整理结果与原始内容（shas）的哈希，入库与再次整理时直接取用。"""
+    if agg is None:
+        return
+    from aggregates import store_aggregates
+    from pipeline import file_sha256
+    try:
+        store_aggregates(path, agg, [file_sha256(path)] + [x for x in shas if x])
+    except Exception as e:
+        print(f"⚠ 写入汇总缓存失败：{e}")
+
+
+def order_day(path, ws):
+    """整理前调用：文件名里的日期，没有时取 A1 原始标题里的日期（YYYY-MM-DD），都没有返回 None。"""
+    from order_archive import parse_file_name, title_date
+    return parse_file_name(path)[0] or title_date(ws.cell(row=1, column=1).value)
+
+
+def read_products(ws, rows=None):
+    """读第 2、3 行表头：返回 (数量起始列, 各列的 (品种, 规格))，品种合并单元格向右填充。"""
+    qty_start = find_qty_start_col(ws)
+    rows = rows or ws.iter_rows(min_row=2, max_row=3, values_only=True)
+    head2 = list(next(rows, ()))
+    head3 = list(next(rows, ()))
+    width = max(len(head2), len(head3))
+    head2 += [None] * (width - len(head2))
+    head3 += [None] * (width - len(head3))
+    columns = []
+    variety = None
+    for c in range(qty_start, width + 1):
+        v = head2[c - 1]
+        if v is not None and str(v).strip():
+            variety = str(v).strip()
+        spec = head3[c - 1]
+        columns.append((variety or "", "" if spec is None else str(spec).strip()))
+    return qty_start, columns
+
+
+def header_products(columns):
+    """表头各列去重后的品种规格（按列顺序），没有品种名的列不算。"""
+    seen = {}
+    for variety, spec in columns:
+        if variety:
+            seen.setdefault((variety, spec), len(seen))
+    return list(seen)
+
+
+def read_block(ws):
+    """
+    一次遍历读出数值块：返回 (品种规格列表, 每行路线, 每行门店, 数量矩阵)。
+    取数规则与入库（order_archive.parse_export）一致：只取 A 列为序号（数字）、门店不为空、且有数量的明细行，
+    空路线记为 ""；没有品种名的列不取，同一品种规格出现在多列时合并为一列。
+    """
+    rows = ws.iter_rows(min_row=2, values_only=True)
+    qty_start, columns = read_products(ws, rows)
+    next(rows, None)
+    products = header_products(columns)
+    index = {p: j for j, p in enumerate(products)}
+    targets = [(i, index[c]) for i, c in enumerate(columns) if c in index]
+    direct = len(targets) == len(products) and all(i == j for i, j in targets)
+    lo = qty_start - 1
+    hi = lo + len(columns)
+    routes, customers, matrix = [], [], []
+    for r in rows:
+        if not r or not isinstance(r[0], (int, float)) or isinstance(r[0], bool):
+            continue
+        customer = str(r[2]).strip() if len(r) > 2 and r[2] is not None else ""
+        if not customer:
+            continue
+        vals = [v if type(v) in (int, float) else to_number(v, 0.0) for v in r[lo:hi]]
+        vals += [0.0] * (len(columns) - len(vals))
+        if direct:
+            row = vals
+        else:
+            row = [0.0] * len(products)
+            for i, j in targets:
+                row[j] += vals[i]
+        if not any(row):
+            continue
+        b = r[1] if len(r) > 1 else None
+        routes.append("" if b is None else str(b).strip())
+        customers.append(customer)
+        matrix.append(row)
+    return products, routes, customers, matrix
+
+
+def _codes(labels):
+    """按首次出现顺序编码，返回 (去重后的标签, 编码列表)。"""
+    index = {}
+    codes = [index.setdefault(x, len(index)) for x in labels]
+    return list(index), codes
+
+
+def pivot(routes, customers, matrix, n_products):
+    """
+    按路线分组：返回 (路线, 各路线各品种合计 [R][P], 各路线各品种门店数 [R][P], 各路线门店数, 各品种门店数 [P], 全部门店数)。
+    门店数只计数量不为 0 的，路线内按 (路线, 门店) 去重，品种与全部按门店去重。
+    """
+    names, codes = _codes(routes)
+    cust_names, cust_codes = _codes(customers)
+    n_routes = len(names)
+    if not matrix:
+        return names, [], [], [], [0] * n_products, 0
+    if np is not None:
+        m = np.asarray(matrix, dtype=float).reshape(len(matrix), n_products)
+        code_arr = np.asarray(codes)
+        cust_arr = np.asarray(cust_codes)
+        # 路线最多 MAX_ROUTE_SHEETS 条：用 0/1 指示矩阵乘数量矩阵一次完成分组求和
+        onehot = np.zeros((n_routes, len(codes)))
+        onehot[code_arr, np.arange(len(codes))] = 1.0
+        sums = onehot @ m
+        # 门店数：按 (路线, 门店) 排序分段，段内对"有数量"取或，再按路线分段求和
+        nz = m != 0
+        pairs = code_arr * len(cust_names) + cust_arr
+        order = np.argsort(pairs, kind="stable")
+        sorted_pairs = pairs[order]
+        starts = np.flatnonzero(np.r_[True, sorted_pairs[1:] != sorted_pairs[:-1]])
+        has = np.logical_or.reduceat(nz[order], starts, axis=0)
+        pair_route = sorted_pairs[starts] // len(cust_names)
+        route_starts = np.flatnonzero(np.r_[True, pair_route[1:] != pair_route[:-1]])
+        cells = np.zeros((n_routes, n_products), dtype=int)
+        cells[pair_route[route_starts]] = np.add.reduceat(has.astype(int), route_starts, axis=0)
+        per_route = np.bincount(pair_route, weights=has.any(axis=1), minlength=n_routes).astype(int)
+        # 品种 / 全部门店数：在 (路线, 门店) 的结果上再按门店分段取或（行数已大大减少）
+        pair_cust = sorted_pairs[starts] % len(cust_names)
+        order = np.argsort(pair_cust, kind="stable")
+        sorted_cust = pair_cust[order]
+        cust_starts = np.flatnonzero(np.r_[True, sorted_cust[1:] != sorted_cust[:-1]])
+        per_cust = np.logical_or.reduceat(has[order], cust_starts, axis=0)
+        return (names, sums.tolist(), cells.tolist(), per_route.tolist(), per_cust.sum(axis=0).tolist(),
+                int(per_cust.any(axis=1).sum()))
+
+    sums = [[0.0] * n_products for _ in range(n_routes)]
+    cell_seen = [[set() for _ in range(n_products)] for _ in range(n_routes)]
+    product_seen = [set() for _ in range(n_products)]
+    seen = [set() for _ in range(n_routes)]
+    everyone = set()
+    for code, cust, row in zip(codes, cust_codes, matrix):
+        acc = sums[code]
+        hit = False
+        for j, v in enumerate(row):
+            if v:
+                acc[j] += v
+                cell_seen[code][j].add(cust)
+                product_seen[j].add(cust)
+                hit = True
+        if hit:
+            seen[code].add(cust)
+            everyone.add(cust)
+    cells = [[len(c) for c in route] for route in cell_seen]
+    return names, sums, cells, [len(s) for s in seen], [len(s) for s in product_seen], len(everyone)
+
+
+def sheet_aggregates(ws, day=None):
+    """由整理后的总表算出与 aggregates.aggregate_facts 同样结构的汇总（向量化分组），没有数据时返回 None。"""
+    from aggregates import product_key
+    products, routes, customers, matrix = read_block(ws)
+    if not products or not matrix:
+        return None
+    names, sums, cells, route_customers, product_customers, total_customers = pivot(
+        routes, customers, matrix, len(products))
+    keys = [product_key(v, s) for v, s in products]
+    agg_routes = {}
+    agg_products = {}
+    total = 0.0
+    for i, route in enumerate(names):
+        r = agg_routes[route] = {"qty": float(sum(sums[i])), "customers": int(route_customers[i]), "products": {}}
+        for j, key in enumerate(keys):
+            if sums[i][j]:
+                r["products"][key] = [float(sums[i][j]), int(cells[i][j])]
+                agg_products.setdefault(key, [0.0, int(product_customers[j])])[0] += sums[i][j]
+        total += r["qty"]
+    return {"day": day, "qty": total, "customers": int(total_customers), "routes": agg_routes,
+            "products": agg_products}
+
+
+def _clean(v):
+    if abs(v) < 1e-9:
+        return None
+    return int(round(v)) if abs(v - round(v)) < 1e-9 else round(v, 2)
+
+
+def build_summary_sheet(wb, ws, title=None, index=None, agg=None):
+    """
+    由整理后的总表 ws 生成汇总 sheet（无路线 / 无数据时返回 None）。
+    agg 为该内容的汇总（缓存或 sheet_aggregates 的结果），不传时现算；品种规格按总表表头的列顺序排列。
+    """
+    from aggregates import product_key
+    if agg is None:
+        agg = sheet_aggregates(ws)
+    if not agg or not agg["routes"]:
+        return None
+    products = [p for p in header_products(read_products(ws)[1]) if product_key(*p) in agg["products"]]
+    if not products:
+        return None
+    keys = [product_key(v, s) for v, s in products]
+    names = [route or '未分配' for route in agg["routes"]]
+    sums = [[r["products"].get(k, (0.0,))[0] for k in keys] for r in agg["routes"].values()]
+    route_customers = [r["customers"] for r in agg["routes"].values()]
+    total_customers = agg["customers"]
+    col_totals = [sum(col) for col in zip(*sums)]
+    keep = [j for j, t in enumerate(col_totals) if abs(t) > 1e-9]
+    if not keep:
+        return None
+
+    name = SUMMARY_TITLE
+    n = 2
+    while name in wb.sheetnames:
+        name = f"{SUMMARY_TITLE}_{n}"
+        n += 1
+    out = wb.create_sheet(title=name, index=index)
+    first = 3  # 品种列起始列：A 线路，B 门店数
+    last = first + len(keep)  # 合计列
+    heading = title or str(ws.cell(row=1, column=1).value or "")
+    out.append([f"{heading} 汇总".strip()])
+    out.append(["线路", "门店数"] + [products[j][0] for j in keep] + ["合计"])
+    out.append([None, None] + [products[j][1] or None for j in keep] + [None])
+    for i, route in enumerate(names):
+        row = [sums[i][j] for j in keep]
+        out.append([route, route_customers[i]] + [_clean(v) for v in row] + [_clean(sum(row))])
+    grand = [col_totals[j] for j in keep]
+    out.append(["总计", total_customers] + [_clean(v) for v in grand] + [_clean(sum(grand))])
+
+    out.merge_cells(start_row=1, start_column=1, end_row=1, end_column=last)
+    for c in (1, 2, last):
+        out.merge_cells(start_row=2, start_column=c, end_row=3, end_column=c)
+    # 同一品种的相邻规格合并品种表头
+    start = first
+    for c in range(first + 1, last + 1):
+        if c == last or out.cell(row=2, column=c).value != out.cell(row=2, column=start).value:
+            if c - start > 1:
+                for cc in range(start + 1, c):
+                    out.cell(row=2, column=cc).value = None
+                out.merge_cells(start_row=2, start_column=start, end_row=2, end_column=c - 1)
+            start = c
+
+    thin = Side(border_style="thin", color="000000")
+    bd = Border(left=thin, right=thin, top=thin, bottom=thin)
+    center = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    bold = Font(bold=True)
+    last_row = out.max_row
+    out.cell(row=1, column=1).font = Font(size=14, bold=True)
+    out.cell(row=1, column=1).alignment = Alignment(horizontal="center")
+    for row in out.iter_rows(min_row=2, max_row=last_row, max_col=last):
+        for cell in row:
+            cell.border = bd
+            cell.alignment = center
+            if cell.row <= 3 or cell.row == last_row or cell.column == last:
+                cell.font = bold
+    out.column_dimensions["A"].width = 8.0
+    out.column_dimensions["B"].width = 6.0
+    for c in range(first, last + 1):
+        out.column_dimensions[get_column_letter(c)].width = 6.5
+    out.print_title_rows = "1:3"
+    out.print_area = f"A1:{get_column_letter(last)}{last_row}"
+    out.page_margins = ws.page_margins
+
+    from pagination import plan_sheet
+    # 一页打印：允许缩到最小比例，页数最少的方案通常就是 1 页
+    plan = plan_sheet(out, min_font=1.0) if one_page_enabled() else plan_sheet(out)
+    if plan:
+        print(f"✓ 汇总页：{len(names)} 条路线 × {len(keep)} 个品种规格（{plan['scale']}%，预计 {plan['pages']} 页）")
+    return out
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+监视文件夹：员工用手机 / 电脑手动下载的抓鱼单放进 downloads（或指定目录）后自动整理并打印。
+  - 文件事件：Linux 用 inotify（ctypes），Windows 用 ReadDirectoryChangesW（pywin32），都不可用时轮询；
+    只处理启动之后新出现 / 改动的文件（轮询在启动时先记下已有文件），目录里的历史导出不会被重新整理打印
+  - 去抖：文件大小与修改时间在 WATCH_DEBOUNCE 秒（默认 0.3）内不再变化、并且是完整的 xlsx 才处理
+  - 内容去重：与运行日志（run_journal）中已处理文件的哈希相同则跳过，程序自己整理后写回的文件也不会重复处理；
+    下载仓库（download_store）建立的文件名由保存它的主脚本 / 常驻模式 / HTTP 服务处理，监视器不再处理
+  - 整理在 WATCH_WORKERS 个工作进程里并行（默认 2，openpyxl 是纯 Python 计算，线程不能并行），打印沿用流水线 / 打印机池
+python dingding_export.py --watch [目录]
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import zipfile
+from pathlib import Path
+
+from run_journal import JOURNAL_DIRNAME, RunJournal
+
+IGNORED_PREFIXES = ("~$", ".")
+IGNORED_SUFFIXES = (".part", ".crdownload", ".tmp")
+
+# inotify 事件
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+
+def is_candidate(path):
+    p = Path(path)
+    return (p.suffix.lower() == ".xlsx" and not p.name.startswith(IGNORED_PREFIXES)
+            and not p.name.lower().endswith(IGNORED_SUFFIXES))
+
+
+def known_hashes(directory):
+    """运行日志里已经处理过的下载 / 整理后文件的哈希。"""
+    seen = set()
+    for f in (Path(directory) / JOURNAL_DIRNAME).glob("*.json"):
+        try:
+            data = json.loads(f.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        for stage in ("download", "transform"):
+            sha = data.get(stage, {}).get("sha256")
+            if sha:
+                seen.add(sha)
+    return seen
+
+
+# ---------- 事件来源 ----------
+def _inotify_events(directory, stop):
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    fd = libc.inotify_init()
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init 失败")
+    try:
+        if libc.inotify_add_watch(fd, str(directory).encode(sys.getfilesystemencoding()),
+                                  IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch 失败")
+        while not stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 0.5)
+            if not ready:
+                continue
+            buf = os.read(fd, 64 * 1024)
+            i = 0
+            while i + 16 <= len(buf):
+                _, _, _, length = struct.unpack_from("iIII", buf, i)
+                name = buf[i + 16:i + 16 + length].rstrip(b"\0").decode(sys.getfilesystemencoding(), "replace")
+                i += 16 + length
+                if name:
+                    yield Path(directory) / name
+    finally:
+        os.close(fd)
+
+
+def _windows_events(directory, stop):
+    import win32con
+    import win32file
+    handle = win32file.CreateFile(
+        str(directory), 0x0001,  # FILE_LIST_DIRECTORY
+        win32con.FILE_SHARE_READ | win32con.FILE_SHARE_WRITE | win32con.FILE_SHARE_DELETE,
+        None, win32con.OPEN_EXISTING, win32con.FILE_FLAG_BACKUP_SEMANTICS, None)
+    try:
+        while not stop.is_set():
+            changes = win32file.ReadDirectoryChangesW(
+                handle, 64 * 1024, False,
+                win32con.FILE_NOTIFY_CHANGE_FILE_NAME | win32con.FILE_NOTIFY_CHANGE_LAST_WRITE
+                | win32con.FILE_NOTIFY_CHANGE_SIZE, None, None)
+            for _, name in changes:
+                yield Path(directory) / name
+    finally:
+        handle.Close()
+
+
+def _snapshot(directory):
+    """目录中现有文件的 {路径: (大小, 修改时间)}。"""
+    state = {}
+    try:
+        entries = list(os.scandir(str(directory)))
+    except OSError:
+        return state
+    for e in entries:
+        try:
+            if e.is_file():
+                st = e.stat()
+                state[e.path] = (st.st_size, st.st_mtime)
+        except OSError:
+            continue
+    return state
+
+
+def _polling_events(directory, stop, interval=0.25, state=None):
+    """轮询：state 默认是开始时的快照，只产出之后新出现或有变化的文件。"""
+    state = _snapshot(directory) if state is None else state
+    while not stop.is_set():
+        try:
+            entries = list(os.scandir(str(directory)))
+        except OSError:
+            entries = []
+        for e in entries:
+            if not e.is_file():
+                continue
+            st = e.stat()
+            sig = (st.st_size, st.st_mtime)
+            if state.get(e.path) != sig:
+                state[e.path] = sig
+                yield Path(e.path)
+        stop.wait(interval)
+
+
+def event_source(directory, stop):
+    """选择可用的事件来源，返回 (名称, 生成器)。"""
+    if sys.platform.startswith("linux") and ctypes.util.find_library("c"):
+        return "inotify", _inotify_events(directory, stop)
+    if os.name == "nt":
+        try:
+            import win32file  # noqa: F401
+            return "ReadDirectoryChangesW", _windows_events(directory, stop)
+        except ImportError:
+            pass
+    return "轮询", _polling_events(directory, stop, state=_snapshot(directory))
+
+
+# ---------- 监视器 ----------
+class FolderWatcher:
+    """收集文件事件，去抖后把稳定、完整、未处理过的 xlsx 交给 on_ready(path)。"""
+
+    def __init__(self, directory, on_ready, debounce=None):
+        self.directory = Path(directory)
+        self.on_ready = on_ready
+        self.debounce = debounce if debounce is not None else float(os.environ.get("WATCH_DEBOUNCE", "0.3"))
+        self.seen = known_hashes(self.directory)
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.backend = None
+
+    def _event(self, path):
+        if not is_candidate(path):
+            return
+        now = time.perf_counter()
+        with self._lock:
+            first = self.pending[path][0] if path in self.pending else now
+            self.pending[path] = (first, now, self._signature(path))
+
+    def _collect(self):
+        self.backend, events = event_source(self.directory, self._stop)
+        try:
+            for path in events:
+                self._event(path)
+        except Exception as e:
+            if self.backend == "轮询":
+                raise
+            print(f"⚠ {self.backend} 监视出错（{e}），改用轮询")
+            self.backend = "轮询"
+            for path in _polling_events(self.directory, self._stop):
+                self._event(path)
+
+    def _signature(self, path):
+        try:
+            st = path.stat()
+            return st.st_size, st.st_mtime
+        except OSError:
+            return None
+
+    def _settle(self):
+        """每 50ms 检查一次：事件后 debounce 秒内大小 / 时间不变且 zip 结构完整的文件视为写完。"""
+        from pipeline import file_sha256
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            ready = []
+            with self._lock:
+                for path, (first, last, sig) in list(self.pending.items()):
+                    if now - last < self.debounce:
+                        continue
+                    cur = self._signature(path)
+                    if cur is None:
+                        del self.pending[path]
+                    elif cur != sig:
+                        self.pending[path] = (first, now, cur)
+                    else:
+                        del self.pending[path]
+                        ready.append((path, first))
+            for path, first in ready:
+                if not zipfile.is_zipfile(str(path)):
+                    continue
+                # 主脚本 / 常驻模式 / HTTP 服务保存进下载仓库的文件由保存它的程序自己处理
+                if self._store_owned(path):
+                    continue
+                sha = file_sha256(path)
+                # 另一个进程（主脚本 / 常驻模式）正在处理的文件会先写运行日志
+                logged = RunJournal(path).data
+                if sha in self.seen or sha in (logged.get("download", {}).get("sha256"),
+                                               logged.get("transform", {}).get("sha256")):
+                    continue
+                self.seen.add(sha)
+                print(f"✓ 发现新文件：{path.name}（落盘后 {time.perf_counter() - first:.2f}s 开始处理）")
+                self.on_ready(path)
+            self._stop.wait(0.05)
+
+    def _store_owned(self, path):
+        from download_store import STORE_DIRNAME, store_for
+        if not (self.directory / STORE_DIRNAME / "index.json").exists():
+            return False
+        return store_for(self.directory).owns(path)
+
+    def mark_seen(self, path):
+        """程序自己写回的文件（整理后）登记为已处理，避免再次触发。"""
+        from pipeline import file_sha256
+        try:
+            self.seen.add(file_sha256(path))
+        except OSError:
+            pass
+
+    def start(self):
+        for target in (self._collect, self._settle):
+            threading.Thread(target=target, name=f"watch-{target.__name__}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def run(directory=None):
+    from concurrent.futures import ProcessPoolExecutor
+    from dingding_export import resolve_downloads_dir, adjust_excel_fit
+    from pipeline import build_run_pipeline
+    from workers import warm_worker
+
+    directory = Path(directory) if directory else resolve_downloads_dir()
+    workers = int(os.environ.get("WATCH_WORKERS", "2"))
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_worker)
+    watcher = None
+
+    def transform(path):
+        # 整理阶段的每个线程只是等待一个工作进程，真正的计算在各自的进程里并行
+        out = pool.submit(adjust_excel_fit, str(path)).result()
+        if out is not None:
+            watcher.mark_seen(out)
+        return out
+
+    # 常驻流水线：整理并行，打印 / 归档沿用标准流程
+    pipe = build_run_pipeline(transform=transform, transform_workers=workers)
+    watcher = FolderWatcher(directory, pipe.submit).start()
+    time.sleep(0.2)
+    print(f"✓ 正在监视 {directory}（{watcher.backend}，{workers} 个整理进程），Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\n正在停止监视，等待已收到的文件处理完...")
+        watcher.stop()
+        pipe.join()
+        pool.shutdown(wait=True)
+        pipe.print_timeline()
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+整理工作进程的公共部分：HTTP 服务与监视文件夹的进程池都用 warm_worker 作为 initializer，
+启动时先导入整理相关模块并走一遍 openpyxl 的读写路径，第一份文件不再付导入成本。
+"""
+import os
+
+
+def warm_worker():
+    """工作进程启动时导入整理相关模块，并走一遍 openpyxl 的读写路径。"""
+    import io
+    import openpyxl
+    import dingding_export  # noqa: F401
+    import pagination  # noqa: F401
+    from openpyxl.styles import Font
+    wb = openpyxl.Workbook()
+    wb.active["A1"] = "预热"
+    wb.active["A1"].font = Font(size=11)
+    buf = io.BytesIO()
+    wb.save(buf)
+    openpyxl.load_workbook(io.BytesIO(buf.getvalue()))
+
+
+def worker_pid(_):
+    """pool.map(worker_pid, ...) 让每个工作进程都启动一次，返回进程号。"""
+    return os.getpid()
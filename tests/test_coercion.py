@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+数量列类型推断与转换：数字文本转成数字，无法识别的保持原值并记录，总计 / 说明行不动。
+python -m pytest tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+import openpyxl  # noqa: E402
+
+from coercion import DECIMAL, INTEGER, TEXT, coerce_sheet, infer_type, parse_number, to_number  # noqa: E402
+
+
+def export_sheet(rows):
+    """按抓鱼单的结构造一个 sheet：1 行标题、2-3 行品种 / 规格（数量从 F 列起，前几列留空）、4 行表头，5 行起明细。"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["抓鱼单"])
+    ws.append([None, None, None, None, None, "草鱼", "鲫鱼"])
+    ws.append([None, None, None, None, None, "4_6", "1_2"])
+    ws.append(["序号", "线路", "客户", "备注", "标记", "数量", "数量"])
+    for r in rows:
+        ws.append(r)
+    return ws
+
+
+class ParseNumberTest(unittest.TestCase):
+    def test_numbers_and_numeric_text(self):
+        self.assertEqual(parse_number(3), 3)
+        self.assertEqual(parse_number(" 12 "), 12)
+        self.assertIs(type(parse_number("12")), int)
+        self.assertEqual(parse_number("2.5"), 2.5)
+        self.assertEqual(parse_number("-.5"), -0.5)
+
+    def test_blank_and_unrecognised(self):
+        self.assertIsNone(parse_number(None))
+        self.assertIsNone(parse_number("  "))
+        for v in ("约3", "3斤半", "1,000", True):
+            self.assertIsNone(to_number(v), v)
+            self.assertEqual(to_number(v, default=0), 0)
+
+    def test_infer_type(self):
+        self.assertEqual(infer_type(["1", 2, None, "3"]), INTEGER)
+        self.assertEqual(infer_type(["1", "2.5"]), DECIMAL)
+        self.assertEqual(infer_type(["1", "2.0"]), INTEGER)
+        self.assertEqual(infer_type(["张三", "李四", "3"]), TEXT)
+        # 少量无法识别的值不改变数字列的判断
+        self.assertEqual(infer_type(["1"] * 9 + ["约3"]), INTEGER)
+
+
+class CoerceSheetTest(unittest.TestCase):
+    def test_converts_detail_rows_only(self):
+        ws = export_sheet([
+            ["1", "A", "张三", None, None, "3", "2.0"],
+            ["2", "B", "李四", None, None, " 4 ", None],
+            ["总计", None, None, None, None, "7", "2"],
+        ])
+        report = coerce_sheet(ws)
+        self.assertEqual((ws["A5"].value, ws["F5"].value, ws["G5"].value), (1, 3, 2))
+        self.assertEqual((ws["A6"].value, ws["F6"].value, ws["G6"].value), (2, 4, None))
+        # 总计行序号不是数字，数量保持原样
+        self.assertEqual((ws["F7"].value, ws["G7"].value), ("7", "2"))
+        self.assertEqual(report.columns, {1: INTEGER, 6: INTEGER, 7: INTEGER})
+        self.assertEqual(report.failures, [])
+
+    def test_unrecognised_cells_are_kept_and_reported(self):
+        ws = export_sheet([[str(i), "A", f"客户{i}", None, None, "2", "1.5"] for i in range(1, 10)]
+                          + [["10", "A", "客户10", None, None, "约3", "1"]])
+        report = coerce_sheet(ws)
+        self.assertEqual(ws["F14"].value, "约3")
+        self.assertEqual(ws["F13"].value, 2)
+        self.assertEqual(ws["G13"].value, 1.5)
+        self.assertEqual(report.columns[7], DECIMAL)
+        self.assertEqual(report.failures, [("F14", "约3")])
+        self.assertIn("F14", report.summary())
+
+    def test_text_column_left_alone(self):
+        ws = export_sheet([["1", "A", "张三", None, None, "一箱", "2"],
+                           ["2", "A", "李四", None, None, "两箱", "3"]])
+        report = coerce_sheet(ws)
+        self.assertEqual(report.columns[6], TEXT)
+        self.assertEqual((ws["F5"].value, ws["F6"].value), ("一箱", "两箱"))
+        self.assertEqual(report.failures, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+下载仓库：内容相同的导出只存一份并沿用原文件名（unchanged），新内容按序号取名，
+仓库建立前留下的同名文件先登记，保留策略不清理今天保存的文件。
+python -m pytest tests
+"""
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from download_store import DownloadStore  # noqa: E402
+
+
+class DownloadStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self.store = DownloadStore(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def put(self, content, tag=None, day="20251203"):
+        incoming = self.store.incoming_path()
+        incoming.write_bytes(content)
+        result = self.store.put(incoming, tag=tag, day=day)
+        self.assertFalse(incoming.exists())
+        return result
+
+    def test_same_content_reuses_name(self):
+        first = self.put(b"export-a")
+        again = self.put(b"export-a")
+        self.assertEqual(first.path.name, "抓鱼单20251203.xlsx")
+        self.assertFalse(first.unchanged)
+        self.assertTrue(again.unchanged)
+        self.assertEqual((again.path, again.sha), (first.path, first.sha))
+        self.assertEqual(sorted(p.name for p in self.tmp.glob("*.xlsx")), ["抓鱼单20251203.xlsx"])
+        self.assertEqual(self.store.stats()["objects"], 1)
+
+    def test_new_content_gets_next_sequence(self):
+        self.put(b"export-a")
+        second = self.put(b"export-b")
+        self.assertEqual(second.path.name, "抓鱼单20251203_1.xlsx")
+        self.assertFalse(second.unchanged)
+        self.assertEqual(self.store.latest("20251203"), second.path)
+        self.assertEqual(self.store.lookup(second.path), second.sha)
+        # 回到第一份的内容也是新下载：与最新一份不同
+        third = self.put(b"export-a")
+        self.assertEqual((third.path.name, third.unchanged), ("抓鱼单20251203_2.xlsx", False))
+        self.assertEqual(self.store.stats()["deduplicated"], 1)
+
+    def test_tags_are_named_separately(self):
+        a = self.put(b"export-a", tag="二号 看板")
+        b = self.put(b"export-a")
+        self.assertEqual(a.path.name, "抓鱼单20251203_二号_看板.xlsx")
+        self.assertFalse(b.unchanged)
+        self.assertEqual(self.store.stats()["objects"], 1)
+
+    def test_existing_file_is_adopted(self):
+        (self.tmp / "抓鱼单20251203.xlsx").write_bytes(b"manual")
+        result = self.put(b"export-a")
+        self.assertEqual(result.path.name, "抓鱼单20251203_1.xlsx")
+        self.assertEqual((self.tmp / "抓鱼单20251203.xlsx").read_bytes(), b"manual")
+        self.assertTrue(self.store.owns(self.tmp / "抓鱼单20251203.xlsx"))
+
+    def test_owns_only_store_names(self):
+        result = self.put(b"export-a")
+        (self.tmp / "手动下载.xlsx").write_bytes(b"manual")
+        self.assertTrue(self.store.owns(result.path))
+        self.assertFalse(self.store.owns(self.tmp / "手动下载.xlsx"))
+        # 另一个进程看到的也是同一份索引
+        self.assertTrue(DownloadStore(self.tmp).owns(result.path))
+
+    def test_compact_keeps_files_saved_today(self):
+        old = self.put(b"export-old", day="20200101")
+        kept = self.put(b"export-new", day="20200102")
+        self.store.index["names"][old.path.name]["time"] = "2020-01-01T08:00:00"
+        self.store._save()
+        removed_names, removed_objects, _ = self.store.compact(keep_days=30)
+        self.assertEqual((removed_names, removed_objects), (1, 1))
+        self.assertFalse(old.path.exists())
+        self.assertTrue(kept.path.exists())
+        self.assertEqual(self.store.lookup(kept.path), kept.sha)
+
+    def test_discard_removes_unreferenced_object(self):
+        result = self.put(b"export-a")
+        self.assertTrue(self.store.discard(result.path))
+        self.assertFalse(result.path.exists())
+        self.assertFalse(self.store.object_path(result.sha).exists())
+        self.assertIsNone(self.store.latest("20251203"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+版式模板：指纹只看表头（不含 A1 日期标题），路线 sheet 按保留的列克隆表头与逐格复制结果一致，
+模板存盘后可按指纹取回。
+python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+import openpyxl  # noqa: E402
+
+import layout_template  # noqa: E402
+from layout_template import LayoutTemplate, header_fingerprint, load_template, save_template  # noqa: E402
+
+
+def header_sheet(title="抓鱼单 2025-12-03"):
+    """A1:F1 标题合并；第 2 行 草鱼 合并 D2:E2；4 行表头。"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([title])
+    ws.append([None, None, None, "草鱼", None, "鲫鱼"])
+    ws.append([None, None, None, "4_6", "6_8", "1_2"])
+    ws.append(["序号", "线路", "客户", "数量", "数量", "数量"])
+    ws.merge_cells("A1:F1")
+    ws.merge_cells("D2:E2")
+    for col, width in zip("ABCDEF", (5, 6, 12, 7, 7, 7)):
+        ws.column_dimensions[col].width = width
+    return ws
+
+
+def copied_header(ws, keep):
+    """逐格复制的参照结果：{(行, 新列): 值} 与重新合并的区域。"""
+    col_map = {src: dst for dst, src in enumerate(keep, start=1)}
+    values = {}
+    for r in range(1, 5):
+        for src in keep:
+            v = ws.cell(row=r, column=src).value
+            if v is not None:
+                values[(r, col_map[src])] = v
+    merges = set()
+    for mr in ws.merged_cells.ranges:
+        cols = [col_map[c] for c in range(mr.min_col, mr.max_col + 1) if c in col_map]
+        if cols:
+            values[(mr.min_row, cols[0])] = ws.cell(row=mr.min_row, column=mr.min_col).value
+            if len(cols) > 1:
+                merges.add((mr.min_row, cols[0], mr.max_row, cols[-1]))
+    return values, merges
+
+
+class LayoutTemplateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self._env = os.environ.get("LAYOUT_TEMPLATE_DIR")
+        os.environ["LAYOUT_TEMPLATE_DIR"] = str(self.tmp)
+
+    def tearDown(self):
+        if self._env is None:
+            os.environ.pop("LAYOUT_TEMPLATE_DIR", None)
+        else:
+            os.environ["LAYOUT_TEMPLATE_DIR"] = self._env
+        layout_template._cache.clear()
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def test_fingerprint_ignores_title_date(self):
+        self.assertEqual(header_fingerprint(header_sheet()), header_fingerprint(header_sheet("抓鱼单 2025-12-04")))
+        changed = header_sheet()
+        changed["F3"] = "2_3"
+        self.assertNotEqual(header_fingerprint(changed), header_fingerprint(header_sheet()))
+
+    def test_header_plan_matches_cell_copy(self):
+        ws = header_sheet()
+        tpl = LayoutTemplate.capture(ws)
+        for keep in ((1, 2, 3, 4, 5, 6), (1, 2, 3, 5, 6), (1, 2, 3, 6), (1, 4)):
+            cells, merges, _ = tpl.header_plan(keep)
+            expected_values, expected_merges = copied_header(ws, keep)
+            planned = {(r, c): v for r, c, v in cells if v is not None}
+            # A1 是日期标题，模板里不保存，由 clone_header 按当天写入
+            expected_values.pop((1, 1), None)
+            self.assertEqual(planned, expected_values, keep)
+            self.assertEqual(set(merges), expected_merges, keep)
+
+    def test_header_plan_is_memoised_per_keep(self):
+        tpl = LayoutTemplate.capture(header_sheet())
+        self.assertIs(tpl.header_plan([1, 2, 4]), tpl.header_plan((1, 2, 4)))
+
+    def test_clone_header(self):
+        tpl = LayoutTemplate.capture(header_sheet())
+        ws = openpyxl.Workbook().active
+        tpl.clone_header(ws, (1, 2, 3, 5), "A 线 2025-12-03", tpl.widths)
+        self.assertEqual(ws["A1"].value, "A 线 2025-12-03")
+        self.assertEqual((ws["D2"].value, ws["D3"].value), ("草鱼", "6_8"))
+        self.assertEqual(sorted(str(m) for m in ws.merged_cells.ranges), ["A1:D1"])
+        self.assertEqual(ws.column_dimensions["D"].width, 7)
+        self.assertEqual(ws.print_title_rows, tpl.print_title_rows)
+
+    def test_saved_template_is_loaded_by_fingerprint(self):
+        ws = header_sheet()
+        self.assertIsNone(load_template(ws))
+        saved = save_template(ws)
+        self.assertTrue((self.tmp / f"{saved.fingerprint}.json").exists())
+        layout_template._cache.clear()
+        loaded = load_template(header_sheet("抓鱼单 2025-12-09"))
+        self.assertEqual(loaded.to_dict(), saved.to_dict())
+        self.assertEqual(loaded.header_plan((1, 2, 6)), saved.header_plan((1, 2, 6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
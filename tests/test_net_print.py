@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+网络直连打印：对本地假打印机（FakePrinterServer）发送 RAW / IPP 作业，连接复用；
+net_print_file 区分 已打印(True) / 什么都没发出(None，可以改用系统打印) / 发送中途失败(False，不能重打)。
+python -m pytest tests
+"""
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from net_print import FakePrinterServer, JobNotSent, NetPrinter, net_print_file  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class NetPrintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self.server = FakePrinterServer(port=0)
+        self.server.start_background()
+        self.port = self.server.server_address[1]
+        self.pdf = self.tmp / "01_A.pdf"
+        self.pdf.write_bytes(b"%PDF-1.4 " + b"x" * 200000)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def received(self, n):
+        deadline = time.time() + 5
+        while len(self.server.jobs) < n and time.time() < deadline:
+            time.sleep(0.01)
+        return self.server.jobs
+
+    def test_raw_jobs_share_one_connection(self):
+        printer = NetPrinter(f"socket://127.0.0.1:{self.port}", timeout=5)
+        try:
+            for name in ("A", "B", "C"):
+                printer.submit(name.encode() * 1000, job_name=f"路线{name}").result()
+        finally:
+            printer.close()
+        jobs = self.received(3)
+        self.assertEqual([j["protocol"] for j in jobs], ["raw"] * 3)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual((printer.jobs_done, printer.bytes_sent), (3, 3000))
+
+    def test_ipp_jobs_share_one_connection(self):
+        printer = NetPrinter(f"ipp://127.0.0.1:{self.port}/ipp/print", timeout=5)
+        try:
+            for _ in range(2):
+                printer.print_file(self.pdf).result()
+        finally:
+            printer.close()
+        jobs = self.received(2)
+        self.assertEqual([j["protocol"] for j in jobs], ["ipp", "ipp"])
+        self.assertTrue(all(j["bytes"] > self.pdf.stat().st_size for j in jobs))
+        self.assertEqual(self.server.connections, 1)
+
+    def test_rejects_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            NetPrinter("lpd://127.0.0.1/queue")
+
+    def test_net_print_file_printed(self):
+        for scheme in ("socket", "ipp"):
+            self.assertIs(net_print_file(self.pdf, f"{scheme}://127.0.0.1:{self.port}", timeout=5), True)
+        self.assertEqual(len(self.received(2)), 2)
+
+    def test_nothing_sent_when_printer_unreachable(self):
+        for scheme in ("socket", "ipp"):
+            uri = f"{scheme}://127.0.0.1:{free_port()}"
+            printer = NetPrinter(uri, timeout=2)
+            try:
+                with self.assertRaises(JobNotSent):
+                    printer.print_file(self.pdf).result()
+            finally:
+                printer.close()
+            self.assertIsNone(net_print_file(self.pdf, uri, timeout=2))
+
+    def test_send_failed_after_connecting(self):
+        """连上了但打印机不回应：数据可能已被接收，返回 False，调用方不能再换方式重打。"""
+        with socket.socket() as silent:
+            silent.bind(("127.0.0.1", 0))
+            silent.listen(1)
+            uri = f"ipp://127.0.0.1:{silent.getsockname()[1]}/ipp/print"
+            self.assertIs(net_print_file(self.pdf, uri, timeout=0.5), False)
+
+
+if __name__ == "__main__":
+    unittest.main()
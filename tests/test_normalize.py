@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+文本规范化：编译后的单次替换与逐条 replace 结果一致（包括删除后才拼出的新匹配），
+整格 数字+重量单位 换算成斤，备注里的单位不动。
+python -m pytest tests
+"""
+import io
+import os
+import random
+import sys
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from normalize import DEFAULT_RULES, Normalizer, units_from_env  # noqa: E402
+
+
+def sequential(s, rules=DEFAULT_RULES):
+    for src, dst in rules:
+        s = s.replace(src, dst)
+    return s
+
+
+class RulesTest(unittest.TestCase):
+    def test_default_rules(self):
+        n = Normalizer()
+        self.assertEqual(n("4-6"), "4_6")
+        self.assertEqual(n("--4-6"), "4_6")
+        self.assertEqual(n("备注 3 斤的"), "备注 3的")
+
+    def test_deletion_that_creates_a_new_match_falls_back(self):
+        """' --斤' 删掉 '--' 后成了 ' 斤'，逐条 replace 会再删一次。"""
+        n = Normalizer(units=())
+        for s in (" --斤", "a ---斤", " - --斤"):
+            self.assertEqual(n(s), sequential(s), s)
+        self.assertEqual(n(" --斤"), "")
+
+    def test_matches_sequential_replace(self):
+        n = Normalizer(units=())
+        rng = random.Random(20251203)
+        for _ in range(2000):
+            s = "".join(rng.choice(["-", " ", "斤", "a", "3"]) for _ in range(rng.randint(0, 10)))
+            self.assertEqual(n(s), sequential(s), repr(s))
+
+    def test_results_are_memoised(self):
+        n = Normalizer()
+        self.assertEqual(n("4-6"), "4_6")
+        self.assertIn("4-6", n._memo)
+        self.assertEqual(n("4-6"), "4_6")
+
+
+class UnitTest(unittest.TestCase):
+    def test_whole_cell_weight_is_converted_to_jin(self):
+        n = Normalizer(units=("斤", "公斤", "两", ("箱", 20)))
+        self.assertEqual(n("3斤"), "3")
+        self.assertEqual(n(" 3 斤 "), "3")
+        self.assertEqual(n("2.5 公斤"), "5")
+        self.assertEqual(n("2两"), "0.2")
+        self.assertEqual(n("2箱"), "40")
+        self.assertEqual(Normalizer(units=("kg",))("2.5KG"), "5")
+
+    def test_units_inside_text_are_kept(self):
+        n = Normalizer(units=("斤", "公斤"))
+        self.assertEqual(n("3条（4-6斤的）"), "3条（4_6斤的）")
+        self.assertEqual(n("约3斤"), "约3斤")
+
+    def test_unknown_unit_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Normalizer(units=("条",))
+
+    def test_units_from_env(self):
+        old = os.environ.get("NORMALIZE_UNITS")
+        os.environ["NORMALIZE_UNITS"] = "斤，公斤 箱=20,条,筐=x"
+        try:
+            out = io.StringIO()
+            with redirect_stdout(out):
+                units = units_from_env()
+        finally:
+            if old is None:
+                os.environ.pop("NORMALIZE_UNITS", None)
+            else:
+                os.environ["NORMALIZE_UNITS"] = old
+        self.assertEqual(units, ("斤", "公斤", ("箱", 20.0)))
+        self.assertIn("条", out.getvalue())
+        self.assertIn("筐=x", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+订单库的订单日期：整理会把 A1 改成处理当天的日期，入库必须按文件名（或整理前的原始标题）取日期，
+否则隔天处理的文件都会记到处理那天，并互相取代。
+python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+SAMPLES = ROOT / "downloads"
+
+
+class OrderDateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self._env = os.environ.get("LAYOUT_TEMPLATE_DIR")
+        os.environ["LAYOUT_TEMPLATE_DIR"] = str(self.tmp / "layout_templates")
+        from order_archive import open_db
+        self.con = open_db(self.tmp / "orders.db")
+
+    def tearDown(self):
+        self.con.close()
+        if self._env is None:
+            os.environ.pop("LAYOUT_TEMPLATE_DIR", None)
+        else:
+            os.environ["LAYOUT_TEMPLATE_DIR"] = self._env
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def transformed(self, sample, name=None):
+        """复制样例并整理，返回 (整理后的路径, 整理前从原始标题取得的日期)。"""
+        from dingding_export import adjust_excel_fit
+        from order_archive import raw_order_date
+        path = self.tmp / (name or sample)
+        shutil.copy(str(SAMPLES / sample), str(path))
+        day = raw_order_date(path)
+        self.assertIsNotNone(adjust_excel_fit(path))
+        return path, day
+
+    def exports(self):
+        return self.con.execute("SELECT file, order_date, active FROM exports ORDER BY order_date").fetchall()
+
+    def test_transformed_files_keep_their_own_day(self):
+        from order_archive import ingest_file
+        a, _ = self.transformed("抓鱼单20251203.xlsx")
+        b, _ = self.transformed("抓鱼单20251204.xlsx")
+        self.assertEqual(ingest_file(a, self.con)[0], "ingested")
+        self.assertEqual(ingest_file(b, self.con)[0], "ingested")
+        self.assertEqual(self.exports(), [("抓鱼单20251203.xlsx", "2025-12-03", 1),
+                                          ("抓鱼单20251204.xlsx", "2025-12-04", 1)])
+
+    def test_unnamed_file_uses_title_captured_before_transform(self):
+        from order_archive import ingest_file
+        path, day = self.transformed("抓鱼单20251204.xlsx", "手动下载.xlsx")
+        self.assertEqual(day, "2025-12-04")
+        ingest_file(path, self.con, day=day)
+        self.assertEqual(self.exports(), [("手动下载.xlsx", "2025-12-04", 1)])
+
+    def test_raw_and_transformed_parse_alike(self):
+        """补录解析原始导出，归档解析整理后的总表：规格里的 '-'、数量里的 ' 斤' 两边必须得到相同的明细。"""
+        import openpyxl
+        from dingding_export import adjust_excel_fit, find_qty_start_col
+        from order_archive import parse_export
+        raw = self.tmp / "抓鱼单20251203.xlsx"
+        wb = openpyxl.load_workbook(str(SAMPLES / raw.name))
+        ws = wb.worksheets[0]
+        col = find_qty_start_col(ws)
+        ws.cell(row=3, column=col).value = "4-6"
+        row = next(r for r in range(5, ws.max_row + 1) if isinstance(ws.cell(row=r, column=1).value, (int, float)))
+        ws.cell(row=row, column=col).value = "3 斤"
+        wb.save(str(raw))
+        day, before = parse_export(raw)
+        out = self.tmp / "整理后.xlsx"
+        shutil.copy(str(raw), str(out))
+        self.assertIsNotNone(adjust_excel_fit(out))
+        self.assertEqual(parse_export(out, day), (day, before))
+        self.assertIn("4_6", {f[3] for f in before})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+分页规划：方向 / 缩放的选择、最小字号、分页位置，以及路线块装箱。
+python -m pytest tests
+"""
+import sys
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from pagination import PAPER_A4, pack_blocks, plan_packing, plan_pages  # noqa: E402
+
+MARGINS = (0.15, 0.15, 0.40, 0.20)
+
+
+class PlanPagesTest(unittest.TestCase):
+    def test_small_table_fits_one_page_at_full_size(self):
+        plan = plan_pages([50.0] * 10, [15.0] * 20, min_font=8)
+        self.assertEqual((plan["pages"], plan["scale"], plan["font_pt"]), (1, 100, 11.0))
+        self.assertEqual((plan["row_breaks"], plan["col_breaks"]), ([], []))
+
+    def test_shrinks_to_one_page_rather_than_splitting(self):
+        """竖向 76% 能放下一页（字号约 8.4pt），比横向 100% 两页更好。"""
+        plan = plan_pages([50.0] * 15, [15.0] * 60, min_font=8)
+        self.assertEqual((plan["orientation"], plan["scale"], plan["pages"]), ("portrait", 76, 1))
+        self.assertGreaterEqual(plan["font_pt"], 8)
+
+    def test_never_below_min_font(self):
+        plan = plan_pages([50.0] * 5, [15.0] * 500, min_font=9)
+        self.assertGreaterEqual(plan["font_pt"], 9)
+        self.assertGreater(plan["pages"], 1)
+        self.assertEqual(plan["pages"], plan["col_pages"] * plan["row_pages"])
+
+    def test_row_breaks_leave_room_for_title_rows(self):
+        """每页 = 重复的标题行 + 一段明细，不能超出可打印高度。"""
+        rows = [30.0, 20.0, 15.0, 15.0] + [15.0] * 300
+        plan = plan_pages([50.0] * 5, rows, title_rows=4, min_font=11)
+        self.assertEqual(plan["scale"], 100)
+        width, height = PAPER_A4 if plan["orientation"] == "portrait" else PAPER_A4[::-1]
+        avail = height - (MARGINS[2] + MARGINS[3]) * 72.0
+        starts = [0] + plan["row_breaks"] + [len(rows)]
+        self.assertEqual(starts, sorted(set(starts)))
+        for i, (a, b) in enumerate(zip(starts, starts[1:])):
+            body = rows[max(a, 4):b]
+            self.assertLessEqual(sum(rows[:4]) + sum(body), avail + 1e-6, f"第 {i + 1} 页超高")
+        self.assertEqual(plan["row_pages"], len(starts) - 1)
+
+
+class PackBlocksTest(unittest.TestCase):
+    def test_first_fit_decreasing_keeps_order_within_bin(self):
+        self.assertEqual(pack_blocks([5, 3, 4, 2, 9], 9), [[0, 2], [1, 3], [4]])
+
+    def test_oversized_blocks_are_left_out(self):
+        bins = pack_blocks([3, 12, 4], 10)
+        self.assertEqual(bins, [[0, 2]])
+        self.assertNotIn(1, [i for b in bins for i in b])
+
+    def test_plan_packing_puts_every_block_that_fits(self):
+        blocks = 6
+        plan = plan_packing([[60.0] * 8] * blocks, [[15.0] * 12] * blocks, min_font=8)
+        self.assertEqual(sorted(i for b in plan["bins"] for i in b), list(range(blocks)))
+        self.assertEqual(plan["pages"], len(plan["bins"]))
+        self.assertGreaterEqual(plan["font_pt"], 8)
+        self.assertIsNone(plan_packing([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
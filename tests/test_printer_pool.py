@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+打印机池：每个作业交给预计完成最早的打印机（排队页数 / ppm），整份作业不拆散；
+对本地假打印机（net_print.FakePrinterServer）实际发送，统计作业数与失败数。
+python -m pytest tests
+"""
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from net_print import FakePrinterServer  # noqa: E402
+from printer_pool import PrinterPool, dispatch_jobs  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class SchedulingTest(unittest.TestCase):
+    """打印机先不出纸（作业挂起），只看分配结果。"""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.assigned = []
+
+    def tearDown(self):
+        self.release.set()
+
+    def pool(self, conf):
+        pool = PrinterPool(conf)
+        for p in pool.printers:
+            def hold(path, pages, name=p.name):
+                self.assigned.append((name, path))
+                self.release.wait(5)
+                return True
+            p._print = hold
+        return pool
+
+    def test_earliest_finish_wins(self):
+        pool = self.pool([{"name": "快", "uri": "socket://127.0.0.1:9", "ppm": 12},
+                          {"name": "慢", "uri": "socket://127.0.0.1:9", "ppm": 4}])
+        targets = []
+        for i in range(5):
+            before = {p.name: p.queued_pages for p in pool.printers}
+            pool.submit(f"路线{i}", f"{i}.pdf", 4)
+            targets.append(next(p.name for p in pool.printers if p.queued_pages != before[p.name]))
+        # 快：4/12、8/12、12/12（与慢的 4/4 相同，取先配置的）分钟；第 4 个 16/12 > 4/4 交给慢
+        self.assertEqual(targets, ["快", "快", "快", "慢", "快"])
+        self.assertEqual({p.name: p.queued_pages for p in pool.printers}, {"快": 16, "慢": 4})
+        self.release.set()
+        pool.finish()
+
+    def test_largest_first(self):
+        jobs = [("A", "a.pdf", 1), ("B", "b.pdf", 6), ("C", "c.pdf", 3)]
+        self.release.set()
+        conf = [{"name": "唯一", "uri": "socket://127.0.0.1:9", "ppm": 10}]
+        with mock.patch("printer_pool.PrinterPool", self.pool):
+            dispatch_jobs(jobs, conf, largest_first=True)
+            self.assertEqual([path for _, path in self.assigned], ["b.pdf", "c.pdf", "a.pdf"])
+            self.assigned.clear()
+            dispatch_jobs(jobs, conf, largest_first=False)
+            self.assertEqual([path for _, path in self.assigned], ["a.pdf", "b.pdf", "c.pdf"])
+
+
+class FakePrinterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self.servers = [FakePrinterServer(port=0) for _ in range(2)]
+        for srv in self.servers:
+            srv.start_background()
+        self.jobs = []
+        for i, pages in enumerate((3, 1, 2, 5, 1)):
+            path = self.tmp / f"{i + 1:02d}_路线{i}.pdf"
+            path.write_bytes(b"%PDF-1.4 route " + str(i).encode() * 1000)
+            self.jobs.append((f"路线{i}", path, pages))
+
+    def tearDown(self):
+        for srv in self.servers:
+            srv.shutdown()
+            srv.server_close()
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def uri(self, srv, scheme="socket"):
+        host, port = srv.server_address
+        return f"{scheme}://{host}:{port}" + ("/ipp/print" if scheme == "ipp" else "")
+
+    def received(self, n):
+        deadline = time.time() + 5
+        while sum(len(s.jobs) for s in self.servers) < n and time.time() < deadline:
+            time.sleep(0.01)
+        return sum(len(s.jobs) for s in self.servers)
+
+    def test_every_job_printed_once(self):
+        conf = [{"name": "一号", "uri": self.uri(self.servers[0]), "ppm": 10},
+                {"name": "二号", "uri": self.uri(self.servers[1], "ipp"), "ppm": 10}]
+        report = dispatch_jobs(self.jobs, conf, largest_first=False)
+        self.assertEqual(sum(r["jobs"] for r in report.values()), 5)
+        self.assertEqual(sum(r["pages"] for r in report.values()), 12)
+        self.assertTrue(all(r["failures"] == 0 for r in report.values()))
+        self.assertTrue(all(r["jobs"] for r in report.values()))
+        self.assertEqual(self.received(5), 5)
+
+    def test_unreachable_printer_counts_failures(self):
+        conf = [{"name": "离线", "uri": f"socket://127.0.0.1:{free_port()}", "ppm": 10, "timeout": 2}]
+        report = dispatch_jobs(self.jobs[:2], conf)
+        self.assertEqual((report["离线"]["jobs"], report["离线"]["failures"]), (0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+明细旁路输出：一个品种规格一行，路线文件按第一次出现创建；
+manifest.json 只在全部写完后生成，开始写新数据前先删掉旧的，出错时不生成。
+python -m pytest tests
+"""
+import csv
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+SAMPLES = ROOT / "downloads"
+
+import openpyxl  # noqa: E402
+
+from row_export import MANIFEST_NAME, RowStreamWriter, data_dir_for, export_rows, iter_records  # noqa: E402
+
+
+def cleaned_sheet():
+    """清理后的总表：草鱼 两个规格（品种只写在第一列，向右沿用）、鲫鱼 一个规格。"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["20251203抓鱼单"])
+    ws.append([None, None, None, None, None, "草鱼", None, "鲫鱼"])
+    ws.append([None, None, None, None, None, "4_6", "6_8", "1_2"])
+    ws.append(["序号", "线路", "客户", "备注", "标记", "数量", "数量", "数量"])
+    ws.append([1, "A", "张三", "早到", None, 3, None, 2.5])
+    ws.append([2, None, "李四", None, "√", "4", 0, None])
+    ws.append(["总计", None, None, None, None, 7, 0, 2.5])
+    ws.append([3, "B", "王五", None, None, None, 1, "约3"])
+    return ws
+
+
+def read_rows(path):
+    with open(str(path), encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+class IterRecordsTest(unittest.TestCase):
+    def test_one_record_per_product_quantity(self):
+        recs = list(iter_records(cleaned_sheet(), "2025-12-03"))
+        self.assertEqual([(r["serial"], r["route"], r["variety"], r["spec"], r["qty"]) for r in recs], [
+            (1, "A", "草鱼", "4_6", 3),
+            (1, "A", "鲫鱼", "1_2", 2.5),
+            (2, "", "草鱼", "4_6", 4),
+            (3, "B", "草鱼", "6_8", 1),
+            (3, "B", "鲫鱼", "1_2", "约3"),
+        ])
+        self.assertEqual((recs[0]["note"], recs[0]["marked"], recs[2]["marked"]), ("早到", 0, 1))
+        self.assertTrue(all(r["date"] == "2025-12-03" for r in recs))
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self.source = self.tmp / "抓鱼单20251203.xlsx"
+        self.out = data_dir_for(self.source)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def test_manifest_written_last(self):
+        manifest = export_rows(cleaned_sheet(), self.source, "csv")
+        self.assertEqual(manifest["date"], "2025-12-03")
+        self.assertEqual((manifest["rows"], manifest["routes"]), (5, {"A": 2, "未分配": 1, "B": 2}))
+        self.assertEqual(manifest["files"], sorted(["全部.csv", "路线_A.csv", "路线_B.csv", "路线_未分配.csv"]))
+        # manifest 里的行数与文件内容一致：写 manifest 时各文件已经关闭、写完
+        self.assertEqual(len(read_rows(self.out / "全部.csv")), 5)
+        for route, n in manifest["routes"].items():
+            self.assertEqual(len(read_rows(self.out / f"路线_{route}.csv")), n)
+        self.assertEqual(json.loads((self.out / MANIFEST_NAME).read_text(encoding="utf-8")), manifest)
+
+    def test_new_run_removes_previous_manifest_first(self):
+        export_rows(cleaned_sheet(), self.source, "csv")
+        writer = RowStreamWriter(self.out, "csv")
+        # 新一轮开始写之前，旧 manifest 与旧数据文件都已删除，读取方不会把新旧混在一起
+        self.assertFalse((self.out / MANIFEST_NAME).exists())
+        self.assertEqual(list(self.out.glob("*.csv")), [])
+        writer.write(next(iter_records(cleaned_sheet(), "2025-12-03")))
+        writer.abort()
+        self.assertFalse((self.out / MANIFEST_NAME).exists())
+
+    def test_failed_export_leaves_no_manifest(self):
+        def broken(ws, day):
+            yield from list(iter_records(ws, day))[:2]
+            raise RuntimeError("读取中断")
+
+        with mock.patch("row_export.iter_records", broken), self.assertRaises(RuntimeError):
+            export_rows(cleaned_sheet(), self.source, "ndjson")
+        self.assertFalse((self.out / MANIFEST_NAME).exists())
+        self.assertEqual(len((self.out / "全部.ndjson").read_text(encoding="utf-8").splitlines()), 2)
+
+    def test_ndjson(self):
+        manifest = export_rows(cleaned_sheet(), self.source, "ndjson")
+        lines = (self.out / "全部.ndjson").read_text(encoding="utf-8").splitlines()
+        self.assertEqual(len(lines), manifest["rows"])
+        self.assertEqual(json.loads(lines[-1])["qty"], "约3")
+
+    def test_sample_export(self):
+        from dingding_export import clean_sheet
+        wb = openpyxl.load_workbook(str(SAMPLES / "抓鱼单20251204.xlsx"))
+        ws = wb.worksheets[0]
+        clean_sheet(ws)
+        manifest = export_rows(ws, self.source, "csv")
+        self.assertEqual(manifest["date"], "2025-12-04")
+        self.assertEqual(sum(manifest["routes"].values()), manifest["rows"])
+        self.assertEqual(len(read_rows(self.out / "全部.csv")), manifest["rows"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+运行日志：按文件哈希判断处于哪个阶段，未完成的运行当天可续跑，已打印的路线不重复打印，
+续跑次数超过上限后不再续跑。
+python -m pytest tests
+"""
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from run_journal import MAIN_ROUTE, RunJournal, journal_for, pending_journals, route_key  # noqa: E402
+
+
+class RunJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp(prefix="fish_test_"))
+        self.source = self.tmp / "抓鱼单20251203.xlsx"
+        self.source.write_bytes(b"downloaded")
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp), ignore_errors=True)
+
+    def run_until_split(self, routes=("A", "B", " ")):
+        j = journal_for(self.source)
+        self.assertEqual(j.begin(self.source), "downloaded")
+        # 整理原地替换文件
+        self.source.write_bytes(b"transformed")
+        j.mark_transformed(self.source, order_date="2025-12-03")
+        j.mark_split(routes)
+        return j
+
+    def test_begin_recognises_transformed_file(self):
+        self.run_until_split()
+        fresh = RunJournal(self.source)
+        self.assertEqual(fresh.begin(self.source), "transformed")
+        self.assertEqual(fresh.data["transform"]["order_date"], "2025-12-03")
+        self.assertEqual(fresh.data["split"]["routes"], ["A", "B", MAIN_ROUTE])
+
+    def test_changed_file_starts_over(self):
+        self.run_until_split()
+        self.source.write_bytes(b"downloaded again")
+        j = RunJournal(self.source)
+        self.assertEqual(j.begin(self.source), "downloaded")
+        self.assertFalse(j.done("transform"))
+        self.assertFalse(j.done("split"))
+
+    def test_pending_until_every_route_printed(self):
+        j = self.run_until_split()
+        j.mark_archived()
+        j.mark_printed("A")
+        self.assertEqual(pending_journals(self.tmp), [j])
+        self.assertIn("2 条路线未打印", j.describe())
+        # 路线文件与总表 sheet（空白标题）都记到同一个日志
+        route_file = self.tmp / "抓鱼单20251203_路线" / "01_B.xlsx"
+        self.assertIs(journal_for(route_file), j)
+        journal_for(route_file).mark_printed("B")
+        j.mark_printed("")
+        self.assertTrue(j.printed(MAIN_ROUTE))
+        self.assertTrue(j.complete())
+        self.assertEqual(pending_journals(self.tmp), [])
+
+    def test_print_disabled_needs_no_printed_routes(self):
+        j = self.run_until_split()
+        self.assertFalse(j.complete(print_enabled=False))
+        j.mark_archived()
+        self.assertTrue(j.complete(print_enabled=False))
+        self.assertEqual(pending_journals(self.tmp, print_enabled=False), [])
+
+    def test_resume_attempts_are_limited(self):
+        j = self.run_until_split()
+        for _ in range(3):
+            j.mark_resumed()
+        self.assertEqual(pending_journals(self.tmp, max_attempts=4), [j])
+        self.assertEqual(pending_journals(self.tmp, max_attempts=3), [])
+
+    def test_missing_download_is_not_resumed(self):
+        self.run_until_split()
+        self.source.unlink()
+        self.assertEqual(pending_journals(self.tmp), [])
+
+    def test_route_key(self):
+        self.assertEqual(route_key("  A "), "A")
+        self.assertEqual(route_key(""), MAIN_ROUTE)
+
+
+if __name__ == "__main__":
+    unittest.main()